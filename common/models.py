@@ -20,7 +20,11 @@ class RecordingType(Enum):
 
 
 class SensorItem:
-    """This is a model class representing a generic data item"""
+    """This is a model class representing a generic data item. The sensor items are slot based
+    classes since a track can have millions of them, subclasses must declare their attributes
+    in __slots__"""
+
+    __slots__ = ("timestamp",)
 
     def __init__(self):
         # value is always specified in seconds having sub-millisecond precision.
@@ -36,18 +40,54 @@ class SensorItem:
 
 
 class PhotoMetadata(SensorItem):
-    """PhotoMetadata is a SensorItem that represents a photo"""
+    """PhotoMetadata is a SensorItem that represents a photo. The gps, obd and compass items are
+    created when they are first accessed, unless they are set before"""
+
+    __slots__ = ("_gps", "_obd", "_compass", "video_index", "frame_index")
 
     def __init__(self):
         super().__init__()
-        self.gps: GPS = GPS()
-        self.obd: OBD = OBD()
-        self.compass: Compass = Compass()
         # index of the video in witch the PhotoMetadata has the corresponding image data.
         self.video_index: Optional[int] = None
         # frame index of the PhotoMetadata relative to the entire sequence of photos.
         self.frame_index: int = None
 
+    @property
+    def gps(self) -> "GPS":
+        try:
+            return self._gps
+        except AttributeError:
+            self._gps = GPS()
+            return self._gps
+
+    @gps.setter
+    def gps(self, gps: "GPS"):
+        self._gps = gps
+
+    @property
+    def obd(self) -> "OBD":
+        try:
+            return self._obd
+        except AttributeError:
+            self._obd = OBD()
+            return self._obd
+
+    @obd.setter
+    def obd(self, obd: "OBD"):
+        self._obd = obd
+
+    @property
+    def compass(self) -> "Compass":
+        try:
+            return self._compass
+        except AttributeError:
+            self._compass = Compass()
+            return self._compass
+
+    @compass.setter
+    def compass(self, compass: "Compass"):
+        self._compass = compass
+
     def __eq__(self, other):
         if isinstance(other, PhotoMetadata):
             return self.timestamp == other.timestamp and \
@@ -68,6 +108,9 @@ class PhotoMetadata(SensorItem):
 class GPS(SensorItem):
     """GPS is a SensorItem model class that can represent all information found in a GPS item"""
 
+    __slots__ = ("latitude", "longitude", "altitude", "horizontal_accuracy", "vertical_accuracy",
+                 "speed")
+
     def __init__(self):
         super().__init__()
         # in degrees
@@ -107,6 +150,8 @@ class GPS(SensorItem):
 class Acceleration(SensorItem):
     """Acceleration is a SensorItem model representing an acceleration data"""
 
+    __slots__ = ("acc_x", "acc_y", "acc_z")
+
     def __init__(self):
         super().__init__()
         # X-axis acceleration in G's
@@ -134,6 +179,8 @@ class Acceleration(SensorItem):
 class Compass(SensorItem):
     """Compass is a SensorItem model class that can represent a compass data"""
 
+    __slots__ = ("compass",)
+
     def __init__(self):
         super().__init__()
         # The heading (measured in degrees) relative to true north
@@ -153,6 +200,8 @@ class Compass(SensorItem):
 class OBD(SensorItem):
     """OBD is a SensorItem model class that can represent an obd data"""
 
+    __slots__ = ("speed",)
+
     def __init__(self):
         super().__init__()
         # value is in km/h
@@ -172,6 +221,8 @@ class OBD(SensorItem):
 class Pressure(SensorItem):
     """Pressure is a SensorItem model class that can represent an pressure data"""
 
+    __slots__ = ("pressure",)
+
     def __init__(self):
         super().__init__()
         # value is in kPa
@@ -191,6 +242,8 @@ class Pressure(SensorItem):
 class Attitude(SensorItem):
     """Attitude is a SensorItem model class that can represent an attitude data"""
 
+    __slots__ = ("yaw", "pitch", "roll")
+
     def __init__(self):
         super().__init__()
         # Returns the yaw of the device in radians.
@@ -218,6 +271,8 @@ class Attitude(SensorItem):
 class Gravity(Acceleration):
     """Gravity is a SensorItem model class that can represent a gravity data"""
 
+    __slots__ = ()
+
     def __eq__(self, other):
         if isinstance(other, Gravity):
             return self.timestamp == other.timestamp and \
@@ -234,20 +289,52 @@ class Gravity(Acceleration):
 
 
 class DeviceMotion(SensorItem):
-    """DeviceMotion is a SensorItem model class that can represent a device motion data"""
-
-    def __init__(self):
-        super().__init__()
-        # Returns the attitude of the device.
-        self.gyroscope: Attitude = Attitude()
-        # Returns the acceleration that the user is giving to the device. Note
-        # that the total acceleration of the device is equal to gravity plus
-        # acceleration.
-        self.acceleration: Acceleration = Acceleration()
-        # Returns the gravity vector expressed in the device's reference frame. Note
-        # that the total acceleration of the device is equal to gravity plus
-        # acceleration.
-        self.gravity: Gravity = Gravity()
+    """DeviceMotion is a SensorItem model class that can represent a device motion data. The
+    gyroscope, acceleration and gravity items are created when they are first accessed, unless
+    they are set before"""
+
+    __slots__ = ("_gyroscope", "_acceleration", "_gravity")
+
+    @property
+    def gyroscope(self) -> Attitude:
+        """Returns the attitude of the device."""
+        try:
+            return self._gyroscope
+        except AttributeError:
+            self._gyroscope = Attitude()
+            return self._gyroscope
+
+    @gyroscope.setter
+    def gyroscope(self, gyroscope: Attitude):
+        self._gyroscope = gyroscope
+
+    @property
+    def acceleration(self) -> Acceleration:
+        """Returns the acceleration that the user is giving to the device. Note that the total
+        acceleration of the device is equal to gravity plus acceleration."""
+        try:
+            return self._acceleration
+        except AttributeError:
+            self._acceleration = Acceleration()
+            return self._acceleration
+
+    @acceleration.setter
+    def acceleration(self, acceleration: Acceleration):
+        self._acceleration = acceleration
+
+    @property
+    def gravity(self) -> Gravity:
+        """Returns the gravity vector expressed in the device's reference frame. Note that the
+        total acceleration of the device is equal to gravity plus acceleration."""
+        try:
+            return self._gravity
+        except AttributeError:
+            self._gravity = Gravity()
+            return self._gravity
+
+    @gravity.setter
+    def gravity(self, gravity: Gravity):
+        self._gravity = gravity
 
     def __eq__(self, other):
         if isinstance(other, DeviceMotion):
@@ -279,6 +366,9 @@ class DeviceMotion(SensorItem):
 class OSCDevice(SensorItem):
     """OSCDevice is a SensorItem model class that can represent an device data"""
 
+    __slots__ = ("platform_name", "os_raw_name", "os_version", "device_raw_name", "app_version",
+                 "app_build_number", "recording_type")
+
     def __init__(self):
         super().__init__()
         # The platform from which the track was recorded:
@@ -323,6 +413,8 @@ class OSCDevice(SensorItem):
 class CameraParameters(SensorItem):
     """CameraParameters is a SensorItem model class that can represent camera parameters"""
 
+    __slots__ = ("h_fov", "v_fov", "aperture", "projection")
+
     def __init__(self):
         super().__init__()
         # Horizontal field of view in degrees. If field of view is unknown, 0 is returned.
@@ -352,6 +444,8 @@ class CameraParameters(SensorItem):
 class ExifParameters(SensorItem):
     """ExifParameters is a SensorItem model class that can represent a focal and f number"""
 
+    __slots__ = ("focal_length", "width", "height")
+
     def __init__(self):
         super().__init__()
         self.focal_length: Optional[float] = None
@@ -4,26 +4,39 @@ This module is created in order to support the download of user uploaded data
 
 import logging
 import os
-from concurrent.futures import (
-    as_completed,
-    ThreadPoolExecutor,
-)
-from typing import List, Tuple
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
 
 from tqdm import tqdm
 
-from common.models import GPS
-from io_storage.storage import Local
+from download_manifest import DownloadManifest, ManifestFile, manifest_file
+from io_storage.storage import Local, Storage, storage_for_path
 from login_controller import LoginController
 from osc_api_config import OSCAPISubDomain
-from osc_api_gateway import OSCApi
+from osc_api_gateway import DOWNLOAD_REQUESTS, DownloadedFile, OSCApi, PHOTOS_PER_PAGE
 from osc_api_models import OSCPhoto
-from parsers.exif.exif import ExifParser
+from parsers.exif.utils import add_gps_tags_to_stream, create_required_gps_tags
 
 LOGGER = logging.getLogger('osc_tools.osc_utils')
 
 
-def download_user_images(to_path):
+DEFAULT_DOWNLOAD_WORKERS = 10
+# number of downloads waiting in the pool for every worker, this bounds the queued downloads
+PENDING_DOWNLOADS_PER_WORKER = 2
+# number of sequences having the photo list fetched while the photos of others are downloaded
+PREFETCHED_SEQUENCES = 2
+# number of photos listed by a worker before their downloads are queued
+LISTED_PHOTOS_PER_TASK = PHOTOS_PER_PAGE
+
+
+def download_user_images(to_path, workers: int = DEFAULT_DOWNLOAD_WORKERS, sync: bool = False):
+    """this method downloads the sequences of the logged in user. When sync is True the files
+    recorded by the previous downloads are verified and only the sequences having new, missing
+    or corrupt files are downloaded"""
     login_controller = LoginController(OSCAPISubDomain.PRODUCTION)
     # login to get the valid user
     user = login_controller.login()
@@ -36,78 +49,285 @@ def download_user_images(to_path):
                     "github")
         return
 
+    storage = storage_for_path(to_path)
     user_dir_path = os.path.join(to_path, user.name)
-    os.makedirs(user_dir_path, exist_ok=True)
-
-    # download each sequence
-    for sequence in tqdm(sequences, desc="Downloading sequences"):
-        if sequence is None or isinstance(sequence, BaseException):
-            continue
-
-        sequence_path = os.path.join(user_dir_path, str(sequence.online_id))
-        os.makedirs(sequence_path, exist_ok=True)
-
-        download_success, _ = _download_photo_sequence(osc_api,
-                                                       sequence,
-                                                       sequence_path,
-                                                       add_gps_to_exif=True)
-        if not download_success:
-            LOGGER.info("There was an error downloading the sequence: %s", str(sequence.online_id))
-            continue
-
-
-def _download_photo_sequence(osc_api: OSCApi,
-                             sequence,
-                             sequence_path: str,
-                             add_gps_to_exif: bool = False) -> Tuple[bool, List[OSCPhoto]]:
-    photos, error = osc_api.get_photos(sequence.online_id)
-    if error:
-        return False, []
-    # download metadata
-    if sequence.metadata_url is not None:
-        metadata_path = os.path.join(sequence_path, sequence.online_id + ".txt")
-        osc_api.download_resource(sequence.metadata_url, metadata_path, Local())
-        sequence.metadata_url = metadata_path
-
-    # download photos
-    download_success = True
-    download_bar = tqdm(total=len(photos),
-                        desc="Downloading sequence " + str(sequence.online_id))
-    with ThreadPoolExecutor(max_workers=10) as executors:
-        futures = [executors.submit(_download_photo,
-                                    photo,
-                                    sequence_path,
-                                    osc_api,
-                                    add_gps_to_exif) for photo in photos]
-        for future in as_completed(futures):
-            photo_success, _ = future.result()
-            download_success = download_success and photo_success
-            download_bar.update(1)
-    if not download_success:
-        LOGGER.info("Download failed for sequence %s", str(sequence.online_id))
-        return False, []
-    return True, photos
-
-
-def _download_photo(photo: OSCPhoto,
-                    folder_path: str,
-                    osc_api: OSCApi,
-                    add_gps_to_exif: bool = False):
-    photo_download_name = os.path.join(folder_path, str(photo.sequence_index) + ".jpg")
-    local_storage = Local()
-    photo_success, error = osc_api.download_resource(photo.photo_url(),
-                                                     photo_download_name,
-                                                     local_storage)
+    storage.makedirs(user_dir_path, exist_ok=True)
+
+    sequences = [sequence for sequence in sequences
+                 if sequence is not None and not isinstance(sequence, BaseException)]
+    manifest = DownloadManifest.load(user_dir_path, storage)
+    if sync:
+        bad_files_count = manifest.verify([sequence.online_id for sequence in sequences], workers)
+        downloaded_count = len(sequences)
+        sequences = [sequence for sequence in sequences
+                     if not manifest.is_complete(sequence.online_id)]
+        LOGGER.warning("Found %d downloaded sequences, %d missing or corrupt files, "
+                       "%d sequences to download",
+                       downloaded_count - len(sequences),
+                       bad_files_count,
+                       len(sequences))
+    scheduler = DownloadScheduler(osc_api,
+                                  workers,
+                                  add_gps_to_exif=True,
+                                  manifest=manifest,
+                                  storage=storage)
+    scheduler.download(sequences, user_dir_path)
+
+
+class SequenceDownload:
+    """SequenceDownload keeps the progress of the download of a sequence"""
+
+    def __init__(self, sequence, sequence_path: str):
+        self.sequence = sequence
+        self.sequence_path = sequence_path
+        self.photos: Optional[Iterator[OSCPhoto]] = None
+        self.listed = False
+        self.listed_photos_count = 0
+        self.remaining_downloads = 0
+        self.success = True
+
+
+class DownloadScheduler:
+    """DownloadScheduler downloads many sequences with at most workers downloads at once, the
+    downloads are submitted to the core of the api. The photo lists of the next sequences are
+    fetched while the photos and the metadata of the current sequences are downloaded, so the
+    downloads are kept busy across sequences. When a manifest
+    is given the downloaded files are recorded in the manifest and the recorded files that are
+    found in the storage are not downloaded again."""
+
+    def __init__(self, osc_api: OSCApi,
+                 workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 add_gps_to_exif: bool = False,
+                 manifest: Optional[DownloadManifest] = None,
+                 storage: Storage = Local()):
+        self.osc_api = osc_api
+        self.workers = max(workers, 1)
+        self.add_gps_to_exif = add_gps_to_exif
+        self.manifest = manifest
+        self.storage = storage
+        # coroutine function, arguments, downloaded file path and photo id of every queued download
+        self._ready_downloads: Deque[Tuple[Callable, tuple, str, Any, SequenceDownload]] = \
+            deque()
+        self._failed_sequences: List[SequenceDownload] = []
+
+    def download(self, sequences: List, to_path: str) -> List:
+        """this method downloads the sequences in folders named by the sequence id found at
+        to_path and returns the sequences that failed to download"""
+        sequences_bar = tqdm(total=len(sequences), desc="Downloading sequences")
+        files_bar = tqdm(total=0, desc="Downloading files", unit="file")
+        self._failed_sequences = []
+        pending_sequences = iter(sequences)
+        # the sequence download of every pending future
+        pending: Dict[Future, SequenceDownload] = {}
+        listing: Set[Future] = set()
+        max_pending = self.workers * PENDING_DOWNLOADS_PER_WORKER
+        self.osc_api.core.ensure_limit(DOWNLOAD_REQUESTS, self.workers)
+        # the listing workers only iterate the photo lists, the requests are made by the core
+        with ThreadPoolExecutor(max_workers=PREFETCHED_SEQUENCES) as executor, \
+                _saved_manifest(self.manifest):
+            while True:
+                while len(pending) < max_pending:
+                    if len(listing) < PREFETCHED_SEQUENCES and \
+                            len(self._ready_downloads) < max_pending:
+                        sequence = next(pending_sequences, None)
+                        if sequence is not None:
+                            sequence_download = self._sequence_download(sequence, to_path)
+                            future = executor.submit(self._photo_list, sequence_download)
+                            pending[future] = sequence_download
+                            listing.add(future)
+                            continue
+                    if not self._ready_downloads:
+                        break
+                    *download, sequence_download = self._ready_downloads.popleft()
+                    future = self.osc_api.core.submit(self._download_file(*download))
+                    pending[future] = sequence_download
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sequence_download = pending.pop(future)
+                    if future in listing:
+                        listing.remove(future)
+                        files_bar.total += self._schedule_sequence(future, sequence_download)
+                        files_bar.refresh()
+                        if not sequence_download.listed:
+                            # the downloads of the listed photos start while the rest of the
+                            # photos are listed
+                            future = executor.submit(self._photo_list, sequence_download)
+                            pending[future] = sequence_download
+                            listing.add(future)
+                    else:
+                        self._finish_download(future, sequence_download)
+                        files_bar.update(1)
+                    if sequence_download.listed and sequence_download.remaining_downloads == 0:
+                        self._finish_sequence(sequence_download)
+                        sequences_bar.update(1)
+        files_bar.close()
+        sequences_bar.close()
+        return [sequence_download.sequence for sequence_download in self._failed_sequences]
+
+    def _sequence_download(self, sequence, to_path: str) -> SequenceDownload:
+        sequence_path = os.path.join(to_path, str(sequence.online_id))
+        self.storage.makedirs(sequence_path, exist_ok=True)
+        return SequenceDownload(sequence, sequence_path)
+
+    def _photo_list(self, sequence_download: SequenceDownload) -> List[OSCPhoto]:
+        """this method returns the next photos of the sequence, the photo list is streamed by
+        the api so only a part of the list is read by a call"""
+        if sequence_download.photos is None:
+            sequence_download.photos = self.osc_api.iter_photos(
+                sequence_download.sequence.online_id,
+                sequence_download.sequence.total_images)
+        return list(islice(sequence_download.photos, LISTED_PHOTOS_PER_TASK))
+
+    def _schedule_sequence(self, future: Future, sequence_download: SequenceDownload) -> int:
+        """this method queues the downloads of the photos listed by future and returns the
+        number of queued files. The metadata of the sequence is queued with the first photos"""
+        # pylint: disable=W0703
+        try:
+            photos = future.result()
+        except Exception as error:
+            LOGGER.debug("Failed to get the photos of sequence %s: %s",
+                         str(sequence_download.sequence.online_id),
+                         error)
+            sequence_download.success = False
+            sequence_download.listed = True
+            return 0
+        queued_count = sequence_download.remaining_downloads
+        first_photos = sequence_download.listed_photos_count == 0
+        sequence_download.listed_photos_count += len(photos)
+        sequence_download.listed = len(photos) < LISTED_PHOTOS_PER_TASK
+        sequence = sequence_download.sequence
+        if first_photos and sequence.metadata_url is not None:
+            metadata_path = os.path.join(sequence_download.sequence_path,
+                                         str(sequence.online_id) + ".txt")
+            self._queue_download(self._download_metadata,
+                                 (sequence, metadata_path),
+                                 metadata_path,
+                                 None,
+                                 sequence_download)
+        for photo in photos:
+            self._queue_download(_download_photo,
+                                 (photo,
+                                  sequence_download.sequence_path,
+                                  self.osc_api,
+                                  self.storage,
+                                  self.add_gps_to_exif),
+                                 _photo_path(photo, sequence_download.sequence_path),
+                                 photo.photo_id,
+                                 sequence_download)
+        return sequence_download.remaining_downloads - queued_count
+
+    def _queue_download(self, function: Callable, arguments: tuple, file_path: str, photo_id,
+                        sequence_download: SequenceDownload):
+        if self.manifest is not None and \
+                self.manifest.has_file(sequence_download.sequence.online_id,
+                                       os.path.basename(file_path)) and \
+                self.storage.isfile(file_path):
+            return
+        sequence_download.remaining_downloads += 1
+        self._ready_downloads.append((function, arguments, file_path, photo_id,
+                                      sequence_download))
+
+    async def _download_file(self, function: Callable, arguments: tuple, file_path: str,
+                             photo_id) -> Tuple[bool,
+                                                Optional[Exception],
+                                                Optional[Tuple[str, ManifestFile]]]:
+        """this coroutine awaits a download coroutine function and returns its result and the
+        name and the record of the downloaded file. The record has the size and the md5 of the
+        written bytes, a file that was already downloaded is read in the executor of the core"""
+        success, error, written_file = await function(*arguments)
+        if not success or error or self.manifest is None:
+            return success, error, None
+        if written_file is not None:
+            downloaded_file = ManifestFile(written_file.size, written_file.md5, photo_id)
+        else:
+            downloaded_file = await self.osc_api.core.call(DOWNLOAD_REQUESTS,
+                                                           manifest_file,
+                                                           file_path,
+                                                           photo_id,
+                                                           self.storage)
+        if downloaded_file is None:
+            return success, error, None
+        return success, error, (os.path.basename(file_path), downloaded_file)
+
+    async def _download_metadata(self, sequence,
+                                 metadata_path: str) -> Tuple[bool,
+                                                              Optional[Exception],
+                                                              Optional[DownloadedFile]]:
+        success, error, written_file = await self.osc_api.download_resource_async(
+            sequence.metadata_url,
+            metadata_path,
+            self.storage)
+        if success:
+            sequence.metadata_url = metadata_path
+        return success, error, written_file
+
+    def _finish_download(self, future: Future, sequence_download: SequenceDownload):
+        sequence_download.remaining_downloads -= 1
+        # pylint: disable=W0703
+        try:
+            success, error, downloaded_file = future.result()
+        except Exception as exception:
+            success, error, downloaded_file = False, exception, None
+        if error or not success:
+            LOGGER.debug("Download failed for sequence %s: %s",
+                         str(sequence_download.sequence.online_id),
+                         error)
+            sequence_download.success = False
+        elif downloaded_file is not None:
+            name, manifest_file_record = downloaded_file
+            self.manifest.add_file(sequence_download.sequence.online_id,
+                                   name,
+                                   manifest_file_record)
+        elif self.manifest is not None:
+            sequence_download.success = False
+
+    def _finish_sequence(self, sequence_download: SequenceDownload):
+        if not sequence_download.success:
+            self._failed_sequences.append(sequence_download)
+            LOGGER.info("There was an error downloading the sequence: %s",
+                        str(sequence_download.sequence.online_id))
+        if self.manifest is not None:
+            self.manifest.set_complete(sequence_download.sequence.online_id,
+                                       sequence_download.success)
+            self.manifest.save_if_due()
+
+
+@contextmanager
+def _saved_manifest(manifest: Optional[DownloadManifest]):
+    """this context manager saves the manifest when the downloads end, also when they are
+    interrupted"""
+    try:
+        yield
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+
+def _photo_path(photo: OSCPhoto, folder_path: str) -> str:
+    return os.path.join(folder_path, str(photo.sequence_index) + ".jpg")
+
+
+async def _download_photo(photo: OSCPhoto,
+                          folder_path: str,
+                          osc_api: OSCApi,
+                          storage: Storage,
+                          add_gps_to_exif: bool = False) -> Tuple[bool,
+                                                                  Optional[Exception],
+                                                                  Optional[DownloadedFile]]:
+    """this coroutine downloads a photo, when add_gps_to_exif is True the gps tags of the photo are
+    added while the photo is downloaded, if the photo does not have a gps position"""
+    photo_download_name = _photo_path(photo, folder_path)
+    transform = None
+    if add_gps_to_exif and photo.latitude is not None and photo.longitude is not None:
+        gps_tags = create_required_gps_tags(photo.timestamp, photo.latitude, photo.longitude)
+        transform = partial(add_gps_tags_to_stream, gps_tags=gps_tags, skip_existing=True)
+    photo_success, error, written_file = await osc_api.download_resource_async(
+        photo.photo_url(),
+        photo_download_name,
+        storage,
+        transform=transform)
     if error or not photo_success:
         LOGGER.debug("Failed to download image: %s", photo.photo_url())
-
-    if add_gps_to_exif:
-        parser = ExifParser(photo_download_name, local_storage)
-        if len(parser.items_with_class(GPS)) == 0:
-            item = GPS()
-            item.latitude = photo.latitude
-            item.longitude = photo.longitude
-            item.timestamp = photo.timestamp
-            parser.add_items([item])
-            parser.serialize()
-    return photo_success, error
+    return photo_success, error, written_file
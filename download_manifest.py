@@ -0,0 +1,180 @@
+"""
+This module keeps the manifest of the downloaded user data, so a new download fetches only the
+sequences and the files that are missing or corrupt
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from io_storage.storage import Local, Storage
+
+LOGGER = logging.getLogger('osc_tools.download_manifest')
+
+MANIFEST_NAME = "download_manifest.json"
+MANIFEST_VERSION = 1
+# seconds between two saves of the manifest while downloading
+MANIFEST_SAVE_INTERVAL = 30
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ManifestFile:
+    """ManifestFile is the record of a downloaded file"""
+
+    def __init__(self, size: int, md5: str, photo_id=None):
+        self.size = size
+        self.md5 = md5
+        self.photo_id = photo_id
+
+    @classmethod
+    def from_path(cls, path: str, photo_id=None, storage: Storage = Local()) -> "ManifestFile":
+        """this method returns the record of the file found at path"""
+        return cls(storage.getsize(path), file_md5(path, storage), photo_id)
+
+    @classmethod
+    def from_json(cls, json_value: Dict) -> "ManifestFile":
+        return cls(json_value["size"], json_value["md5"], json_value.get("photo_id"))
+
+    def to_json(self) -> Dict:
+        return {"size": self.size, "md5": self.md5, "photo_id": self.photo_id}
+
+    def matches(self, path: str, storage: Storage = Local()) -> bool:
+        """this method returns True if the file found at path is the recorded file"""
+        try:
+            return storage.getsize(path) == self.size and file_md5(path, storage) == self.md5
+        except OSError:
+            return False
+
+
+class DownloadManifest:
+    """DownloadManifest keeps for every sequence of a user folder the downloaded files and if
+    all the files of the sequence were downloaded. The manifest is saved as a json file in the
+    user folder."""
+
+    def __init__(self, user_path: str, storage: Storage = Local()):
+        self.user_path = user_path
+        self.storage = storage
+        self.path = os.path.join(user_path, MANIFEST_NAME)
+        # sequence id -> file name -> file record
+        self._files: Dict[str, Dict[str, ManifestFile]] = {}
+        self._complete_sequences = set()
+        self._last_save_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, user_path: str, storage: Storage = Local()) -> "DownloadManifest":
+        """this method returns the manifest saved in the user folder, or an empty manifest if
+        there is no manifest or it can not be read"""
+        manifest = cls(user_path, storage)
+        try:
+            with storage.open(manifest.path, "r") as json_file:
+                json_manifest = json.load(json_file)
+        except FileNotFoundError:
+            return manifest
+        except (OSError, ValueError) as error:
+            LOGGER.warning("Could not read the download manifest %s: %s", manifest.path, error)
+            return manifest
+        if json_manifest.get("version") != MANIFEST_VERSION:
+            LOGGER.warning("Unknown download manifest version %s", json_manifest.get("version"))
+            return manifest
+        for sequence_id, json_sequence in json_manifest.get("sequences", {}).items():
+            manifest._files[sequence_id] = {
+                name: ManifestFile.from_json(json_file)
+                for name, json_file in json_sequence.get("files", {}).items()}
+            if json_sequence.get("complete", False):
+                manifest._complete_sequences.add(sequence_id)
+        return manifest
+
+    def save(self):
+        """this method writes the manifest in a temporary file that replaces the manifest file,
+        so an interrupted save does not lose the previous manifest"""
+        with self._lock:
+            json_manifest = {
+                "version": MANIFEST_VERSION,
+                "sequences": {
+                    sequence_id: {"complete": sequence_id in self._complete_sequences,
+                                  "files": {name: manifest_file.to_json()
+                                            for name, manifest_file in files.items()}}
+                    for sequence_id, files in self._files.items()}}
+        self.storage.makedirs(self.user_path, exist_ok=True)
+        temporary_path = os.path.join(self.user_path,
+                                      ".manifest-" + str(os.getpid()) + "-" +
+                                      str(threading.get_ident()) + ".tmp")
+        self.storage.put(json.dumps(json_manifest).encode(), temporary_path)
+        self.storage.rename(temporary_path, self.path)
+        self._last_save_time = time.monotonic()
+
+    def save_if_due(self):
+        """this method saves the manifest if it was not saved in the last seconds"""
+        if time.monotonic() - self._last_save_time >= MANIFEST_SAVE_INTERVAL:
+            self.save()
+
+    def sequence_path(self, sequence_id) -> str:
+        return os.path.join(self.user_path, str(sequence_id))
+
+    def is_complete(self, sequence_id) -> bool:
+        return str(sequence_id) in self._complete_sequences
+
+    def has_file(self, sequence_id, name: str) -> bool:
+        return name in self._files.get(str(sequence_id), {})
+
+    def add_file(self, sequence_id, name: str, file_record: ManifestFile):
+        with self._lock:
+            self._files.setdefault(str(sequence_id), {})[name] = file_record
+
+    def set_complete(self, sequence_id, complete: bool):
+        with self._lock:
+            self._files.setdefault(str(sequence_id), {})
+            if complete:
+                self._complete_sequences.add(str(sequence_id))
+            else:
+                self._complete_sequences.discard(str(sequence_id))
+
+    def verify(self, sequence_ids: List, workers: int) -> int:
+        """This method verifies in parallel the files of the complete sequences found in
+        sequence_ids. A missing or corrupt file is removed from the disk and from the manifest
+        and its sequence is not complete anymore, so it is downloaded again. It returns the
+        number of missing or corrupt files."""
+        checked_files: List[Tuple[str, str, ManifestFile]] = [
+            (str(sequence_id), name, manifest_file)
+            for sequence_id in sequence_ids if self.is_complete(sequence_id)
+            for name, manifest_file in self._files.get(str(sequence_id), {}).items()]
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            matches = executor.map(
+                lambda checked_file: checked_file[2].matches(
+                    os.path.join(self.sequence_path(checked_file[0]), checked_file[1]),
+                    self.storage),
+                checked_files)
+            bad_files = [(sequence_id, name)
+                         for (sequence_id, name, _), match in zip(checked_files, matches)
+                         if not match]
+        for sequence_id, name in bad_files:
+            LOGGER.debug("Missing or corrupt file %s of sequence %s", name, sequence_id)
+            file_path = os.path.join(self.sequence_path(sequence_id), name)
+            if self.storage.isfile(file_path):
+                self.storage.remove(file_path)
+            with self._lock:
+                del self._files[sequence_id][name]
+                self._complete_sequences.discard(sequence_id)
+        return len(bad_files)
+
+
+def file_md5(path: str, storage: Storage = Local()) -> str:
+    """this function returns the md5 of the file found at path, a file that was not changed since
+    it was hashed is not read again"""
+    return storage.unique_file_identifier(path, HASH_BLOCK_SIZE)
+
+
+def manifest_file(path: str, photo_id=None,
+                  storage: Storage = Local()) -> Optional[ManifestFile]:
+    """this function returns the record of the file found at path or None if the file can not
+    be read"""
+    try:
+        return ManifestFile.from_path(path, photo_id, storage)
+    except OSError as error:
+        LOGGER.debug("Could not read the downloaded file %s: %s", path, error)
+        return None
@@ -11,11 +11,12 @@ FeatureCollection. Each Feature from the FeatureCollection must contain the folo
 """
 import logging
 import os
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, Tuple
 
-from parsers.custom_data_parsers.custom_geojson import FeaturePhotoGeoJsonParser, PhotoGeoJson
-from parsers.exif.utils import create_required_gps_tags, add_optional_gps_tags, add_gps_tags
+from parsers.custom_data_parsers.custom_geojson import FeaturePhotoGeoJsonParser
+from parsers.exif.utils import create_required_gps_tags, add_optional_gps_tags
 from exif_data_generators.exif_generator_interface import ExifGenerator
+from exif_data_generators.tagging import tag_photos, DEFAULT_TAGGING_WORKERS
 from io_storage.storage import Local
 
 logger = logging.getLogger(__name__)
@@ -24,33 +25,58 @@ logger = logging.getLogger(__name__)
 class ExifCustomGeoJson(ExifGenerator):
 
     @staticmethod
-    def create_exif(path: str) -> bool:
+    def create_exif(path: str, workers: int = DEFAULT_TAGGING_WORKERS) -> bool:
+        """this method will generate exif data from all the geojson files found at path. The
+        photos are tagged by a pool of workers, a photo that already has its gps tags is not
+        written again and a photo or a geojson file that can not be used is logged and skipped"""
         logger.warning("Creating exif from custom geojson file %s", path)
-        for folder_path, _, files in os.walk(path):
-            for file in files:
-                _, file_extension = os.path.splitext(file)
-                if 'geojson' in file_extension:
-                    parser = FeaturePhotoGeoJsonParser(os.path.join(folder_path, file), Local())
-                    parser.start_new_reading()
-                    custom_photos: List[PhotoGeoJson] = parser.items_with_class(PhotoGeoJson)
-                    for photo in custom_photos:
-                        absolute_path = os.path.join(folder_path, photo.relative_image_path)
-                        if photo.gps.latitude and photo.gps.longitude:
-                            tags = create_required_gps_tags(photo.gps.timestamp,
-                                                            photo.gps.latitude,
-                                                            photo.gps.longitude)
-                            add_optional_gps_tags(tags,
-                                                  photo.gps.speed,
-                                                  photo.gps.altitude,
-                                                  photo.compass.compass)
-                            add_gps_tags(absolute_path, tags)
+        tag_photos(_photos_gps_tags(_geojson_paths(path)),
+                   workers,
+                   skip_matching=True,
+                   isolate_errors=True)
         return True
 
     @staticmethod
     def has_necessary_data(path) -> bool:
-        for _, _, files in os.walk(path):
-            for file in files:
-                _, file_extension = os.path.splitext(file)
-                if 'geojson' in file_extension:
-                    return True
-        return False
+        return next(_geojson_paths(path), None) is not None
+
+
+def _geojson_paths(path: str) -> Iterator[str]:
+    """This function yields the paths of the geojson files found in the tree at path while the
+    tree is scanned"""
+    try:
+        for entry in Local().scan(path, recursive=True, with_stat=False):
+            _, file_extension = os.path.splitext(entry.name)
+            if not entry.is_dir and 'geojson' in file_extension:
+                yield entry.path
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+
+
+def _photos_gps_tags(geojson_paths: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """This function returns the path and the gps tags of every photo of the geojson files. The
+    photos are read lazily in file order, a geojson file that can not be read is skipped from
+    the first feature that can not be read"""
+    for geojson_path in geojson_paths:
+        folder_path = os.path.dirname(geojson_path)
+        parser = FeaturePhotoGeoJsonParser(geojson_path, Local())
+        photos = parser.photos(sort_by_order=False)
+        while True:
+            # pylint: disable=W0703
+            try:
+                photo = next(photos, None)
+            except Exception as error:
+                logger.warning("Skipping the geojson file %s: %s", geojson_path, error)
+                break
+            if photo is None:
+                break
+            absolute_path = os.path.join(folder_path, photo.relative_image_path)
+            if photo.gps.latitude and photo.gps.longitude:
+                tags = create_required_gps_tags(photo.gps.timestamp,
+                                                photo.gps.latitude,
+                                                photo.gps.longitude)
+                add_optional_gps_tags(tags,
+                                      photo.gps.speed,
+                                      photo.gps.altitude,
+                                      photo.compass.compass)
+                yield absolute_path, tags
@@ -4,12 +4,14 @@ generation from any custom data source.
 """
 import abc
 
+from exif_data_generators.tagging import DEFAULT_TAGGING_WORKERS
+
 
 class ExifGenerator(metaclass=abc.ABCMeta):
 
     @staticmethod
     @abc.abstractmethod
-    def create_exif(path: str) -> bool:
+    def create_exif(path: str, workers: int = DEFAULT_TAGGING_WORKERS) -> bool:
         pass
 
     @staticmethod
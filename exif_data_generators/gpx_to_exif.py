@@ -0,0 +1,174 @@
+"""
+Exif generation from GPX tracks. The photos found in a folder are located on the tracks of the
+GPX files found in the same folder by their capture time, the position of a photo is
+interpolated between the track points recorded before and after the photo.
+"""
+import datetime
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import piexif
+
+from exif_data_generators.exif_generator_interface import ExifGenerator
+from exif_data_generators.tagging import tag_photos, DEFAULT_TAGGING_WORKERS
+from io_storage.storage import Local, StorageEntry
+from parsers.exif.utils import create_required_gps_tags, add_optional_gps_tags
+from parsers.exif.utils import datetime_from_string, timezone_from_offset
+from parsers.gpx import GPXParser
+
+if TYPE_CHECKING:
+    from exif_data_generators.track_interpolation import TrackPositions
+
+logger = logging.getLogger(__name__)
+
+
+class ExifGPXGenerator(ExifGenerator):
+
+    @staticmethod
+    def create_exif(path: str,
+                    workers: int = DEFAULT_TAGGING_WORKERS,
+                    time_offset: Optional[datetime.timezone] = None) -> bool:
+        """this method will generate exif data from the gpx files found at path. The capture
+        times are read and the photos are tagged by a pool of workers, a photo that already has
+        its gps tags is not written again. The capture time of a photo is converted to UTC with
+        the Exif offset time of the photo, or with time_offset if the photo has no offset time,
+        a photo having neither is considered captured in UTC"""
+        logger.warning("Creating exif from gpx files %s", path)
+        # numpy is imported only when the photos are located on a track
+        # pylint: disable=C0415
+        from exif_data_generators.track_interpolation import GPSTrack
+
+        track = GPSTrack.from_gps(gps for gpx_path in _gpx_paths(path)
+                                  for gps in GPXParser(gpx_path, Local()).iter_items())
+        if len(track) == 0:
+            logger.warning("WARNING: NO gpx track points found at %s", path)
+            return False
+
+        photo_paths = _photo_paths(path)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            capture_timestamps = list(executor.map(partial(_capture_timestamp,
+                                                           default_timezone=time_offset),
+                                                   photo_paths))
+        positions = track.locate(capture_timestamps)
+        located_count = int(positions[0].sum())
+        logger.warning("Located %d of %d photos on %d gpx track points",
+                       located_count,
+                       len(photo_paths),
+                       len(track))
+        _log_unlocated_photos(len(photo_paths) - located_count,
+                              capture_timestamps.count(None))
+        tag_photos(_photos_gps_tags(photo_paths, capture_timestamps, positions),
+                   workers,
+                   total=located_count,
+                   skip_matching=True,
+                   isolate_errors=True)
+        return True
+
+    @staticmethod
+    def has_necessary_data(path) -> bool:
+        return len(_gpx_paths(path)) > 0
+
+
+def _photos_gps_tags(photo_paths: List[str],
+                     capture_timestamps: List[Optional[float]],
+                     positions: "TrackPositions") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """This function returns the path and the gps tags of every photo located on the track"""
+    located, latitudes, longitudes, altitudes, headings = positions
+    for index in located.nonzero()[0]:
+        tags = create_required_gps_tags(capture_timestamps[index],
+                                        float(latitudes[index]),
+                                        float(longitudes[index]))
+        add_optional_gps_tags(tags,
+                              None,
+                              _optional_value(altitudes[index]),
+                              _optional_value(headings[index]))
+        yield photo_paths[index], tags
+
+
+def _gpx_paths(path: str) -> List[str]:
+    return [entry.path for entry in _file_entries(path)
+            if os.path.splitext(entry.name)[1].lower() == ".gpx"]
+
+
+def _photo_paths(path: str) -> List[str]:
+    photo_paths = []
+    for entry in _file_entries(path):
+        file_name, file_extension = os.path.splitext(entry.name)
+        if ("jpg" in file_extension.lower() or "jpeg" in file_extension.lower()) \
+                and "thumb" not in file_name.lower():
+            photo_paths.append(entry.path)
+    return photo_paths
+
+
+def _file_entries(path: str) -> List[StorageEntry]:
+    """This function returns the files found in the folder at path sorted by name"""
+    try:
+        entries = Local().scan(path, with_stat=False)
+        return sorted((entry for entry in entries if not entry.is_dir),
+                      key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _log_unlocated_photos(unlocated_count: int, without_time_count: int):
+    if without_time_count:
+        logger.warning("WARNING: %d photos have no capture time", without_time_count)
+    if unlocated_count > without_time_count:
+        logger.warning("WARNING: %d photos were captured outside the time of the gpx tracks, if "
+                       "the camera clock is not set to UTC and the photos have no Exif offset "
+                       "time use the --time-offset option",
+                       unlocated_count - without_time_count)
+
+
+def _capture_timestamp(path: str,
+                       default_timezone: Optional[datetime.timezone] = None) -> Optional[float]:
+    """This function returns the capture time of the photo, read as the exif parser reads it,
+    with the fraction of seconds when the photo has it. The time is read in the timezone of the
+    Exif offset time of the photo, or in default_timezone if the photo has no offset time. It
+    returns None if the photo has no capture time or if it can not be read"""
+    # pylint: disable=W0703
+    try:
+        exif_tags = piexif.load(path)["Exif"]
+    except Exception as error:
+        logger.debug("Could not read the capture time of %s: %s", path, error)
+        return None
+    for date_tag, sub_seconds_tag, offset_tag in ((piexif.ExifIFD.DateTimeOriginal,
+                                                   piexif.ExifIFD.SubSecTimeOriginal,
+                                                   piexif.ExifIFD.OffsetTimeOriginal),
+                                                  (piexif.ExifIFD.DateTimeDigitized,
+                                                   piexif.ExifIFD.SubSecTimeDigitized,
+                                                   piexif.ExifIFD.OffsetTimeDigitized)):
+        if date_tag not in exif_tags:
+            continue
+        date_time = datetime_from_string(exif_tags[date_tag].decode("ascii", "replace"),
+                                         "%Y:%m:%d %H:%M:%S")
+        if date_time is None:
+            return None
+        timezone = _photo_timezone(exif_tags, offset_tag) or default_timezone
+        if timezone is not None:
+            date_time = date_time.replace(tzinfo=timezone)
+        sub_seconds = exif_tags.get(sub_seconds_tag, b"").decode("ascii", "replace").strip()
+        if sub_seconds.isdigit():
+            return date_time.timestamp() + float("0." + sub_seconds)
+        return date_time.timestamp()
+    return None
+
+
+def _photo_timezone(exif_tags: Dict[int, Any], offset_tag: int) -> Optional[datetime.timezone]:
+    """This function returns the timezone of the offset time of a capture time, the offset time
+    of the photo is used when the capture time has no offset time"""
+    for tag in (offset_tag, piexif.ExifIFD.OffsetTime):
+        offset = exif_tags.get(tag)
+        if isinstance(offset, bytes):
+            timezone = timezone_from_offset(offset.decode("ascii", "replace").strip("\x00 "))
+            if timezone is not None:
+                return timezone
+    return None
+
+
+def _optional_value(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
@@ -3,14 +3,16 @@ This module is used to generate exif data from OSC Metadata file recorded by iOS
 """
 import logging
 import os
-from typing import cast, List
+from itertools import chain
+from typing import cast, Dict, Iterable, Iterator, Tuple, Any
 
 import constants
-from common.models import PhotoMetadata
+from common.models import PhotoMetadata, SensorItem
 from exif_data_generators.exif_generator_interface import ExifGenerator
+from exif_data_generators.tagging import tag_photos, DEFAULT_TAGGING_WORKERS
 from io_storage.storage import Local
 from osc_models import Photo
-from parsers.exif.utils import create_required_gps_tags, add_optional_gps_tags, add_gps_tags
+from parsers.exif.utils import create_required_gps_tags, add_optional_gps_tags
 from parsers.osc_metadata.parser import metadata_parser
 
 logger = logging.getLogger(__name__)
@@ -19,51 +21,62 @@ logger = logging.getLogger(__name__)
 class ExifMetadataGenerator(ExifGenerator):
 
     @staticmethod
-    def create_exif(path: str) -> bool:
-        """this method will generate exif data from metadata"""
+    def create_exif(path: str, workers: int = DEFAULT_TAGGING_WORKERS) -> bool:
+        """this method will generate exif data from metadata, the photos are tagged by a pool of
+        workers"""
         logger.warning("Creating exif from metadata file %s", path)
-        files = os.listdir(path)
-        photos = []
-        metadata_photos = []
+        photos = {}
+        metadata_path = None
 
-        for file_path in files:
-            file_name, file_extension = os.path.splitext(file_path)
+        for entry in Local().scan(path, with_stat=False):
+            file_name, file_extension = os.path.splitext(entry.name)
+            if entry.is_dir:
+                continue
             if ("jpg" in file_extension or "jpeg" in file_extension) \
                     and "thumb" not in file_name.lower():
-                photo = Photo(os.path.join(path, file_path))
                 if file_name.isdigit():
-                    photo.index = int(file_name)
-                photos.append(photo)
-            elif ".txt" in file_extension and constants.METADATA_NAME in file_path:
-                metadata_file = file_path
-                parser = metadata_parser(os.path.join(path, metadata_file), Local())
-                parser.start_new_reading()
-                metadata_photos = cast(List[PhotoMetadata], parser.items_with_class(PhotoMetadata))
+                    photos[int(file_name)] = Photo(entry.path)
+            elif ".txt" in file_extension and constants.METADATA_NAME in entry.name:
+                metadata_path = entry.path
 
-        if metadata_photos:
-            photos.sort(key=lambda x: int(os.path.splitext(os.path.basename(x.path))[0]))
-            metadata_photos.sort(key=lambda x: x.frame_index)
-        else:
+        if metadata_path is None:
             logger.warning("WARNING: NO metadata photos found at %s", path)
             return False
 
-        for photo in photos:
-            for tmp_photo in metadata_photos:
-                metadata_photo: PhotoMetadata = cast(PhotoMetadata, tmp_photo)
-                if (int(metadata_photo.frame_index) == photo.index and
-                        metadata_photo.gps.latitude and metadata_photo.gps.longitude):
-                    tags = create_required_gps_tags(metadata_photo.gps.timestamp,
-                                                    metadata_photo.gps.latitude,
-                                                    metadata_photo.gps.longitude)
-                    add_optional_gps_tags(tags,
-                                          metadata_photo.gps.speed,
-                                          metadata_photo.gps.altitude,
-                                          metadata_photo.compass.compass)
-                    add_gps_tags(photo.path, tags)
-                    break
+        with metadata_parser(metadata_path, Local()) as parser:
+            metadata_photos = parser.iter_items_with_class(PhotoMetadata)
+            first_metadata_photo = next(metadata_photos, None)
+            if first_metadata_photo is None:
+                logger.warning("WARNING: NO metadata photos found at %s", path)
+                return False
+            tag_photos(_photos_gps_tags(chain([first_metadata_photo], metadata_photos), photos),
+                       workers,
+                       total=len(photos))
 
         return True
 
     @staticmethod
     def has_necessary_data(path) -> bool:
         return os.path.isfile(os.path.join(path, constants.METADATA_NAME))
+
+
+def _photos_gps_tags(metadata_photos: Iterable[SensorItem],
+                     photos: Dict[int, Photo]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """This function joins the metadata photos with the photos by frame index and returns the
+    path and the gps tags of every matched photo. A photo takes the tags of the first metadata
+    photo having its frame index."""
+    for tmp_photo in metadata_photos:
+        metadata_photo: PhotoMetadata = cast(PhotoMetadata, tmp_photo)
+        if not metadata_photo.gps.latitude or not metadata_photo.gps.longitude:
+            continue
+        photo = photos.pop(int(metadata_photo.frame_index), None)
+        if photo is None:
+            continue
+        tags = create_required_gps_tags(metadata_photo.gps.timestamp,
+                                        metadata_photo.gps.latitude,
+                                        metadata_photo.gps.longitude)
+        add_optional_gps_tags(tags,
+                              metadata_photo.gps.speed,
+                              metadata_photo.gps.altitude,
+                              metadata_photo.compass.compass)
+        yield photo.path, tags
@@ -0,0 +1,118 @@
+"""
+This module is used by the exif generators to write the gps tags of many photos in parallel.
+"""
+import logging
+import os
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from tqdm import tqdm
+
+from parsers.exif.utils import add_gps_tags
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAGGING_WORKERS = os.cpu_count() or 1
+# number of photos waiting to be tagged for every worker, this bounds the photos read ahead
+PENDING_PHOTOS_PER_WORKER = 4
+
+
+class TaggingReport:
+    """TaggingReport keeps the progress and the throughput of a tagging run"""
+
+    def __init__(self, total: Optional[int] = None):
+        self.tagged_photos = 0
+        self.tagged_bytes = 0
+        self.skipped_photos = 0
+        self.failed_photos = 0
+        self._start_time = time.monotonic()
+        self._progress_bar = tqdm(total=total, desc="Writing exif", unit="photo",
+                                  dynamic_ncols=True)
+
+    def update(self, photo_size: int):
+        """this method adds a tagged photo having photo_size bytes to the report"""
+        self.tagged_photos += 1
+        self.tagged_bytes += photo_size
+        self._progress_bar.update(1)
+
+    def skip(self):
+        """this method adds a photo that already had the gps tags to the report"""
+        self.skipped_photos += 1
+        self._progress_bar.update(1)
+
+    def fail(self):
+        """this method adds a photo that could not be tagged to the report"""
+        self.failed_photos += 1
+        self._progress_bar.update(1)
+
+    def close(self):
+        """this method closes the progress bar and logs the throughput of the run"""
+        self._progress_bar.close()
+        duration = max(time.monotonic() - self._start_time, 1e-6)
+        logger.warning("Tagged %d photos in %.1fs, %.1f photos/s, %.1f MB/s",
+                       self.tagged_photos,
+                       duration,
+                       self.tagged_photos / duration,
+                       self.tagged_bytes / duration / (1024 * 1024))
+        if self.skipped_photos or self.failed_photos:
+            logger.warning("Skipped %d photos already having the gps tags, failed to tag %d photos",
+                           self.skipped_photos,
+                           self.failed_photos)
+
+
+def tag_photos(photos_tags: Iterable[Tuple[str, Dict[str, Any]]],
+               workers: int = DEFAULT_TAGGING_WORKERS,
+               total: Optional[int] = None,
+               skip_matching: bool = False,
+               isolate_errors: bool = False) -> TaggingReport:
+    """This function adds the gps tags to every (photo path, gps tags) pair of photos_tags using
+    a pool of workers. The pairs are consumed lazily, so they can be streamed from a parser.
+    When skip_matching is True the photos already having the gps tags are not written. When
+    isolate_errors is True the error of a photo is logged and the other photos are still tagged,
+    otherwise it is raised after the photos already sent to the workers are tagged."""
+    report = TaggingReport(total)
+    tag_photo = partial(_tag_photo, skip_matching=skip_matching)
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # the path of the photo tagged by every pending future
+            pending: Dict[Future, str] = {}
+            max_pending = max(workers, 1) * PENDING_PHOTOS_PER_WORKER
+            for path, gps_tags in photos_tags:
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    _update_report(report, done, pending, isolate_errors)
+                pending[executor.submit(tag_photo, path, gps_tags)] = path
+            done, _ = wait(pending)
+            _update_report(report, done, pending, isolate_errors)
+    finally:
+        report.close()
+    return report
+
+
+def _tag_photo(path: str, gps_tags: Dict[str, Any], skip_matching: bool) -> Optional[int]:
+    if not add_gps_tags(path, gps_tags, skip_matching=skip_matching):
+        return None
+    return os.path.getsize(path)
+
+
+def _update_report(report: TaggingReport,
+                   done: Set[Future],
+                   pending: Dict[Future, str],
+                   isolate_errors: bool):
+    for future in done:
+        path = pending.pop(future)
+        # pylint: disable=W0703
+        try:
+            photo_size = future.result()
+        except Exception as error:
+            if not isolate_errors:
+                raise
+            logger.warning("Failed to tag %s: %s", path, error)
+            report.fail()
+            continue
+        if photo_size is None:
+            report.skip()
+        else:
+            report.update(photo_size)
@@ -0,0 +1,110 @@
+"""
+This module is used to locate photos on a gps track by their capture time. The track points are
+kept in numpy arrays sorted by timestamp, the photos are located all at once with a binary
+search and their position is interpolated between the neighbouring track points.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from common.models import GPS
+
+# located, latitudes, longitudes, altitudes and headings of the located timestamps
+TrackPositions = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class GPSTrack:
+    """GPSTrack is a gps track sorted by timestamp that can locate photos by timestamp"""
+
+    def __init__(self,
+                 timestamps: np.ndarray,
+                 latitudes: np.ndarray,
+                 longitudes: np.ndarray,
+                 altitudes: np.ndarray):
+        order = np.argsort(timestamps, kind="stable")
+        self.timestamps = timestamps[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.altitudes = altitudes[order]
+        self._bearings = self._segment_bearings()
+
+    @classmethod
+    def from_gps(cls, gps_items: Iterable[GPS]) -> "GPSTrack":
+        """this method returns the track of the gps items having a timestamp and a position, a
+        missing altitude is kept as nan"""
+        values: List[Tuple[float, float, float, float]] = []
+        for gps in gps_items:
+            if gps.timestamp is None or gps.latitude is None or gps.longitude is None:
+                continue
+            values.append((gps.timestamp,
+                           gps.latitude,
+                           gps.longitude,
+                           gps.altitude if gps.altitude is not None else np.nan))
+        columns = np.array(values, dtype=np.float64).reshape(-1, 4)
+        return cls(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3])
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def locate(self, timestamps: Iterable[Optional[float]]) -> TrackPositions:
+        """This method returns for every timestamp if it is located on the track, the
+        interpolated latitude, longitude and altitude and the heading of the track at that
+        timestamp, as numpy arrays. A timestamp is located if it is not None and inside the time
+        range of the track, the heading is the bearing of the track segment having the
+        timestamp."""
+        times = np.array([np.nan if timestamp is None else timestamp for timestamp in timestamps],
+                         dtype=np.float64)
+        if len(self) == 0:
+            located = np.zeros(len(times), dtype=bool)
+            return located, times * np.nan, times * np.nan, times * np.nan, times * np.nan
+        located = (times >= self.timestamps[0]) & (times <= self.timestamps[-1])
+        right = np.clip(np.searchsorted(self.timestamps, times, side="right"), 1, len(self) - 1)
+        left = right - 1
+        if len(self) == 1:
+            right = left
+        duration = self.timestamps[right] - self.timestamps[left]
+        fraction = np.divide(times - self.timestamps[left],
+                             duration,
+                             out=np.zeros_like(times),
+                             where=duration > 0)
+        fraction = np.clip(fraction, 0.0, 1.0)
+        latitudes = self._interpolate(self.latitudes, left, right, fraction)
+        # the longitude is interpolated on the short way, also across the antimeridian
+        longitude_delta = (self.longitudes[right] - self.longitudes[left] + 180.0) % 360.0 - 180.0
+        longitudes = (self.longitudes[left] + fraction * longitude_delta + 180.0) % 360.0 - 180.0
+        altitudes = self._interpolate(self.altitudes, left, right, fraction)
+        headings = self._bearings[np.minimum(left, len(self._bearings) - 1)] \
+            if len(self._bearings) else times * np.nan
+        return located, latitudes, longitudes, altitudes, headings
+
+    @classmethod
+    def _interpolate(cls,
+                     values: np.ndarray,
+                     left: np.ndarray,
+                     right: np.ndarray,
+                     fraction: np.ndarray) -> np.ndarray:
+        interpolated = values[left] + fraction * (values[right] - values[left])
+        # a value missing on one side is taken from the other side
+        interpolated = np.where(np.isnan(interpolated), values[left], interpolated)
+        return np.where(np.isnan(interpolated), values[right], interpolated)
+
+    def _segment_bearings(self) -> np.ndarray:
+        """This method returns the initial bearing in degrees of every segment of the track. A
+        segment that does not move takes the bearing of the last segment that moves before it,
+        or of the first one after it"""
+        if len(self) < 2:
+            return np.empty(0, dtype=np.float64)
+        latitudes = np.radians(self.latitudes)
+        longitude_delta = np.radians(self.longitudes[1:] - self.longitudes[:-1])
+        y_values = np.sin(longitude_delta) * np.cos(latitudes[1:])
+        x_values = np.cos(latitudes[:-1]) * np.sin(latitudes[1:]) - \
+            np.sin(latitudes[:-1]) * np.cos(latitudes[1:]) * np.cos(longitude_delta)
+        bearings = np.degrees(np.arctan2(y_values, x_values)) % 360.0
+        moving = (self.latitudes[1:] != self.latitudes[:-1]) | \
+            (self.longitudes[1:] != self.longitudes[:-1])
+        if not moving.any():
+            return np.full(len(bearings), np.nan)
+        indexes = np.where(moving, np.arange(len(bearings)), -1)
+        indexes = np.maximum.accumulate(indexes)
+        indexes[indexes < 0] = np.argmax(moving)
+        return bearings[indexes]
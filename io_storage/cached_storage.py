@@ -0,0 +1,411 @@
+"""
+This module implements a Storage that keeps the blocks read from another storage in a least
+recently used cache, kept in memory and optionally on the disk, so reading the same file again
+does not read the wrapped storage, e.g. when the parsers of a photo read the same file of an
+object storage.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from io_storage.storage import SeekableReader, Storage, StorageEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_MEMORY_SIZE = 64 * 1024 * 1024
+DEFAULT_DISK_SIZE = 1024 * 1024 * 1024
+# seconds the version of a file is used before it is read again from the wrapped storage
+DEFAULT_VERSION_TTL = 10.0
+# number of file versions kept, the least recently read versions are removed first
+MAX_CACHED_VERSIONS = 100000
+BLOCK_FILE_EXTENSION = ".block"
+
+
+class CacheStats(NamedTuple):
+    """the counters of a block cache"""
+    hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    memory_size: int
+    disk_size: int
+
+
+class CacheSettings(NamedTuple):
+    """the settings of the caches of a CachedStorage, the files are read by blocks of block_size
+    bytes kept in a least recently used cache of memory_size bytes. When disk_path is given the
+    blocks are kept in a second cache of disk_size bytes in the disk_path folder, that is kept
+    between runs. The version of a file is read again from the storage after version_ttl
+    seconds"""
+    block_size: int = DEFAULT_BLOCK_SIZE
+    memory_size: int = DEFAULT_MEMORY_SIZE
+    disk_path: Optional[str] = None
+    disk_size: int = DEFAULT_DISK_SIZE
+    version_ttl: float = DEFAULT_VERSION_TTL
+
+
+# the storage implements the whole Storage interface and keeps the blocks, the versions and the
+# counters of its caches
+class CachedStorage(Storage):  # pylint: disable=R0902,R0904
+    """CachedStorage is a Storage that reads the files of storage by blocks kept in the caches
+    described by settings.
+    The blocks are cached for the version of the file, its size and its mtime or etag, so a
+    changed file is read again. The version of a file is read again from storage after
+    version_ttl seconds, the files changed by this storage are read again at once."""
+
+    def __init__(self, storage: Storage, settings: CacheSettings = CacheSettings()):
+        self.storage = storage
+        self.settings = settings
+        self._init_cache()
+
+    def _init_cache(self):
+        self._lock = threading.Lock()
+        self._memory_blocks: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_blocks: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        # path -> size, tag and the time when the version was read
+        self._versions: "OrderedDict[str, Tuple[int, str, float]]" = OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if self.settings.disk_path is not None:
+            self._load_disk_blocks()
+
+    def __getstate__(self):
+        # the memory cache is not shared with other processes, the disk cache is
+        state = {name: value for name, value in self.__dict__.items()
+                 if not name.startswith("_")}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_cache()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits,
+                              self._disk_hits,
+                              self._misses,
+                              self._evictions,
+                              self._memory_used,
+                              self._disk_used)
+
+    def clear(self):
+        """this method removes all the cached blocks and versions"""
+        with self._lock:
+            disk_keys = list(self._disk_blocks)
+            self._memory_blocks.clear()
+            self._disk_blocks.clear()
+            self._versions.clear()
+            self._memory_used = 0
+            self._disk_used = 0
+        for key in disk_keys:
+            self._remove_disk_block(key)
+
+    @property
+    def container_name(self):
+        return self.storage.container_name
+
+    @property
+    def storage_url(self):
+        return self.storage.storage_url
+
+    def listdir(self, path: str) -> List[str]:
+        return self.storage.listdir(path)
+
+    def walk(self, path: str):
+        return self.storage.walk(path)
+
+    def scan(self, path: str,
+             recursive: bool = False,
+             workers: int = 1,
+             with_stat: bool = True) -> Iterator[StorageEntry]:
+        return self.storage.scan(path, recursive, workers, with_stat)
+
+    def exists(self, path: str) -> bool:
+        return self.storage.exists(path)
+
+    def isdir(self, path: str) -> bool:
+        return self.storage.isdir(path)
+
+    def isfile(self, path: str) -> bool:
+        return self.storage.isfile(path)
+
+    def open(self, path: str, mode='r'):
+        if mode in ("r", "rb"):
+            size, tag = self.file_version(path)
+            reader = io.BufferedReader(_CachedReader(self, path, size, str(size) + "-" + tag),
+                                       buffer_size=self.settings.block_size)
+            return reader if "b" in mode else io.TextIOWrapper(reader, encoding="utf-8")
+        self._invalidate(path)
+        return _WrittenFile(self.storage.open(path, mode), lambda: self._invalidate(path))
+
+    def unique_file_identifier(self, file_path: str, block_size: int = 1024 * 1024) -> str:
+        # the whole file is read once, it is not kept in the cache
+        return self.storage.unique_file_identifier(file_path, block_size)
+
+    def unique_file_identifiers(self, file_paths: List[str],
+                                workers: int = 8) -> List[Optional[str]]:
+        return self.storage.unique_file_identifiers(file_paths, workers)
+
+    def abs_path(self, path: str) -> str:
+        return self.storage.abs_path(path)
+
+    def getsize(self, path: str) -> int:
+        return self.file_version(path)[0]
+
+    def getctime(self, path: str) -> float:
+        return self.storage.getctime(path)
+
+    def getmtime(self, path: str) -> float:
+        return self.storage.getmtime(path)
+
+    def rename(self, src: str, dst: str):
+        try:
+            return self.storage.rename(src, dst)
+        finally:
+            self._invalidate(src)
+            self._invalidate(dst)
+
+    def remove(self, path: str):
+        try:
+            return self.storage.remove(path)
+        finally:
+            self._invalidate(path)
+
+    def put(self, data, destination):
+        try:
+            return self.storage.put(data, destination)
+        finally:
+            self._invalidate(destination)
+
+    def makedirs(self, path: str, exist_ok: bool = False):
+        return self.storage.makedirs(path, exist_ok)
+
+    def file_version(self, path: str) -> Tuple[int, str]:
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(path)
+        if version is not None and now - version[2] < self.settings.version_ttl:
+            return version[0], version[1]
+        size, tag = self.storage.file_version(path)
+        with self._lock:
+            self._versions[path] = (size, tag, now)
+            self._versions.move_to_end(path)
+            if len(self._versions) > MAX_CACHED_VERSIONS:
+                self._versions.popitem(last=False)
+        return size, tag
+
+    def _invalidate(self, path: str):
+        with self._lock:
+            self._versions.pop(path, None)
+
+    def read_blocks(self, path: str, tag: str, first_block: int, last_block: int,
+                    file) -> List[bytes]:
+        """this method returns the blocks of the file from first_block to last_block, the
+        blocks that are not cached are read from file, every run of consecutive missing
+        blocks by a single read"""
+        keys = [_block_key(path, tag, index) for index in range(first_block, last_block + 1)]
+        blocks: List[Optional[bytes]] = [self._cached_block(key) for key in keys]
+        index = 0
+        while index < len(blocks):
+            if blocks[index] is not None:
+                index += 1
+                continue
+            run_end = index
+            while run_end + 1 < len(blocks) and blocks[run_end + 1] is None:
+                run_end += 1
+            file.seek((first_block + index) * self.settings.block_size)
+            data = file.read((run_end - index + 1) * self.settings.block_size)
+            with self._lock:
+                self._misses += run_end - index + 1
+            for block_index in range(index, run_end + 1):
+                offset = (block_index - index) * self.settings.block_size
+                blocks[block_index] = data[offset:offset + self.settings.block_size]
+                self._add_block(keys[block_index], blocks[block_index])
+            index = run_end + 1
+        return blocks
+
+    def _cached_block(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            block = self._memory_blocks.get(key)
+            if block is not None:
+                self._memory_blocks.move_to_end(key)
+                self._hits += 1
+                return block
+            on_disk = key in self._disk_blocks
+            if on_disk:
+                self._disk_blocks.move_to_end(key)
+        if not on_disk:
+            return None
+        try:
+            with open(self._disk_block_path(key), "rb") as block_file:
+                block = block_file.read()
+        except OSError:
+            with self._lock:
+                self._disk_used -= self._disk_blocks.pop(key, 0)
+            return None
+        with self._lock:
+            self._hits += 1
+            self._disk_hits += 1
+        self._add_block(key, block, to_disk=False)
+        return block
+
+    def _add_block(self, key: str, block: bytes, to_disk: bool = True):
+        removed_disk_keys = []
+        with self._lock:
+            if key not in self._memory_blocks and len(block) <= self.settings.memory_size:
+                self._memory_blocks[key] = block
+                self._memory_used += len(block)
+                while self._memory_used > self.settings.memory_size:
+                    _, evicted_block = self._memory_blocks.popitem(last=False)
+                    self._memory_used -= len(evicted_block)
+                    self._evictions += 1
+            if not to_disk or self.settings.disk_path is None or key in self._disk_blocks or \
+                    len(block) > self.settings.disk_size:
+                return
+            self._disk_blocks[key] = len(block)
+            self._disk_used += len(block)
+            while self._disk_used > self.settings.disk_size:
+                removed_key, removed_size = self._disk_blocks.popitem(last=False)
+                self._disk_used -= removed_size
+                removed_disk_keys.append(removed_key)
+        for removed_key in removed_disk_keys:
+            self._remove_disk_block(removed_key)
+        self._write_disk_block(key, block)
+
+    def _load_disk_blocks(self):
+        """this method finds the blocks kept in the disk cache by the previous runs, the least
+        recently written blocks are removed first"""
+        os.makedirs(self.settings.disk_path, exist_ok=True)
+        disk_blocks = []
+        with os.scandir(self.settings.disk_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(BLOCK_FILE_EXTENSION):
+                    stat = entry.stat()
+                    disk_blocks.append((stat.st_mtime, entry.name[:-len(BLOCK_FILE_EXTENSION)],
+                                        stat.st_size))
+        for _, key, size in sorted(disk_blocks):
+            self._disk_blocks[key] = size
+            self._disk_used += size
+        while self._disk_used > self.settings.disk_size:
+            key, size = self._disk_blocks.popitem(last=False)
+            self._disk_used -= size
+            self._remove_disk_block(key)
+
+    def _disk_block_path(self, key: str) -> str:
+        return os.path.join(self.settings.disk_path, key + BLOCK_FILE_EXTENSION)
+
+    def _write_disk_block(self, key: str, block: bytes):
+        block_path = self._disk_block_path(key)
+        temporary_path = block_path + "." + str(threading.get_ident()) + ".tmp"
+        try:
+            with open(temporary_path, "wb") as block_file:
+                block_file.write(block)
+            os.replace(temporary_path, block_path)
+        except OSError as error:
+            logger.debug("Could not write the cached block %s: %s", block_path, error)
+            with self._lock:
+                self._disk_used -= self._disk_blocks.pop(key, 0)
+
+    def _remove_disk_block(self, key: str):
+        try:
+            os.remove(self._disk_block_path(key))
+        except OSError:
+            pass
+
+
+class _CachedReader(SeekableReader):
+    """a seekable file reading the blocks of a file version from the cache of storage, the
+    wrapped file is opened when a block is not cached"""
+
+    def __init__(self, storage: CachedStorage, path: str, size: int, tag: str):
+        super().__init__(size)
+        self._storage = storage
+        self._path = path
+        self._tag = tag
+        self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+    def _read_range(self, position: int, size: int) -> bytes:
+        block_size = self._storage.settings.block_size
+        first_block = position // block_size
+        last_block = (position + size - 1) // block_size
+        if self._file is None:
+            self._file = _LazyFile(self._storage.storage, self._path)
+        data = b"".join(self._storage.read_blocks(self._path,
+                                                  self._tag,
+                                                  first_block,
+                                                  last_block,
+                                                  self._file))
+        start = position - first_block * block_size
+        return data[start:start + size]
+
+
+class _LazyFile:
+    """a file of storage that is opened by its first read"""
+
+    def __init__(self, storage: Storage, path: str):
+        self._storage = storage
+        self._path = path
+        self._file = None
+        self._position = 0
+
+    def seek(self, position: int):
+        self._position = position
+
+    def read(self, size: int) -> bytes:
+        if self._file is None:
+            self._file = self._storage.open(self._path, "rb")
+        self._file.seek(self._position)
+        data = self._file.read(size)
+        self._position += len(data)
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class _WrittenFile:
+    """a file opened for writing that calls on_close when it is closed"""
+
+    def __init__(self, file, on_close):
+        self._file = file
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        try:
+            self._file.close()
+        finally:
+            self._on_close()
+
+
+def _block_key(path: str, tag: str, index: int) -> str:
+    return hashlib.sha1((path + "\0" + tag + "\0" + str(index)).encode()).hexdigest()
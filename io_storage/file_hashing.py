@@ -0,0 +1,176 @@
+"""
+This module hashes the content of the files of a storage. Many files are hashed in parallel, the
+hash functions release the GIL while they digest a block, and the digests are kept in a
+persistent cache keyed by the path, the size and the version tag of the file, so a file is read
+again only when it is changed.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from io_storage.storage import CACHE_DIR_VARIABLE, Local, Storage
+
+logger = logging.getLogger(__name__)
+
+MD5 = "md5"
+# blake2b with a 128 bit digest, faster than md5 on 64 bit cpus
+BLAKE2B = "blake2b"
+# non cryptographic 128 bit digest, available only if the xxhash package is installed
+XXH3 = "xxh3"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DIGEST_CACHE_NAME = "file_digests.sqlite"
+# seconds a connection waits for the lock of a cache used by an other process
+DIGEST_CACHE_TIMEOUT = 30
+
+
+def hash_algorithms() -> List[str]:
+    """this function returns the hash algorithms that can be used in this environment"""
+    algorithms = [MD5, BLAKE2B]
+    if importlib.util.find_spec("xxhash") is not None:
+        algorithms.append(XXH3)
+    return algorithms
+
+
+def new_hash(algorithm: str = MD5):
+    """this function returns a new hash object of the algorithm, it raises ValueError if the
+    algorithm is unknown or not available"""
+    if algorithm == MD5:
+        return hashlib.md5()
+    if algorithm == BLAKE2B:
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == XXH3:
+        try:
+            # pylint: disable=C0415
+            import xxhash
+        except ImportError as error:
+            raise ValueError(f"The {XXH3} hash needs the xxhash package") from error
+        return xxhash.xxh3_128()
+    raise ValueError(f"Unknown hash algorithm {algorithm}")
+
+
+class DigestCache:
+    """DigestCache is a sqlite database of the digests of the files, a digest is valid while the
+    size and the version tag of its file are the same. The cache can be shared by threads and
+    by processes, without a path the digests are kept in memory"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path or ":memory:", timeout=DIGEST_CACHE_TIMEOUT,
+                                           check_same_thread=False)
+        with self._lock:
+            if path:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS digests ("
+                                     "path TEXT NOT NULL, algorithm TEXT NOT NULL, "
+                                     "size INTEGER NOT NULL, tag TEXT NOT NULL, "
+                                     "digest TEXT NOT NULL, PRIMARY KEY (path, algorithm))")
+            self._connection.commit()
+
+    def get(self, path: str, algorithm: str, version: Tuple[int, str]) -> Optional[str]:
+        """this method returns the digest of the file found at path or None if the file was not
+        hashed at this version"""
+        with self._lock:
+            row = self._connection.execute("SELECT size, tag, digest FROM digests "
+                                           "WHERE path = ? AND algorithm = ?",
+                                           (path, algorithm)).fetchone()
+        if row is None or (row[0], row[1]) != tuple(version):
+            return None
+        return row[2]
+
+    def put(self, path: str, algorithm: str, version: Tuple[int, str], digest: str):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)",
+                                     (path, algorithm, version[0], version[1], digest))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_DEFAULT_CACHE_LOCK = threading.Lock()
+_DEFAULT_CACHE: Optional[Tuple[int, Optional[str], DigestCache]] = None
+
+
+def default_digest_cache() -> DigestCache:
+    """this function returns the digest cache of this process, the cache is saved in the
+    OSC_CACHE_DIR folder if the environment variable is set, otherwise it is kept in memory"""
+    global _DEFAULT_CACHE  # pylint: disable=W0603
+    folder = os.environ.get(CACHE_DIR_VARIABLE)
+    path = os.path.join(folder, DIGEST_CACHE_NAME) if folder else None
+    with _DEFAULT_CACHE_LOCK:
+        # a connection must not be used by a forked process
+        if _DEFAULT_CACHE is None or _DEFAULT_CACHE[:2] != (os.getpid(), path):
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            _DEFAULT_CACHE = (os.getpid(), path, DigestCache(path))
+        return _DEFAULT_CACHE[2]
+
+
+class FileHasher:
+    """FileHasher computes the digests of the files of a storage"""
+
+    def __init__(self, storage: Storage = Local(), algorithm: str = MD5,
+                 workers: int = DEFAULT_WORKERS, cache: Optional[DigestCache] = None,
+                 block_size: int = HASH_BLOCK_SIZE):
+        new_hash(algorithm)
+        self.storage = storage
+        self.algorithm = algorithm
+        self.workers = workers
+        self.cache = cache
+        self.block_size = block_size
+
+    def digest(self, path: str) -> str:
+        """this method returns the hex digest of the file found at path, it raises OSError if
+        the file can not be read"""
+        if self.cache is None:
+            return self._hash(path)
+        cache_path = self.storage.abs_path(path)
+        version = self.storage.file_version(path)
+        digest = self.cache.get(cache_path, self.algorithm, version)
+        if digest is None:
+            digest = self._hash(path)
+            # a file changed while it was read has no digest of a single version
+            if self.storage.file_version(path) == version:
+                self.cache.put(cache_path, self.algorithm, version, digest)
+        return digest
+
+    def digests(self, paths: Iterable[str]) -> List[Optional[str]]:
+        """this method returns the hex digests of the files found at paths, in the same order,
+        the digest of a file that can not be read is None"""
+        paths = list(paths)
+        if len(paths) <= 1 or self.workers <= 1:
+            return [self._digest_or_none(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as executor:
+            return list(executor.map(self._digest_or_none, paths))
+
+    def _digest_or_none(self, path: str) -> Optional[str]:
+        try:
+            return self.digest(path)
+        except OSError as error:
+            logger.debug("Could not hash the file %s: %s", path, error)
+            return None
+
+    def _hash(self, path: str) -> str:
+        file_hash = new_hash(self.algorithm)
+        if isinstance(self.storage, Local):
+            # the blocks are read in the same buffer, without a copy of the file content
+            buffer = bytearray(self.block_size)
+            view = memoryview(buffer)
+            with open(path, "rb", buffering=0) as file:
+                for size in iter(lambda: file.readinto(buffer), 0):
+                    file_hash.update(view[:size])
+        else:
+            with self.storage.open(path, "rb") as file:
+                for block in iter(lambda: file.read(self.block_size), b""):
+                    file_hash.update(block)
+        return file_hash.hexdigest()
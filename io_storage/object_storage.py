@@ -0,0 +1,675 @@
+"""
+This module implements a Storage for the objects of an S3 compatible object storage, e.g. AWS S3
+or MinIO. The paths of the objects have the form s3://bucket/key, the folders are the prefixes of
+the keys delimited by "/".
+The files are read by ranged requests and written by multipart uploads, the folders are listed
+in parallel and all the requests share a pool of connections. InMemoryObjectClient is an object
+storage kept in memory that can replace the http client, e.g. to run the scripts without a
+server.
+"""
+import datetime
+import email.utils
+import hashlib
+import hmac
+import io
+import logging
+import os
+import posixpath
+import threading
+from xml.etree import ElementTree
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from io_storage.storage import SeekableReader, Storage, StorageEntry, OBJECT_STORAGE_SCHEME
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = "us-east-1"
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_LISTING_WORKERS = 8
+# bytes requested by a ranged read, a read of the whole file is done by a single request
+READ_BLOCK_SIZE = 512 * 1024
+# size of the parts of a multipart upload, S3 requires at least 5MB for all the parts but the
+# last one. A smaller file is written by a single request
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+# parts of a file that are uploaded at the same time
+PENDING_PARTS = 4
+REQUEST_TIMEOUT = 100
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b"").hexdigest()
+
+
+class ObjectInfo(NamedTuple):
+    """the attributes of a stored object"""
+    key: str
+    size: int
+    mtime: float
+    etag: str
+
+
+class ObjectStorageError(OSError):
+    """error returned by the object storage"""
+
+
+class ObjectClient:
+    """ObjectClient is a minimal client of the S3 REST api, signed by AWS signature version 4.
+    The requests use path style urls and share a session having a pool of max_connections
+    connections. A missing object raises FileNotFoundError, any other error returned by the
+    server raises ObjectStorageError."""
+
+    # the client is configured by the settings of the AWS clients
+    def __init__(self, endpoint_url: str,  # pylint: disable=R0913,R0917
+                 access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None,
+                 region: str = DEFAULT_REGION,
+                 session_token: Optional[str] = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.session_token = session_token
+        self.max_connections = max_connections
+        self.session = self._session()
+
+    def __getstate__(self):
+        # the session is not shared with other processes
+        state = self.__dict__.copy()
+        del state["session"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.session = self._session()
+
+    def _session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def head_object(self, bucket: str, key: str) -> ObjectInfo:
+        response = self._request("HEAD", bucket, key)
+        return ObjectInfo(key,
+                          int(response.headers.get("Content-Length", 0)),
+                          _http_date_timestamp(response.headers.get("Last-Modified")),
+                          response.headers.get("ETag", "").strip('"'))
+
+    def get_object(self, bucket: str, key: str,
+                   start: Optional[int] = None,
+                   end: Optional[int] = None,
+                   etag: Optional[str] = None) -> bytes:
+        """this method returns the bytes of the object from start to end, end included. If etag
+        is given then the object is read only if it was not changed"""
+        headers = {}
+        if start is not None:
+            headers["Range"] = "bytes=" + str(start) + "-" + ("" if end is None else str(end))
+        if etag:
+            headers["If-Match"] = '"' + etag + '"'
+        return self._request("GET", bucket, key, headers=headers).content
+
+    def put_object(self, bucket: str, key: str, data: bytes) -> str:
+        response = self._request("PUT", bucket, key, data=data)
+        return response.headers.get("ETag", "").strip('"')
+
+    def delete_object(self, bucket: str, key: str):
+        self._request("DELETE", bucket, key)
+
+    def copy_object(self, bucket: str, source_key: str, key: str):
+        source = "/" + bucket + "/" + quote(source_key, safe="/~")
+        self._request("PUT", bucket, key, headers={"x-amz-copy-source": source})
+
+    def list_objects(self, bucket: str, prefix: str,
+                     delimiter: Optional[str] = None,
+                     max_keys: Optional[int] = None) -> Tuple[List[ObjectInfo], List[str]]:
+        """this method returns the objects and the common prefixes found at prefix, all the
+        pages of the listing are read unless max_keys is given"""
+        objects = []
+        prefixes = []
+        continuation_token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if delimiter:
+                query["delimiter"] = delimiter
+            if max_keys:
+                query["max-keys"] = str(max_keys)
+            if continuation_token:
+                query["continuation-token"] = continuation_token
+            root = _xml_root(self._request("GET", bucket, "", query=query).content)
+            for content in root.iter("Contents"):
+                objects.append(ObjectInfo(content.findtext("Key"),
+                                          int(content.findtext("Size", "0")),
+                                          _iso_date_timestamp(content.findtext("LastModified")),
+                                          content.findtext("ETag", "").strip('"')))
+            for common_prefix in root.iter("CommonPrefixes"):
+                prefixes.append(common_prefix.findtext("Prefix"))
+            continuation_token = root.findtext("NextContinuationToken")
+            if max_keys or root.findtext("IsTruncated") != "true" or not continuation_token:
+                return objects, prefixes
+
+    def create_multipart_upload(self, bucket: str, key: str) -> str:
+        response = self._request("POST", bucket, key, query={"uploads": ""})
+        return _xml_root(response.content).findtext("UploadId")
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int,
+                    data: bytes) -> str:
+        response = self._request("PUT", bucket, key,
+                                 query={"partNumber": str(part_number), "uploadId": upload_id},
+                                 data=data)
+        return response.headers.get("ETag", "").strip('"')
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str,
+                                  etags: List[str]):
+        parts = "".join("<Part><PartNumber>" + str(part_number) + "</PartNumber><ETag>\"" +
+                        etag + "\"</ETag></Part>"
+                        for part_number, etag in enumerate(etags, start=1))
+        data = ("<CompleteMultipartUpload>" + parts + "</CompleteMultipartUpload>").encode()
+        response = self._request("POST", bucket, key, query={"uploadId": upload_id}, data=data)
+        # the server can return an error in the body of a 200 response
+        if _xml_root(response.content).tag == "Error":
+            raise ObjectStorageError("Could not complete the upload of " + key + ": " +
+                                     response.text)
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str):
+        self._request("DELETE", bucket, key, query={"uploadId": upload_id})
+
+    # the optional parts of the request are passed by name by the callers
+    def _request(self, method: str, bucket: str, key: str,  # pylint: disable=R0913,R0917
+                 query: Optional[Dict[str, str]] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 data: bytes = b"") -> requests.Response:
+        path = "/" + bucket + ("/" + quote(key, safe="/~") if key else "")
+        query_string = "&".join(quote(name, safe="-_.~") + "=" + quote(value, safe="-_.~")
+                                for name, value in sorted((query or {}).items()))
+        headers = dict(headers or {})
+        headers.update(self._signed_headers(method, path, query_string, headers, data))
+        url = self.endpoint_url + path + ("?" + query_string if query_string else "")
+        response = self.session.request(method, url,
+                                        headers=headers,
+                                        data=data or None,
+                                        timeout=REQUEST_TIMEOUT)
+        if response.status_code == 404:
+            raise FileNotFoundError("No object " + bucket + "/" + key)
+        if response.status_code >= 300:
+            raise ObjectStorageError(method + " " + bucket + "/" + key + " failed with status " +
+                                     str(response.status_code) + ": " + response.text[:200])
+        return response
+
+    def _signed_headers(self, method: str, path: str, query_string: str,
+                        headers: Dict[str, str], data: bytes) -> Dict[str, str]:
+        """this method returns the headers that sign the request by AWS signature version 4,
+        the requests are not signed when there are no credentials"""
+        payload_hash = hashlib.sha256(data).hexdigest() if data else EMPTY_PAYLOAD_HASH
+        now = _utc_now()
+        signed = {"host": self.endpoint_url.split("://", 1)[-1],
+                  "x-amz-content-sha256": payload_hash,
+                  "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ")}
+        if self.session_token:
+            signed["x-amz-security-token"] = self.session_token
+        if not self.access_key or not self.secret_key:
+            return {name: value for name, value in signed.items() if name != "host"}
+        for name, value in headers.items():
+            if name.lower().startswith("x-amz-") or name.lower() in ("range", "if-match"):
+                signed[name.lower()] = value.strip()
+        signed_names = ";".join(sorted(signed))
+        scope = now.strftime("%Y%m%d") + "/" + self.region + "/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256",
+                                    signed["x-amz-date"],
+                                    scope,
+                                    _canonical_request_hash(method, path, query_string, signed,
+                                                            payload_hash)])
+        signature = hmac.new(_signing_key(self.secret_key, scope),
+                             string_to_sign.encode(),
+                             hashlib.sha256).hexdigest()
+        signed["Authorization"] = "AWS4-HMAC-SHA256 Credential=" + self.access_key + "/" + \
+            scope + ", SignedHeaders=" + signed_names + ", Signature=" + signature
+        del signed["host"]
+        return signed
+
+
+class InMemoryObjectClient:
+    """InMemoryObjectClient is an object storage kept in memory having the interface of
+    ObjectClient"""
+
+    def __init__(self):
+        # bucket and key -> data, modification time and etag
+        self._objects: Dict[Tuple[str, str], Tuple[bytes, float, str]] = {}
+        # upload id -> bucket, key and parts of the multipart upload
+        self._uploads: Dict[str, Tuple[str, str, Dict[int, bytes]]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def head_object(self, bucket: str, key: str) -> ObjectInfo:
+        data, mtime, etag = self._object(bucket, key)
+        return ObjectInfo(key, len(data), mtime, etag)
+
+    def get_object(self, bucket: str, key: str,
+                   start: Optional[int] = None,
+                   end: Optional[int] = None,
+                   etag: Optional[str] = None) -> bytes:
+        data, _, object_etag = self._object(bucket, key)
+        if etag and etag != object_etag:
+            raise ObjectStorageError("The object " + bucket + "/" + key + " was changed")
+        start = start or 0
+        return data[start:len(data) if end is None else end + 1]
+
+    def put_object(self, bucket: str, key: str, data: bytes) -> str:
+        etag = hashlib.md5(data).hexdigest()
+        with self._lock:
+            self._objects[(bucket, key)] = (bytes(data), _now(), etag)
+        return etag
+
+    def delete_object(self, bucket: str, key: str):
+        with self._lock:
+            self._objects.pop((bucket, key), None)
+
+    def copy_object(self, bucket: str, source_key: str, key: str):
+        data, _, etag = self._object(bucket, source_key)
+        with self._lock:
+            self._objects[(bucket, key)] = (data, _now(), etag)
+
+    def list_objects(self, bucket: str, prefix: str,
+                     delimiter: Optional[str] = None,
+                     max_keys: Optional[int] = None) -> Tuple[List[ObjectInfo], List[str]]:
+        with self._lock:
+            keys = sorted((key, self._objects[(object_bucket, key)])
+                          for object_bucket, key in self._objects
+                          if object_bucket == bucket and key.startswith(prefix))
+        objects = []
+        prefixes = []
+        for key, (data, mtime, etag) in keys:
+            if delimiter and delimiter in key[len(prefix):]:
+                common_prefix = key[:key.index(delimiter, len(prefix)) + len(delimiter)]
+                if not prefixes or prefixes[-1] != common_prefix:
+                    prefixes.append(common_prefix)
+            else:
+                objects.append(ObjectInfo(key, len(data), mtime, etag))
+            if max_keys and len(objects) + len(prefixes) >= max_keys:
+                break
+        return objects, prefixes
+
+    def create_multipart_upload(self, bucket: str, key: str) -> str:
+        upload_id = hashlib.md5((bucket + "/" + key + str(_now())).encode()).hexdigest()
+        with self._lock:
+            self._uploads[upload_id] = (bucket, key, {})
+        return upload_id
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int,
+                    data: bytes) -> str:
+        with self._lock:
+            self._upload_parts(bucket, key, upload_id)[part_number] = bytes(data)
+        return hashlib.md5(data).hexdigest()
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str,
+                                  etags: List[str]):
+        with self._lock:
+            parts = self._upload_parts(bucket, key, upload_id)
+            del self._uploads[upload_id]
+        self.put_object(bucket, key, b"".join(parts[part_number]
+                                              for part_number in range(1, len(etags) + 1)))
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str):
+        with self._lock:
+            self._upload_parts(bucket, key, upload_id)
+            del self._uploads[upload_id]
+
+    def _upload_parts(self, bucket: str, key: str, upload_id: str) -> Dict[int, bytes]:
+        # an upload id is valid only for the object of its upload, as in S3
+        upload_bucket, upload_key, parts = self._uploads.get(upload_id, (None, None, None))
+        if (upload_bucket, upload_key) != (bucket, key):
+            raise ObjectStorageError("No upload " + upload_id + " of " + bucket + "/" + key)
+        return parts
+
+    def _object(self, bucket: str, key: str) -> Tuple[bytes, float, str]:
+        with self._lock:
+            if (bucket, key) not in self._objects:
+                raise FileNotFoundError("No object " + bucket + "/" + key)
+            return self._objects[(bucket, key)]
+
+
+class ObjectStorage(Storage):
+    """ObjectStorage is a Storage for the objects of an S3 compatible object storage. The
+    paths have the form s3://bucket/key. The objects can not be changed in place, a file opened
+    for writing is uploaded when it is closed and a file opened for appending is read first."""
+
+    def __init__(self, client, listing_workers: int = DEFAULT_LISTING_WORKERS):
+        self.client = client
+        self.listing_workers = listing_workers
+        self._executor = ThreadPoolExecutor(max_workers=max(listing_workers, PENDING_PARTS))
+
+    @classmethod
+    def from_environment(cls) -> "ObjectStorage":
+        """this method returns the object storage configured by the AWS environment variables,
+        AWS_ENDPOINT_URL is the url of a S3 compatible server e.g. http://localhost:9000"""
+        region = os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION",
+                                                             DEFAULT_REGION))
+        endpoint_url = os.environ.get("AWS_ENDPOINT_URL",
+                                      "https://s3." + region + ".amazonaws.com")
+        return cls(ObjectClient(endpoint_url,
+                                os.environ.get("AWS_ACCESS_KEY_ID"),
+                                os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                                region,
+                                os.environ.get("AWS_SESSION_TOKEN")))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_executor"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._executor = ThreadPoolExecutor(max_workers=max(self.listing_workers,
+                                                            PENDING_PARTS))
+
+    @property
+    def container_name(self):
+        return OBJECT_STORAGE_SCHEME.rstrip(":/")
+
+    @property
+    def storage_url(self):
+        return getattr(self.client, "endpoint_url", "")
+
+    def listdir(self, path: str) -> List[str]:
+        bucket, key = _bucket_key(path)
+        objects, prefixes = self.client.list_objects(bucket, _folder_prefix(key), "/")
+        names = _folder_names(_folder_prefix(key), objects, prefixes)
+        if not names[0] and not names[1]:
+            raise FileNotFoundError("No folder " + path)
+        return names[1] + names[0]
+
+    def walk(self, path: str):
+        """this method yields the folders found at path as os.walk does, top down. The folders
+        are listed in parallel, a folder removed from the yielded folder names is not listed"""
+        bucket, key = _bucket_key(path)
+        listings: Deque[Tuple[str, Future]] = deque()
+        listings.append((_path(bucket, key), self._list_folder(bucket, key)))
+        while listings:
+            folder_path, listing = listings.popleft()
+            try:
+                file_names, folder_names = listing.result()
+            except OSError as error:
+                logger.debug("Could not list %s: %s", folder_path, error)
+                continue
+            if not file_names and not folder_names and folder_path == _path(bucket, key):
+                return
+            yield folder_path, folder_names, file_names
+            for folder_name in folder_names:
+                sub_folder_path = posixpath.join(folder_path, folder_name)
+                listings.append((sub_folder_path,
+                                 self._list_folder(*_bucket_key(sub_folder_path))))
+
+    def _list_folder(self, bucket: str, key: str) -> Future:
+        def list_folder():
+            objects, prefixes = self.client.list_objects(bucket, _folder_prefix(key), "/")
+            return _folder_names(_folder_prefix(key), objects, prefixes)
+        return self._executor.submit(list_folder)
+
+    def scan(self, path: str,
+             recursive: bool = False,
+             workers: int = 1,
+             with_stat: bool = True) -> Iterator[StorageEntry]:
+        # the sub folders are listed by at least listing_workers requests at the same time
+        return super().scan(path, recursive, max(workers, self.listing_workers), with_stat)
+
+    def _scan_folder(self, path: str, with_stat: bool) -> List[StorageEntry]:
+        # the listing has the attributes of the files
+        bucket, key = _bucket_key(path)
+        prefix = _folder_prefix(key)
+        objects, prefixes = self.client.list_objects(bucket, prefix, "/")
+        folder_path = _path(bucket, key)
+        entries = [StorageEntry(info.key[len(prefix):],
+                                _path(bucket, info.key),
+                                False,
+                                info.size if with_stat else None,
+                                info.mtime if with_stat else None)
+                   for info in objects if info.key != prefix]
+        entries.extend(StorageEntry(name, posixpath.join(folder_path, name), True, None, None)
+                       for name in _folder_names(prefix, [], prefixes)[1])
+        if not entries:
+            raise FileNotFoundError("No folder " + path)
+        return entries
+
+    def exists(self, path: str) -> bool:
+        return self.isfile(path) or self.isdir(path)
+
+    def isdir(self, path: str) -> bool:
+        bucket, key = _bucket_key(path)
+        try:
+            objects, prefixes = self.client.list_objects(bucket, _folder_prefix(key), "/",
+                                                         max_keys=1)
+        except FileNotFoundError:
+            return False
+        return bool(objects or prefixes) or not key
+
+    def isfile(self, path: str) -> bool:
+        bucket, key = _bucket_key(path)
+        if not key:
+            return False
+        try:
+            self.client.head_object(bucket, key)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open(self, path: str, mode='r'):
+        bucket, key = _bucket_key(path)
+        if mode in ("r", "rb"):
+            reader = io.BufferedReader(_ObjectReader(self.client, bucket, key),
+                                       buffer_size=READ_BLOCK_SIZE)
+            return reader if "b" in mode else io.TextIOWrapper(reader, encoding="utf-8")
+        if mode in ("w", "wb", "a", "ab"):
+            writer = _ObjectWriter(self.client, self._executor, bucket, key)
+            if mode.startswith("a"):
+                try:
+                    writer.write(self.client.get_object(bucket, key))
+                except FileNotFoundError:
+                    pass
+            buffered_writer = io.BufferedWriter(writer, buffer_size=READ_BLOCK_SIZE)
+            return buffered_writer if "b" in mode else io.TextIOWrapper(buffered_writer,
+                                                                        encoding="utf-8")
+        raise ValueError("Unsupported mode " + mode + " for the object " + path)
+
+    def abs_path(self, path: str) -> str:
+        return _path(*_bucket_key(path))
+
+    def getsize(self, path: str) -> int:
+        return self.client.head_object(*_bucket_key(path)).size
+
+    def getctime(self, path: str) -> float:
+        # an object is created again when it is changed
+        return self.getmtime(path)
+
+    def getmtime(self, path: str) -> float:
+        return self.client.head_object(*_bucket_key(path)).mtime
+
+    def rename(self, src: str, dst: str):
+        bucket, key = _bucket_key(src)
+        destination_bucket, destination_key = _bucket_key(dst)
+        if destination_bucket != bucket:
+            raise ValueError("Can not move " + src + " to another bucket")
+        self.client.copy_object(bucket, key, destination_key)
+        self.client.delete_object(bucket, key)
+
+    def remove(self, path: str):
+        self.client.delete_object(*_bucket_key(path))
+
+    def put(self, data, destination):
+        with self.open(destination, "wb") as out_file:
+            out_file.write(data)
+
+    def makedirs(self, path: str, exist_ok: bool = False):
+        # the folders are the prefixes of the objects
+        pass
+
+    def file_version(self, path: str) -> Tuple[int, str]:
+        info = self.client.head_object(*_bucket_key(path))
+        return info.size, info.etag or str(info.mtime)
+
+
+class _ObjectReader(SeekableReader):
+    """a seekable file reading an object by ranged requests, the object is not read if it is
+    changed after it was opened"""
+
+    def __init__(self, client, bucket: str, key: str):
+        info = client.head_object(bucket, key)
+        super().__init__(info.size)
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._etag = info.etag
+
+    def _read_range(self, position: int, size: int) -> bytes:
+        return self._client.get_object(self._bucket, self._key,
+                                       position,
+                                       position + size - 1,
+                                       self._etag)
+
+
+class _ObjectWriter(io.RawIOBase):
+    """a file uploading an object when it is closed, the data bigger than a part is uploaded
+    by a multipart upload while it is written"""
+
+    def __init__(self, client, executor: ThreadPoolExecutor, bucket: str, key: str):
+        super().__init__()
+        self._client = client
+        self._executor = executor
+        self._bucket = bucket
+        self._key = key
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Future] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= MULTIPART_PART_SIZE:
+            self._upload_part(bytes(self._buffer[:MULTIPART_PART_SIZE]))
+            del self._buffer[:MULTIPART_PART_SIZE]
+        return len(data)
+
+    def _upload_part(self, data: bytes):
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(self._bucket, self._key)
+        pending_parts = [part for part in self._parts if not part.done()]
+        if len(pending_parts) >= PENDING_PARTS:
+            pending_parts[0].result()
+        self._parts.append(self._executor.submit(self._client.upload_part,
+                                                 self._bucket,
+                                                 self._key,
+                                                 self._upload_id,
+                                                 len(self._parts) + 1,
+                                                 data))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._client.put_object(self._bucket, self._key, bytes(self._buffer))
+            else:
+                try:
+                    if self._buffer:
+                        self._upload_part(bytes(self._buffer))
+                    self._client.complete_multipart_upload(self._bucket,
+                                                           self._key,
+                                                           self._upload_id,
+                                                           [part.result()
+                                                            for part in self._parts])
+                except BaseException:
+                    self._client.abort_multipart_upload(self._bucket, self._key,
+                                                        self._upload_id)
+                    raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+
+def _bucket_key(path: str) -> Tuple[str, str]:
+    if not path.startswith(OBJECT_STORAGE_SCHEME):
+        raise ValueError("Not an object storage path: " + path)
+    bucket, _, key = path[len(OBJECT_STORAGE_SCHEME):].partition("/")
+    key = posixpath.normpath(key).lstrip("/") if key.strip("/") else ""
+    return bucket, "" if key == "." else key
+
+
+def _path(bucket: str, key: str) -> str:
+    return OBJECT_STORAGE_SCHEME + bucket + ("/" + key if key else "")
+
+
+def _folder_prefix(key: str) -> str:
+    return key + "/" if key else ""
+
+
+def _folder_names(prefix: str, objects: List[ObjectInfo],
+                  prefixes: List[str]) -> Tuple[List[str], List[str]]:
+    """this function returns the names of the files and of the folders listed at prefix, the
+    empty object that some clients write as a folder is not a file"""
+    return ([info.key[len(prefix):] for info in objects if info.key != prefix],
+            [folder_prefix[len(prefix):].rstrip("/") for folder_prefix in prefixes])
+
+
+def _xml_root(content: bytes) -> ElementTree.Element:
+    root = ElementTree.fromstring(content)
+    # the tags are found without the S3 namespace
+    for element in root.iter():
+        element.tag = element.tag.rpartition("}")[2]
+    return root
+
+
+def _http_date_timestamp(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    return email.utils.parsedate_to_datetime(value).timestamp()
+
+
+def _iso_date_timestamp(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    return datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S") \
+        .replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _now() -> float:
+    return _utc_now().timestamp()
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _canonical_request_hash(method: str, path: str, query_string: str,
+                            signed: Dict[str, str], payload_hash: str) -> str:
+    """this function returns the hex sha256 of the canonical request of AWS signature version 4,
+    signed has the lower case names and the values of the signed headers"""
+    canonical_request = "\n".join([method,
+                                   path,
+                                   query_string,
+                                   "".join(name + ":" + signed[name] + "\n"
+                                           for name in sorted(signed)),
+                                   ";".join(sorted(signed)),
+                                   payload_hash])
+    return hashlib.sha256(canonical_request.encode()).hexdigest()
+
+
+def _signing_key(secret_key: str, scope: str) -> bytes:
+    """this function returns the key derived from the secret key for the date, the region and
+    the service of the scope"""
+    signing_key = ("AWS4" + secret_key).encode()
+    for scope_part in scope.split("/"):
+        signing_key = hmac.new(signing_key, scope_part.encode(), hashlib.sha256).digest()
+    return signing_key
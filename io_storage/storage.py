@@ -6,15 +6,33 @@ use the new storage type.
 """
 import abc
 import hashlib
+import io
 import os
 import logging
-
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# scheme of the paths of the objects of an object storage, see io_storage.object_storage
+OBJECT_STORAGE_SCHEME = "s3://"
+# environment variable having the folder of the disk cache of the remote storages
+CACHE_DIR_VARIABLE = "OSC_CACHE_DIR"
+
+
+class StorageEntry(NamedTuple):
+    """an entry found by Storage.scan, the size and the mtime are None for a folder and for a
+    file scanned without its attributes"""
+    name: str
+    path: str
+    is_dir: bool
+    size: Optional[int]
+    mtime: Optional[float]
 
-class Storage(metaclass=abc.ABCMeta):
+
+# the interface has the file operations used by the scripts, one method for every operation
+class Storage(metaclass=abc.ABCMeta):  # pylint: disable=R0904
 
     @property
     @abc.abstractmethod
@@ -50,12 +68,22 @@ class Storage(metaclass=abc.ABCMeta):
     def open(self, path: str, mode='r'):
         pass
 
-    def unique_file_identifier(self, file_path: str, block_size: int = 165536) -> str:
-        md5_hash = hashlib.md5()
-        with self.open(file_path, "rb") as file:
-            for block in iter(lambda: file.read(block_size), b""):
-                md5_hash.update(block)
-        return str(md5_hash.hexdigest())
+    def unique_file_identifier(self, file_path: str, block_size: int = 1024 * 1024) -> str:
+        """this method returns the md5 of the content of the file found at path, the digests
+        are kept in the digest cache of the process, see io_storage.file_hashing"""
+        # pylint: disable=C0415
+        from io_storage.file_hashing import FileHasher, default_digest_cache
+        return FileHasher(self, cache=default_digest_cache(),
+                          block_size=block_size).digest(file_path)
+
+    def unique_file_identifiers(self, file_paths: List[str],
+                                workers: int = 8) -> List[Optional[str]]:
+        """this method returns the unique_file_identifier of every file, the files are hashed in
+        parallel by workers threads and the identifier of a file that can not be read is None"""
+        # pylint: disable=C0415
+        from io_storage.file_hashing import FileHasher, default_digest_cache
+        return FileHasher(self, workers=workers,
+                          cache=default_digest_cache()).digests(file_paths)
 
     def unique_path_identifier(self, path):
         return hashlib.md5(self.abs_path(path).encode()).hexdigest()
@@ -87,6 +115,104 @@ class Storage(metaclass=abc.ABCMeta):
     def put(self, data, destination):
         raise NotImplementedError()
 
+    def makedirs(self, path: str, exist_ok: bool = False):
+        raise NotImplementedError()
+
+    def file_version(self, path: str) -> Tuple[int, str]:
+        """this method returns the size of the file found at path and a tag that is changed
+        when the file is changed"""
+        return self.getsize(path), str(self.getmtime(path))
+
+    def scan(self, path: str,
+             recursive: bool = False,
+             workers: int = 1,
+             with_stat: bool = True) -> Iterator[StorageEntry]:
+        """this method yields the entries of the folder found at path and, when recursive is
+        True, the entries of its sub folders. The entries of a folder are yielded before the
+        entries of its sub folders, that are scanned by a pool of workers threads. When
+        with_stat is False the size and the mtime of the files are not read."""
+        return _scan(self._scan_folder, path, recursive, workers, with_stat)
+
+    def _scan_folder(self, path: str, with_stat: bool) -> List[StorageEntry]:
+        entries = []
+        for name in self.listdir(path):
+            entry_path = os.path.join(path, name)
+            if self.isdir(entry_path):
+                entries.append(StorageEntry(name, entry_path, True, None, None))
+            elif with_stat:
+                entries.append(StorageEntry(name,
+                                            entry_path,
+                                            False,
+                                            self.getsize(entry_path),
+                                            self.getmtime(entry_path)))
+            else:
+                entries.append(StorageEntry(name, entry_path, False, None, None))
+        return entries
+
+
+class SeekableReader(io.RawIOBase):
+    """SeekableReader is a seekable raw file of size bytes, the subclasses read the bytes of a
+    range of the file in _read_range"""
+
+    def __init__(self, size: int):
+        super().__init__()
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("Negative seek position " + str(offset))
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        data = self._read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        return self._read(self._size - self._position)
+
+    def _read(self, size: int) -> bytes:
+        size = min(size, self._size - self._position)
+        if size <= 0:
+            return b""
+        data = self._read_range(self._position, size)
+        self._position += len(data)
+        return data
+
+    @abc.abstractmethod
+    def _read_range(self, position: int, size: int) -> bytes:
+        """this method returns the size bytes of the file found at position, size is greater
+        than 0 and the range is inside the file"""
+
+
+def storage_for_path(path: str) -> Storage:
+    """this function returns the storage of the files found at path, the paths starting with
+    s3:// are objects of the object storage configured by the AWS environment variables. The
+    blocks read from an object storage are cached in memory and, if the OSC_CACHE_DIR
+    environment variable is set, in the OSC_CACHE_DIR folder"""
+    if path.startswith(OBJECT_STORAGE_SCHEME):
+        # pylint: disable=C0415
+        from io_storage.object_storage import ObjectStorage
+        from io_storage.cached_storage import CacheSettings, CachedStorage
+        return CachedStorage(ObjectStorage.from_environment(),
+                             CacheSettings(disk_path=os.environ.get(CACHE_DIR_VARIABLE)))
+    return Local()
+
 
 class Local(Storage):
 
@@ -102,7 +228,7 @@ class Local(Storage):
         return os.listdir(path)
 
     def walk(self, path: str):
-        yield os.walk(path)
+        yield from os.walk(path)
 
     def exists(self, path: str) -> bool:
         return os.path.exists(path)
@@ -129,7 +255,7 @@ class Local(Storage):
         return os.path.getmtime(path)
 
     def rename(self, src: str, dst: str):
-        return os.rename(src, dst)
+        return os.replace(src, dst)
 
     def remove(self, path: str):
         return os.remove(path)
@@ -137,3 +263,57 @@ class Local(Storage):
     def put(self, data, destination):
         with open(destination, "wb") as out_file:
             out_file.write(data)
+
+    def makedirs(self, path: str, exist_ok: bool = False):
+        os.makedirs(path, exist_ok=exist_ok)
+
+    def file_version(self, path: str) -> Tuple[int, str]:
+        stat = os.stat(path)
+        return stat.st_size, str(stat.st_mtime_ns)
+
+    def _scan_folder(self, path: str, with_stat: bool) -> List[StorageEntry]:
+        # the type of an entry is read with its name, only the attributes of a file need a stat
+        entries = []
+        with os.scandir(path) as folder_entries:
+            for entry in folder_entries:
+                if entry.is_dir():
+                    entries.append(StorageEntry(entry.name, entry.path, True, None, None))
+                elif with_stat:
+                    stat = entry.stat()
+                    entries.append(StorageEntry(entry.name,
+                                                entry.path,
+                                                False,
+                                                stat.st_size,
+                                                stat.st_mtime))
+                else:
+                    entries.append(StorageEntry(entry.name, entry.path, False, None, None))
+        return entries
+
+
+def _scan(scan_folder: Callable[[str, bool], List[StorageEntry]],
+          path: str,
+          recursive: bool,
+          workers: int,
+          with_stat: bool) -> Iterator[StorageEntry]:
+    """this function yields the entries found by scan_folder at path and, when recursive is True,
+    in its sub folders. A sub folder that can not be scanned is skipped as os.walk does."""
+    entries = scan_folder(path, with_stat)
+    if not recursive:
+        yield from entries
+        return
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pending = deque()
+        while True:
+            for entry in entries:
+                yield entry
+                if entry.is_dir:
+                    pending.append((entry.path,
+                                    executor.submit(scan_folder, entry.path, with_stat)))
+            if not pending:
+                return
+            folder_path, future = pending.popleft()
+            try:
+                entries = future.result()
+            except OSError as error:
+                logger.debug("Could not scan %s: %s", folder_path, error)
+                entries = []
@@ -1,22 +1,47 @@
 """This module is used as a gateway to the OSC api."""
 import asyncio
+import base64
+import binascii
 import concurrent.futures
 import datetime
+import functools
 import hashlib
 import os.path
+import re
 import shutil
 import logging
-from typing import Tuple, Optional, List
+import threading
+import math
+from collections import deque
+from typing import (AsyncIterator, Callable, Coroutine, Deque, Dict, Iterable, Iterator, List,
+                    NamedTuple, Optional, Tuple)
 
 import requests
+import requests.adapters
 import constants
 import osc_api_config
-from io_storage.storage import Storage
+from io_storage.storage import Local, Storage
 from osc_api_config import OSCAPISubDomain
 from osc_api_models import OSCSequence, OSCPhoto, OSCUser
 
 LOGGER = logging.getLogger('osc_tools.osc_api_gateway')
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 100
+PHOTOS_PER_PAGE = 500
+# a function that edits the chunks of a downloaded file while they are written
+StreamTransform = Callable[[Iterator[bytes]], Iterable[bytes]]
+# number of photo list pages requested in parallel while the previous pages are read
+PHOTO_PAGES_LOOK_AHEAD = 4
+DEFAULT_MAX_CONNECTIONS = 32
+# kinds of requests bounded by the async core
+LISTING_REQUESTS = "listing"
+DOWNLOAD_REQUESTS = "download"
+UPLOAD_REQUESTS = "upload"
+DEFAULT_REQUEST_LIMITS = {LISTING_REQUESTS: 10,
+                          DOWNLOAD_REQUESTS: DEFAULT_MAX_CONNECTIONS,
+                          UPLOAD_REQUESTS: 20}
+
 
 def _upload_url(env: OSCAPISubDomain, resource: str) -> str:
     return _osc_url(env) + '/' + _version() + '/' + resource + '/'
@@ -137,11 +162,150 @@ class OSCApiMethods:
         return _osc_url(env) + '/' + _version() + '/sequence/finished-uploading/'
 
 
-class OSCApi:
-    """This class is a gateway for the API"""
-
-    def __init__(self, env: OSCAPISubDomain):
+# the core owns the session, the executor, the loop and the semaphores of the requests
+class AsyncHTTPCore:  # pylint: disable=R0902
+    """AsyncHTTPCore runs the requests of the api on one long lived event loop. The loop runs
+    in a daemon thread started by the first request. The requests are blocking calls of a
+    pooled requests session, so they are run by the executor of the core, and the number of
+    requests of a kind that run at once is bounded by a semaphore of that kind.
+    The coroutines of the core can be awaited from the loop of the core, the sync callers use
+    run or submit from any other thread. The bulk operations submit their coroutines to the
+    core, after raising the limit of their kind of requests to their number of workers."""
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 limits: Optional[Dict[str, int]] = None):
+        self.max_connections = max(max_connections, 1)
+        self.limits = dict(DEFAULT_REQUEST_LIMITS)
+        self.limits.update(limits or {})
+        self.session = requests.Session()
+        self._mount_adapter()
+        self._executor = self._new_executor()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """this property returns the loop of the core, the loop is started when it is first
+        needed"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(self._executor)
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="osc-api-loop",
+                                                daemon=True)
+                self._thread.start()
+            return self._loop
+
+    async def call(self, kind: str, function: Callable, *args, **kwargs):
+        """this coroutine runs the blocking function in the executor of the core, when less than
+        the limit of requests of kind are running"""
+        async with self._semaphore(kind):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                functools.partial(function, *args, **kwargs))
+
+    async def request(self, kind: str, method: str, url: str, **kwargs) -> requests.Response:
+        """this coroutine makes a request with the pooled session of the core"""
+        return await self.call(kind, self.session.request, method, url, **kwargs)
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """this method schedules the coroutine on the loop of the core and returns a future of
+        its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine):
+        """this method runs the coroutine on the loop of the core and waits for its result. It
+        can not be called from the thread of the loop, a coroutine running on the loop awaits
+        the coroutine instead"""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("AsyncHTTPCore.run called from the loop of the core")
+        return self.submit(coroutine).result()
+
+    def close(self):
+        """this method stops the loop and releases the connections of the core"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self._semaphores = {}
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def ensure_limit(self, kind: str, count: int):
+        """this method raises the number of requests of kind that run at once to count, the
+        connections and the threads of the core are raised with it. The requests already running
+        are not counted by the raised limit, so it is called before a bulk operation starts"""
+        with self._lock:
+            if count <= self.limits.get(kind, self.max_connections):
+                return
+            self.limits[kind] = count
+            more_connections = count > self.max_connections
+            if more_connections:
+                self.max_connections = count
+                self._mount_adapter()
+            if self._loop is not None:
+                # the semaphores and the executor are used only by the thread of the loop
+                self._loop.call_soon_threadsafe(self._apply_limit, kind, more_connections)
+            else:
+                self._apply_limit(kind, more_connections)
+
+    def _apply_limit(self, kind: str, more_connections: bool):
+        # the next request of kind creates the semaphore with the new limit
+        self._semaphores.pop(kind, None)
+        if more_connections:
+            previous_executor, self._executor = self._executor, self._new_executor()
+            # the requests already submitted are run by the previous executor
+            previous_executor.shutdown(wait=False)
+            if self._loop is not None:
+                self._loop.set_default_executor(self._executor)
+
+    def _mount_adapter(self):
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_connections,
+                                                pool_maxsize=self.max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _new_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.max_connections,
+                                                     thread_name_prefix="osc-api")
+
+    def _semaphore(self, kind: str) -> asyncio.Semaphore:
+        # the semaphores are created and used only by the thread of the loop
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.BoundedSemaphore(
+                self.limits.get(kind, self.max_connections))
+        return self._semaphores[kind]
+
+
+_ASYNC_CORE: Optional[AsyncHTTPCore] = None
+_ASYNC_CORE_LOCK = threading.Lock()
+
+
+def async_core() -> AsyncHTTPCore:
+    """this function returns the core shared by the api instances that are not given a core"""
+    global _ASYNC_CORE  # pylint: disable=W0603
+    with _ASYNC_CORE_LOCK:
+        if _ASYNC_CORE is None:
+            _ASYNC_CORE = AsyncHTTPCore()
+        return _ASYNC_CORE
+
+
+# every bulk request of the api has a sync method and a coroutine
+class OSCApi:  # pylint: disable=R0904
+    """This class is a gateway for the API. The requests of the API are made by an async core,
+    the bulk operations have a coroutine that can be awaited from the loop of the core and a
+    sync method that waits for the coroutine."""
+
+    def __init__(self, env: OSCAPISubDomain, core: Optional[AsyncHTTPCore] = None):
         self.environment = env
+        self.core = core if core is not None else async_core()
 
     @classmethod
     def __upload_response_success(cls, response: requests.Response,
@@ -183,7 +347,7 @@ class OSCApi:
                           'page': page,
                           'username': user_name}
             login_url = OSCApiMethods.user_sequences(self.environment)
-            response = requests.post(url=login_url, data=parameters)
+            response = self.core.session.post(url=login_url, data=parameters)
             json_response = response.json()
 
             sequences = []
@@ -204,7 +368,7 @@ class OSCApi:
                            'secret_token': secret
                            }
             login_url = OSCApiMethods.login(self.environment, provider)
-            response = requests.post(url=login_url, data=data_access)
+            response = self.core.session.post(url=login_url, data=data_access)
             json_response = response.json()
 
             if 'osv' in json_response:
@@ -244,79 +408,165 @@ class OSCApi:
 
     def get_photos(self, sequence_id, page=None) -> Tuple[List[OSCPhoto], Optional[Exception]]:
         try:
-            photo_url = OSCAPIResource.photo(self.environment)
-            has_more_data = True
-            photos = []
-            current_page = page
-            if page is None or page < 1:
-                current_page = 1
-            while has_more_data:
-                response = requests.get(photo_url,
-                                        params={"sequenceId": sequence_id,
-                                                "page": current_page,
-                                                "itemsPerPage": 500})
-                json_response = response.json()
-                result = json_response.get("result", {})
-                photo_list = result.get("data", [])
-                for photo_json in photo_list:
-                    photo = OSCPhoto.photo_from_json(photo_json)
-                    photos.append(photo)
-                has_more_data = result.get("hasMoreData", False)
-                if page is not None:
-                    break
-                if has_more_data:
-                    current_page += 1
+            if page is not None:
+                photos, _ = self._photo_page(sequence_id, max(page, 1))
+                return photos, None
+            return list(self.iter_photos(sequence_id)), None
+        except requests.RequestException as ex:
+            return [], ex
+
+    async def get_photos_async(self, sequence_id) -> Tuple[List[OSCPhoto], Optional[Exception]]:
+        """this coroutine returns all the photos of a sequence, see get_photos"""
+        photos = []
+        try:
+            async for page_photos in self.photo_pages_async(sequence_id):
+                photos.extend(page_photos)
             return photos, None
         except requests.RequestException as ex:
             return [], ex
 
+    def iter_photos(self, sequence_id,
+                    total_photos: Optional[int] = None,
+                    look_ahead: int = PHOTO_PAGES_LOOK_AHEAD) -> Iterator[OSCPhoto]:
+        """This method yields the photos of a sequence in the order of the pages. The first page
+        is requested alone, then up to look_ahead next pages are requested in parallel while the
+        photos of the previous pages are yielded. If total_photos, the estimated number of photos
+        of the sequence, is given then the pages after the estimated last page are requested only
+        if the last page has more data. A request error is raised by the iteration."""
+        pages = self.photo_pages_async(sequence_id, total_photos, look_ahead)
+        try:
+            while True:
+                try:
+                    photos = self.core.run(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield from photos
+        finally:
+            self.core.run(pages.aclose())
+
+    async def photo_pages_async(self, sequence_id,
+                                total_photos: Optional[int] = None,
+                                look_ahead: int = PHOTO_PAGES_LOOK_AHEAD
+                                ) -> AsyncIterator[List[OSCPhoto]]:
+        """this async generator yields the pages of photos of a sequence, see iter_photos. The
+        next pages are requested while the consumer awaits other work on the loop"""
+        photos, has_more_data = await self.core.call(LISTING_REQUESTS,
+                                                     self._photo_page,
+                                                     sequence_id,
+                                                     1)
+        yield photos
+        if not has_more_data:
+            return
+        last_page = None
+        if total_photos is not None:
+            last_page = max(math.ceil(total_photos / PHOTOS_PER_PAGE), 1)
+        pages: Deque[asyncio.Future] = deque()
+        try:
+            next_page = 2
+            while True:
+                while len(pages) < max(look_ahead, 1) and \
+                        (not pages or last_page is None or next_page <= last_page):
+                    pages.append(asyncio.ensure_future(self.core.call(LISTING_REQUESTS,
+                                                                      self._photo_page,
+                                                                      sequence_id,
+                                                                      next_page)))
+                    next_page += 1
+                photos, has_more_data = await pages.popleft()
+                yield photos
+                if not has_more_data or not photos:
+                    return
+        finally:
+            for page in pages:
+                page.cancel()
+
+    def _photo_page(self, sequence_id, page: int) -> Tuple[List[OSCPhoto], bool]:
+        """this method returns the photos of a page of the photo list and if there are more
+        pages after it"""
+        response = self.core.session.get(OSCAPIResource.photo(self.environment),
+                                         params={"sequenceId": sequence_id,
+                                                 "page": page,
+                                                 "itemsPerPage": PHOTOS_PER_PAGE})
+        json_response = response.json()
+        result = json_response.get("result", {})
+        photos = [OSCPhoto.photo_from_json(photo_json) for photo_json in result.get("data", [])]
+        return photos, result.get("hasMoreData", False)
+
+    # pylint: disable=R0913,R0917
     def download_all_images(self, photo_list: [OSCPhoto],
                             track_path: str,
                             override=False,
-                            workers: int = 10):
-        """This method will download all images to a path overriding or not the files at
-        that path. By default this method uses 10 parallel workers."""
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            loop = asyncio.new_event_loop()
-            futures = [
-                loop.run_in_executor(executor,
-                                     self.get_image, photo, track_path, override)
-                for photo in photo_list
-            ]
-            if not futures:
-                loop.close()
-                return
-
-            loop.run_until_complete(asyncio.gather(*futures))
-            loop.close()
-
-    def get_image(self, photo: OSCPhoto, path: str, override=False) -> Optional[Exception]:
-        """downloads the image at the path specified"""
+                            workers: int = 10,
+                            storage: Storage = Local()):
+        """This method will download all images to a path of the storage overriding or not the
+        files at that path. By default this method uses 10 parallel workers."""
+        self.core.run(self.download_all_images_async(photo_list, track_path, override, workers,
+                                                     storage))
+
+    async def download_all_images_async(self, photo_list: [OSCPhoto],
+                                        track_path: str,
+                                        override=False,
+                                        workers: int = 10,
+                                        storage: Storage = Local()) -> List[Optional[Exception]]:
+        """this coroutine downloads all images to a path with at most workers downloads at
+        once and returns the error of every image"""
+        self.core.ensure_limit(DOWNLOAD_REQUESTS, workers)
+        semaphore = asyncio.Semaphore(max(workers, 1))
+
+        async def download_image(photo: OSCPhoto) -> Optional[Exception]:
+            async with semaphore:
+                return await self.get_image_async(photo, track_path, override, storage)
+
+        return await asyncio.gather(*[download_image(photo) for photo in photo_list])
+    # pylint: enable=R0913,R0917
+
+    def get_image(self, photo: OSCPhoto, path: str, override=False,
+                  storage: Storage = Local()) -> Optional[Exception]:
+        """downloads the image at the path specified of the storage"""
+        return self.core.run(self.get_image_async(photo, path, override, storage))
+
+    async def get_image_async(self, photo: OSCPhoto,
+                              path: str,
+                              override=False,
+                              storage: Storage = Local()) -> Optional[Exception]:
+        """this coroutine downloads the image at the path specified"""
+        return await self.core.call(DOWNLOAD_REQUESTS, self._get_image, photo, path, override,
+                                    storage)
+
+    def _get_image(self, photo: OSCPhoto, path: str, override: bool,
+                   storage: Storage) -> Optional[Exception]:
         jpg_name = path + '/' + str(photo.sequence_index) + '.jpg'
-        if not override and os.path.isfile(jpg_name):
+        if not override and storage.isfile(jpg_name):
             return None
 
         try:
-            response = requests.get(OSCApiMethods.resource(self.environment,
-                                                           photo.image_name),
-                                    stream=True)
-            if response.status_code == 200:
-                with open(jpg_name, 'wb') as file:
-                    response.raw.decode_content = True
-                    shutil.copyfileobj(response.raw, file)
+            with self.core.session.get(OSCApiMethods.resource(self.environment,
+                                                              photo.image_name),
+                                       stream=True) as response:
+                if response.status_code == 200:
+                    with storage.open(jpg_name, 'wb') as file:
+                        response.raw.decode_content = True
+                        shutil.copyfileobj(response.raw, file)
         except requests.RequestException as ex:
             return ex
         return None
 
     def user_sequences(self, user_name: str) -> Tuple[List[OSCSequence], Exception]:
         """get all tracks for a user id """
+        return self.core.run(self.user_sequences_async(user_name))
+
+    async def user_sequences_async(self, user_name: str) -> Tuple[List[OSCSequence], Exception]:
+        """this coroutine gets all tracks for a user id, the pages after the first page are
+        requested in parallel"""
         LOGGER.debug("getting all sequences for user: %s", user_name)
         try:
             parameters = {'ipp': 100,
                           'page': 1,
                           'username': user_name}
-            json_response = requests.post(url=OSCApiMethods.user_sequences(self.environment),
-                                          data=parameters).json()
+            response = await self.core.request(LISTING_REQUESTS,
+                                               "POST",
+                                               OSCApiMethods.user_sequences(self.environment),
+                                               data=parameters)
+            json_response = response.json()
 
             if 'totalFilteredItems' not in json_response:
                 return [], Exception("OSC API bug missing totalFilteredItems from response")
@@ -330,26 +580,17 @@ class OSCApi:
                 for item in json_response['currentPageItems']:
                     sequences.append(OSCSequence.sequence_from_json(item))
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                loop = asyncio.new_event_loop()
-                futures = [
-                    loop.run_in_executor(executor,
-                                         self._sequence_page, user_name, page)
-                    for page in range(2, pages_count + 1)
-                ]
-                if not futures:
-                    loop.close()
-                    return sequences, None
-
-                done = loop.run_until_complete(asyncio.gather(*futures))
-                loop.close()
-
-                for sequence_page_return in done:
-                    # sequence_page method will return a tuple the first element
-                    # is a list of sequences
-                    sequences = sequences + sequence_page_return[0]
-
-                return sequences, None
+            done = await asyncio.gather(*[self.core.call(LISTING_REQUESTS,
+                                                         self._sequence_page,
+                                                         user_name,
+                                                         page)
+                                          for page in range(2, pages_count + 1)])
+            for page_sequences, error in done:
+                if error is not None:
+                    return None, error
+                sequences = sequences + page_sequences
+
+            return sequences, None
         except requests.RequestException as ex:
             return None, ex
 
@@ -359,31 +600,43 @@ class OSCApi:
         sequence_details_url = OSCApiMethods.sequence_details(self.environment)
         return _website(f"{sequence_details_url}/{str(sequence.online_id)}")
 
-    def download_metadata(self, sequence: OSCSequence, path: str, override=False):
-        """this method will download a metadata file of a sequence to the specified path.
-        If there is a metadata file at that path by default no override will be made."""
+    def download_metadata(self, sequence: OSCSequence, path: str, override=False,
+                          storage: Storage = Local()):
+        """this method will download a metadata file of a sequence to the specified path of the
+        storage. If there is a metadata file at that path by default no override will be made."""
+        return self.core.run(self.download_metadata_async(sequence, path, override, storage))
+
+    async def download_metadata_async(self, sequence: OSCSequence, path: str, override=False,
+                                      storage: Storage = Local()):
+        """this coroutine downloads the metadata file of a sequence, see download_metadata"""
+        return await self.core.call(DOWNLOAD_REQUESTS, self._download_metadata, sequence, path,
+                                    override, storage)
+
+    def _download_metadata(self, sequence: OSCSequence, path: str, override: bool,
+                           storage: Storage):
         if sequence.metadata_url is None:
             return None
         metadata_path = path + "/track.txt"
-        if not override and os.path.isfile(metadata_path):
+        if not override and storage.isfile(metadata_path):
             return None
 
         try:
-            response = requests.get(OSCApiMethods.resource(self.environment,
-                                                           sequence.metadata_url),
-                                    stream=True)
-            if response.status_code == 200:
-                with open(metadata_path, 'wb') as file:
-                    response.raw.decode_content = True
-                    shutil.copyfileobj(response.raw, file)
+            with self.core.session.get(OSCApiMethods.resource(self.environment,
+                                                              sequence.metadata_url),
+                                       stream=True) as response:
+                if response.status_code == 200:
+                    with storage.open(metadata_path, 'wb') as file:
+                        response.raw.decode_content = True
+                        shutil.copyfileobj(response.raw, file)
         except requests.RequestException as ex:
             return ex
 
         return None
 
-    def create_sequence(self, sequence: OSCSequence, token: str) -> Tuple[int, Exception]:
+    def create_sequence(self, sequence: OSCSequence, token: str,
+                        storage: Storage = Local()) -> Tuple[int, Exception]:
         """this method will create a online sequence from the current sequence and will return its
-        id as a integer or a exception if fail"""
+        id as a integer or a exception if fail. The metadata file is read from storage"""
         try:
             parameters = {'uploadSource': 'kv_tools-0.1.0',
                           'access_token': token,
@@ -397,15 +650,15 @@ class OSCApi:
 
             url = OSCApiMethods.sequence_create(self.environment)
             if sequence.metadata_url:
-                with open(sequence.metadata_url, 'rb') as metadata_file:
+                with storage.open(sequence.metadata_url, 'rb') as metadata_file:
                     load_data = {'metaData': (constants.METADATA_NAME,
                                               metadata_file,
                                               'text/plain')}
-                    response = requests.post(url,
-                                             data=parameters,
-                                             files=load_data)
+                    response = self.core.session.post(url,
+                                                      data=parameters,
+                                                      files=load_data)
             else:
-                response = requests.post(url, data=parameters)
+                response = self.core.session.post(url, data=parameters)
             json_response = response.json()
             if 'osv' in json_response:
                 osc_data = json_response["osv"]
@@ -424,8 +677,8 @@ class OSCApi:
         try:
             parameters = {'sequenceId': sequence.online_id,
                           'access_token': token}
-            response = requests.post(OSCApiMethods.finish_upload(self.environment),
-                                     data=parameters)
+            response = self.core.session.post(OSCApiMethods.finish_upload(self.environment),
+                                              data=parameters)
             json_response = response.json()
             if "status" not in json_response:
                 # we don't have a proper status documentation
@@ -434,25 +687,52 @@ class OSCApi:
         except requests.RequestException as ex:
             return None, ex
 
+    # pylint: disable=R0913,R0914,R0917
     def upload_video(self, access_token,
                      sequence_id,
                      video_path: str,
-                     video_index) -> Tuple[bool, Optional[Exception]]:
-        """This method will upload a video to OSC API"""
+                     video_index,
+                     storage: Storage = Local()) -> Tuple[bool, Optional[Exception]]:
+        """This method will upload a video, read from storage, to OSC API"""
+        return self.core.run(self.upload_video_async(access_token,
+                                                     sequence_id,
+                                                     video_path,
+                                                     video_index,
+                                                     storage))
+
+    async def upload_video_async(self, access_token,
+                                 sequence_id,
+                                 video_path: str,
+                                 video_index,
+                                 storage: Storage = Local()) -> Tuple[bool, Optional[Exception]]:
+        """this coroutine uploads a video to OSC API"""
+        return await self.core.call(UPLOAD_REQUESTS,
+                                    self._upload_video,
+                                    access_token,
+                                    sequence_id,
+                                    video_path,
+                                    video_index,
+                                    storage)
+
+    def _upload_video(self, access_token,
+                      sequence_id,
+                      video_path: str,
+                      video_index,
+                      storage: Storage) -> Tuple[bool, Optional[Exception]]:
         try:
             parameters = {'access_token': access_token,
                           'sequenceId': sequence_id,
                           'sequenceIndex': video_index
                           }
-            with open(video_path, 'rb') as video_file:
+            with storage.open(video_path, 'rb') as video_file:
                 load_data = {'video': (os.path.basename(video_path),
                                        video_file,
                                        'video/mp4')}
                 video_upload_url = OSCApiMethods.video_upload(self.environment)
-                response = requests.post(video_upload_url,
-                                         data=parameters,
-                                         files=load_data,
-                                         timeout=100)
+                response = self.core.session.post(video_upload_url,
+                                                  data=parameters,
+                                                  files=load_data,
+                                                  timeout=100)
             return OSCApi.__upload_response_success(response,
                                                     "video",
                                                     video_index,
@@ -461,14 +741,47 @@ class OSCApi:
             LOGGER.debug("Received exception on video upload %s", str(ex))
             return False, ex
 
-    # pylint: disable=R0913,R0914
     def upload_photo(self, access_token,
                      sequence_id,
                      photo: OSCPhoto,
                      photo_path: str,
                      fov=None,
-                     projection=None) -> Tuple[bool, Optional[Exception]]:
-        """This method will upload a photo to OSC API"""
+                     projection=None,
+                     storage: Storage = Local()) -> Tuple[bool, Optional[Exception]]:
+        """This method will upload a photo, read from storage, to OSC API"""
+        return self.core.run(self.upload_photo_async(access_token,
+                                                     sequence_id,
+                                                     photo,
+                                                     photo_path,
+                                                     fov,
+                                                     projection,
+                                                     storage))
+
+    async def upload_photo_async(self, access_token,
+                                 sequence_id,
+                                 photo: OSCPhoto,
+                                 photo_path: str,
+                                 fov=None,
+                                 projection=None,
+                                 storage: Storage = Local()) -> Tuple[bool, Optional[Exception]]:
+        """this coroutine uploads a photo to OSC API"""
+        return await self.core.call(UPLOAD_REQUESTS,
+                                    self._upload_photo,
+                                    access_token,
+                                    sequence_id,
+                                    photo,
+                                    photo_path,
+                                    fov,
+                                    projection,
+                                    storage)
+
+    def _upload_photo(self, access_token,
+                      sequence_id,
+                      photo: OSCPhoto,
+                      photo_path: str,
+                      fov=None,
+                      projection=None,
+                      storage: Storage = Local()) -> Tuple[bool, Optional[Exception]]:
         LOGGER.debug("uploading photo %s, sequence id %s", photo_path, sequence_id)
         try:
             shot_date = datetime.datetime.utcfromtimestamp(photo.timestamp)
@@ -493,14 +806,14 @@ class OSCApi:
             name = str(hashlib.md5(os.path.basename(photo.image_name).encode()).hexdigest())
             extension = os.path.split(photo.image_name)[1]
             name += extension
-            with open(photo_path, 'rb') as image_file:
+            with storage.open(photo_path, 'rb') as image_file:
                 load_data = {'photo': (name,
                                        image_file,
                                        'image/jpeg')}
-                response = requests.post(photo_upload_url,
-                                         data=parameters,
-                                         files=load_data,
-                                         timeout=100)
+                response = self.core.session.post(photo_upload_url,
+                                                  data=parameters,
+                                                  files=load_data,
+                                                  timeout=100)
             success = self.__upload_response_success(response,
                                                      "photo",
                                                      photo.sequence_index,
@@ -509,12 +822,12 @@ class OSCApi:
         except requests.RequestException as ex:
             LOGGER.debug("Received exception on photo upload %s", str(ex))
             return False, ex
-    # pylint: enable=R0913,R0914
+    # pylint: enable=R0913,R0914,R0917
 
     def get_sequence(self, sequence_id) -> Tuple[Optional[OSCSequence], Optional[Exception]]:
         try:
             sequence_url = OSCAPIResource.sequence(self.environment, sequence_id)
-            response = requests.get(sequence_url)
+            response = self.core.session.get(sequence_url)
             response.raise_for_status()
         except requests.RequestException as ex:
             return None, ex
@@ -528,18 +841,156 @@ class OSCApi:
         sequence = OSCSequence.from_json(sequence_json)
         return sequence, None
 
-    @staticmethod
-    def download_resource(resource_url: str,
+    # pylint: disable=R0913,R0914,R0917
+    def download_resource(self, resource_url: str,
                           file_path: str,
                           storage: Storage,
-                          override=False) -> Tuple[bool, Optional[Exception]]:
+                          override=False,
+                          resume=True,
+                          transform: Optional[StreamTransform] = None
+                          ) -> Tuple[bool, Optional[Exception], Optional["DownloadedFile"]]:
+        """This method streams the resource to a partial file that is renamed to file_path when
+        the download is complete. It returns the success, the error and the size and the md5 of
+        the bytes written to file_path, that are None if the file was not written. The size of
+        the received data is verified against the size sent by the server and its md5 against the
+        Content-MD5 header or the md5 ETag, when the server sends them. If resume is True and a
+        partial file was left by an interrupted download then only the missing bytes are
+        requested.
+        transform, if given, is called with the iterator of the received chunks and returns the
+        chunks that are written, e.g. to edit the file while it is downloaded. A partial file
+        written by a transform is not resumed."""
+        return self.core.run(self.download_resource_async(resource_url,
+                                                          file_path,
+                                                          storage,
+                                                          override,
+                                                          resume,
+                                                          transform))
+
+    async def download_resource_async(self, resource_url: str,
+                                      file_path: str,
+                                      storage: Storage,
+                                      override=False,
+                                      resume=True,
+                                      transform: Optional[StreamTransform] = None
+                                      ) -> Tuple[bool, Optional[Exception],
+                                                 Optional["DownloadedFile"]]:
+        """this coroutine downloads the resource to file_path, see download_resource"""
+        return await self.core.call(DOWNLOAD_REQUESTS, self._download_resource, resource_url,
+                                    file_path, storage, override, resume, transform)
+
+    def _download_resource(self, resource_url: str,
+                           file_path: str,
+                           storage: Storage,
+                           override=False,
+                           resume=True,
+                           transform: Optional[StreamTransform] = None
+                           ) -> Tuple[bool, Optional[Exception], Optional["DownloadedFile"]]:
         if not override and storage.isfile(file_path):
-            return True, None
+            return True, None, None
+        partial_path = file_path + "partial"
+        # the bytes written by a transform are not the bytes of the resource
+        resume = resume and transform is None
+        offset = storage.getsize(partial_path) if resume and storage.isfile(partial_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
         try:
-            with requests.get(resource_url) as response:
+            with self.core.session.get(resource_url,
+                                       headers=headers,
+                                       stream=True,
+                                       timeout=DOWNLOAD_TIMEOUT) as response:
+                if offset and response.status_code == 416:
+                    # the partial file is not a prefix of the resource anymore
+                    storage.remove(partial_path)
+                    return self._download_resource(resource_url, file_path, storage, override,
+                                                   resume=False)
                 response.raise_for_status()
-                storage.put(response.content, file_path + "partial")
-                storage.rename(file_path + "partial", file_path)
-            return True, None
+                if response.status_code != 206 or \
+                        _content_range_start(response) != offset:
+                    offset = 0
+                received_data = _ReceivedData()
+                if offset:
+                    with storage.open(partial_path, "rb") as partial_file:
+                        for block in iter(lambda: partial_file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                            received_data.update(block)
+                chunks = received_data.chunks(response.iter_content(DOWNLOAD_CHUNK_SIZE))
+                # the written bytes are the received bytes unless a transform changes them
+                written_data = received_data
+                if transform is not None:
+                    written_data = _ReceivedData()
+                    chunks = written_data.chunks(transform(chunks))
+                with storage.open(partial_path, "ab" if offset else "wb") as partial_file:
+                    for chunk in chunks:
+                        partial_file.write(chunk)
+                error = _download_verification_error(response, offset, received_data)
+            if error is not None:
+                storage.remove(partial_path)
+                return False, error, None
+            storage.rename(partial_path, file_path)
+            return True, None, DownloadedFile(written_data.size, written_data.md5_hash.hexdigest())
         except requests.RequestException as ex:
-            return False, ex
+            return False, ex, None
+    # pylint: enable=R0913,R0914,R0917
+
+
+class DownloadedFile(NamedTuple):
+    """the size and the md5 of the bytes written to a downloaded file"""
+    size: int
+    md5: str
+
+
+class _ReceivedData:
+    """_ReceivedData keeps the size and the md5 of the data received for a resource"""
+
+    def __init__(self):
+        self.size = 0
+        self.md5_hash = hashlib.md5()
+
+    def update(self, data: bytes):
+        self.size += len(data)
+        self.md5_hash.update(data)
+
+    def chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """this method yields the chunks and adds them to the received data"""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+
+def _content_range_start(response: requests.Response) -> Optional[int]:
+    content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", content_range)
+    return int(match.group(1)) if match else None
+
+
+def _download_verification_error(response: requests.Response,
+                                 offset: int,
+                                 received_data: _ReceivedData) -> Optional[Exception]:
+    """This function returns an exception if the received data does not match the size or the
+    md5 sent by the server. The sizes are not verified for an encoded response, their
+    Content-Length is the size of the encoded data"""
+    file_size = received_data.size
+    md5_hash = received_data.md5_hash
+    expected_size = None
+    if response.status_code == 206:
+        total_size = response.headers.get("Content-Range", "").rpartition("/")[2]
+        expected_size = int(total_size) if total_size.isdigit() else None
+    elif response.headers.get("Content-Length", "").isdigit() and \
+            response.headers.get("Content-Encoding", "identity") == "identity":
+        expected_size = offset + int(response.headers["Content-Length"])
+    if expected_size is not None and expected_size != file_size:
+        return Exception(f"Downloaded {file_size} bytes instead of {expected_size} bytes from "
+                         f"{response.url}")
+
+    expected_md5 = None
+    content_md5 = response.headers.get("Content-MD5")
+    if content_md5 and response.status_code == 200:
+        try:
+            expected_md5 = base64.b64decode(content_md5, validate=True).hex()
+        except binascii.Error:
+            LOGGER.debug("Invalid Content-MD5 header %s from %s", content_md5, response.url)
+    etag = response.headers.get("ETag", "").strip('"')
+    if expected_md5 is None and re.fullmatch(r"[0-9a-fA-F]{32}", etag):
+        expected_md5 = etag.lower()
+    if expected_md5 is not None and expected_md5 != md5_hash.hexdigest():
+        return Exception(f"Downloaded file md5 {md5_hash.hexdigest()} does not match the md5 "
+                         f"{expected_md5} of {response.url}")
+    return None
@@ -7,7 +7,7 @@ from typing import List, cast
 
 import constants
 from common.models import GPS, OSCDevice
-from io_storage.storage import Local
+from io_storage.storage import Local, Storage
 from parsers.custom_data_parsers.custom_mapillary import MapillaryExif
 from parsers.exif.exif import ExifParser
 from parsers.osc_metadata.parser import metadata_parser
@@ -31,16 +31,17 @@ class OSCUploadProgressDiscoverer:
         return False
 
     @classmethod
-    def discover(cls, path: str) -> List[str]:
+    def discover(cls, path: str, storage: Storage = Local()) -> List[str]:
         """this method will discover a upload progress file and parse it to get a progress list."""
         LOGGER.debug("will read uploaded indexes")
         progress_file_path = path + "/" + constants.PROGRESS_FILE_NAME
-        if not os.path.isfile(progress_file_path):
+        try:
+            with storage.open(progress_file_path, 'r') as input_file:
+                line = input_file.readline()
+                indexes = list(filter(None, line.split(";")))
+                return indexes
+        except FileNotFoundError:
             return []
-        with open(progress_file_path, 'r') as input_file:
-            line = input_file.readline()
-            indexes = list(filter(None, line.split(";")))
-            return indexes
 
 
 class OSCMetadataDiscoverer:
@@ -52,15 +53,15 @@ class OSCMetadataDiscoverer:
         return False
 
     @classmethod
-    def discover(cls, path: str) -> str:
+    def discover(cls, path: str, storage: Storage = Local()) -> str:
         """This method will discover osc metadata path"""
-        files = os.listdir(path)
+        files = storage.listdir(path)
         for file_path in files:
             file_name, file_extension = os.path.splitext(file_path)
             if ".txt" in file_extension and "track" in file_name:
                 return path + "/" + file_path
             if ".gz" in file_extension and "track" in file_name:
-                return unzip_metadata(path)
+                return unzip_metadata(path, storage)
         return None
     #     if no metadata found generate metadata from gpx or exif
 
@@ -69,15 +70,12 @@ class OnlineIDDiscoverer:
     """This class will discover online id of a sequence"""
 
     @classmethod
-    def discover(cls, path: str) -> str:
+    def discover(cls, path: str, storage: Storage = Local()) -> str:
         """This method will discover online id"""
         LOGGER.debug("searching for metadata %s", path)
         sequence_file_path = path + "/osc_sequence_id.txt"
-        if not os.path.isfile(sequence_file_path):
-            return None
-
         try:
-            with open(sequence_file_path) as json_file:
+            with storage.open(sequence_file_path) as json_file:
                 data = json.load(json_file)
                 if "id" in data and data["id"] and str.isdigit(data["id"]):
                     return int(data["id"])
@@ -92,7 +90,8 @@ class OnlineIDDiscoverer:
         print(osc_type)
 
 
-class SequenceDiscoverer:
+# the discoverer keeps the storage and the workers used by the discoverers of its parts
+class SequenceDiscoverer:  # pylint: disable=R0902
     """Seq discoverer base class"""
     def __init__(self):
         self.ignored_for_upload: bool = False
@@ -102,17 +101,17 @@ class SequenceDiscoverer:
         self.osc_metadata: OSCMetadataDiscoverer = OSCMetadataDiscoverer()
         self.upload_progress: OSCUploadProgressDiscoverer = OSCUploadProgressDiscoverer()
         self.validator: SequenceValidator = SequenceValidator()
+        self.discovery_workers: int = 1
+        self.storage: Storage = Local()
 
     def discover(self, path: str) -> [Sequence]:
         """This method will discover a valid sequence"""
-        files = os.listdir(path)
         sequences = []
-        for file_path in files:
-            full_path = os.path.join(path, file_path)
-            if os.path.isdir(full_path):
-                sequences = sequences + self.discover(full_path)
+        for entry in self.storage.scan(path, with_stat=False):
+            if entry.is_dir:
+                sequences = sequences + self.discover(entry.path)
         sequence = self.create_sequence(path)
-        if self.validator.validate(sequence):
+        if self.validator.validate(sequence, self.storage):
             sequences.append(sequence)
         else:
             LOGGER.debug("This sequence (%s) does not conform to this discoverer %s.", path,
@@ -123,18 +122,20 @@ class SequenceDiscoverer:
         """This method will discover all attributes af a sequence"""
         sequence = Sequence()
         if self.online_id:
-            sequence.online_id = self.online_id.discover(path)
+            sequence.online_id = self.online_id.discover(path, self.storage)
 
         if self.visual_data:
-            (visual_data, data_type) = self.visual_data.discover(path)
+            (visual_data, data_type) = self.visual_data.discover(path,
+                                                                 self.discovery_workers,
+                                                                 self.storage)
             sequence.visual_items = visual_data
             sequence.visual_data_type = data_type
 
         if self.osc_metadata:
-            sequence.osc_metadata = self.osc_metadata.discover(path)
+            sequence.osc_metadata = self.osc_metadata.discover(path, self.storage)
 
         if self.upload_progress:
-            sequence.progress = self.upload_progress.discover(path)
+            sequence.progress = self.upload_progress.discover(path, self.storage)
         sequence.path = path
         self._find_latitude_longitude_device_info(sequence)
 
@@ -143,25 +144,26 @@ class SequenceDiscoverer:
     def _find_latitude_longitude_device_info(self, sequence: Sequence):
         if not sequence.online_id:
             if sequence.osc_metadata and isinstance(self.validator, SequenceMetadataValidator):
-                parser = metadata_parser(sequence.osc_metadata, Local())
-                gps = cast(GPS, parser.next_item_with_class(GPS))
+                with metadata_parser(sequence.osc_metadata, self.storage) as parser:
+                    gps = cast(GPS, parser.next_item_with_class(GPS))
+                    device_info: OSCDevice = cast(OSCDevice,
+                                                  parser.next_item_with_class(OSCDevice))
                 if gps:
                     sequence.latitude = gps.latitude
                     sequence.longitude = gps.longitude
-                device_info: OSCDevice = cast(OSCDevice, parser.next_item_with_class(OSCDevice))
                 if device_info:
                     sequence.device = device_info.device_raw_name
                     sequence.platform = device_info.platform_name
             elif sequence.visual_items:
                 visual_item: VisualData = sequence.visual_items[0]
                 if isinstance(self.visual_data, ExifPhotoDiscoverer):
-                    parser = ExifParser(visual_item.path, Local())
+                    parser = ExifParser(visual_item.path, self.storage)
                     device_info: OSCDevice = parser.next_item_with_class(OSCDevice)
                     if device_info:
                         sequence.device = device_info.device_raw_name
                         sequence.platform = device_info.platform_name
                 if isinstance(self.visual_data, MapillaryExifDiscoverer):
-                    parser = MapillaryExif(visual_item.path, Local())
+                    parser = MapillaryExif(visual_item.path, self.storage)
                     device_info: OSCDevice = parser.next_item_with_class(OSCDevice)
                     if device_info:
                         sequence.device = device_info.device_raw_name
@@ -175,13 +177,20 @@ class SequenceDiscovererFactory:
     """Class that builds a list of sequence discoverers ready to use."""
 
     @classmethod
-    def discoverers(cls) -> [SequenceDiscoverer]:
-        """This is a factory method that will return Sequence Discoverers"""
-        return [cls.finished_discoverer(),
-                cls.photo_metadata_discoverer(),
-                cls.exif_discoverer(),
-                cls.mapillary_exif_discoverer(),
-                cls.video_discoverer()]
+    def discoverers(cls, discovery_workers: int = 1,
+                    storage: Storage = Local()) -> [SequenceDiscoverer]:
+        """This is a factory method that will return Sequence Discoverers. discovery_workers is
+        the number of processes used to parse the photo files of a sequence, storage is the
+        storage of the sequence files"""
+        discoverers = [cls.finished_discoverer(),
+                       cls.photo_metadata_discoverer(),
+                       cls.exif_discoverer(),
+                       cls.mapillary_exif_discoverer(),
+                       cls.video_discoverer()]
+        for discoverer in discoverers:
+            discoverer.discovery_workers = discovery_workers
+            discoverer.storage = storage
+        return discoverers
 
     @classmethod
     def photo_metadata_discoverer(cls) -> SequenceDiscoverer:
@@ -3,14 +3,18 @@
 
 import logging
 import os
-from argparse import ArgumentParser, RawTextHelpFormatter, SUPPRESS, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, RawTextHelpFormatter, SUPPRESS, Namespace
 
-from download import download_user_images
+from download import download_user_images, DEFAULT_DOWNLOAD_WORKERS
 from login_controller import LoginController
 from osc_api_config import OSCAPISubDomain
 from osc_uploader import OSCUploadManager
 from osc_utils import create_exif
+from exif_data_generators.tagging import DEFAULT_TAGGING_WORKERS
+from io_storage.storage import storage_for_path
 from osc_discoverer import SequenceDiscovererFactory
+from parsers.exif.utils import timezone_from_offset
+from parsers.osc_metadata.row_index import PERSIST_INDEX_VARIABLE
 
 LOGGER = logging.getLogger('osc_tools')
 OSC_LOG_FILE = 'OSC_logs.log'
@@ -78,16 +82,24 @@ def configure_log(args):
     LOGGER.addHandler(console)
 
 
+def configure_metadata_index(args):
+    """Method to enable the metadata row index sidecar files"""
+    if args.persist_metadata_index:
+        os.environ[PERSIST_INDEX_VARIABLE] = "1"
+
+
 def upload_command(args):
     """Upload sequence from a given path"""
+    configure_metadata_index(args)
     path = args.path
-    if not os.path.exists(path):
+    storage = storage_for_path(path)
+    if not storage.exists(path):
         LOGGER.warning("This is an invalid path.")
         return
 
     login_controller = configure_login(args)
-    upload_manager = OSCUploadManager(login_controller)
-    discoverers = SequenceDiscovererFactory.discoverers()
+    upload_manager = OSCUploadManager(login_controller, max_workers=args.workers, storage=storage)
+    discoverers = SequenceDiscovererFactory.discoverers(args.discovery_workers, storage)
     finished_list = []
     LOGGER.warning("Searching for sequences...")
     for discoverer in discoverers:
@@ -123,9 +135,12 @@ def upload_command(args):
 
 def exif_generation_command(args):
     """Generate Exif from metadata"""
+    configure_metadata_index(args)
     path = args.path
     LOGGER.warning("Trying to generating exif for images at path...")
-    create_exif(path, args.exif_source)
+    if args.time_offset is not None and args.exif_source != "gpx":
+        LOGGER.warning("The time offset is used only by the gpx exif source.")
+    create_exif(path, args.exif_source, args.workers, args.time_offset)
     LOGGER.warning("Finished.")
 
 
@@ -133,7 +148,7 @@ def download_current_user_data(args):
     """Download current user data if no user the user will be promted to login"""
     path = args.path
     LOGGER.debug("Started download current user data")
-    download_user_images(path)
+    download_user_images(path, args.workers, args.sync)
     LOGGER.warning("Done download current user data.")
 
 
@@ -146,7 +161,7 @@ def get_args() -> Namespace:
                                        description='upload          Uploads sequences from '
                                                    'a given path to KartaView\n'
                                                    'generate_exif   Generates Exif info for '
-                                                   'each image from a metadata file\n'
+                                                   'each image from a metadata or gpx file\n'
                                                    'download        Download the data that was '
                                                    'uploaded by your user',
                                        dest='sub command')
@@ -179,6 +194,22 @@ def _add_logging_argument(parser: ArgumentParser):
                         choices=['d', 'i', 'w'])
 
 
+def _time_offset(value: str):
+    timezone = timezone_from_offset(value)
+    if timezone is None:
+        raise ArgumentTypeError(f"invalid UTC offset {value}, expected eg. +02:00 or -05:30")
+    return timezone
+
+
+def _add_metadata_index_argument(parser: ArgumentParser):
+    parser.add_argument('--persist-metadata-index',
+                        required=False,
+                        action='store_true',
+                        help='Save the row index of every metadata file as a .idx file next to '
+                             'the metadata file,\nso the next runs on the same files read them '
+                             'faster. By default the index is kept in memory.')
+
+
 def create_parsers(subparsers: ArgumentParser):
     """Add all available parsers"""
     add_upload_parser(subparsers)
@@ -194,7 +225,11 @@ def add_upload_parser(subparsers):
                                '--path',
                                required=True,
                                help='Full path directory that contains sequence(s) '
-                                    'folder(s) to upload')
+                                    'folder(s) to upload.\n'
+                                    'A s3://bucket/folder path is read from the object '
+                                    'storage configured by the AWS_ENDPOINT_URL, '
+                                    'AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment '
+                                    'variables')
     upload_parser.add_argument('-w',
                                '--workers',
                                required=False,
@@ -204,6 +239,15 @@ def add_upload_parser(subparsers):
                                metavar="[1-20]",
                                help='Number of parallel workers used to upload files. '
                                     'Default number is 10.')
+    upload_parser.add_argument('--discovery-workers',
+                               required=False,
+                               type=int,
+                               default=os.cpu_count() or 1,
+                               metavar="N",
+                               help='Number of parallel processes used to read the Exif info '
+                                    'of the photos while searching for sequences.\n'
+                                    'Default number is the number of CPU cores.')
+    _add_metadata_index_argument(upload_parser)
     _add_environment_argument(upload_parser)
     _add_logging_argument(upload_parser)
 
@@ -216,10 +260,28 @@ def add_generate_exif_parser(subparsers):
                                  '--path',
                                  required=True,
                                  help='Folder PATH with metadata file '
-                                      '(OSC metadata, or custom geojson) and images')
+                                      '(OSC metadata, custom geojson or gpx) and images')
     generate_parser.add_argument('--exif_source',
                                  required=True,
-                                 choices=['metadata', "custom_geojson"])
+                                 choices=['metadata', "custom_geojson", "gpx"])
+    generate_parser.add_argument('--workers',
+                                 required=False,
+                                 type=int,
+                                 default=DEFAULT_TAGGING_WORKERS,
+                                 metavar="N",
+                                 help='Number of parallel workers used to write the Exif info '
+                                      'of the images.\n'
+                                      'Default number is the number of CPU cores.')
+    generate_parser.add_argument('--time-offset',
+                                 required=False,
+                                 type=_time_offset,
+                                 default=None,
+                                 metavar="[+-]HH:MM",
+                                 help='UTC offset of the camera clock, eg. +02:00, used with the '
+                                      'gpx exif source\nfor the photos that have no Exif offset '
+                                      'time. By default these photos are considered captured '
+                                      'in UTC.')
+    _add_metadata_index_argument(generate_parser)
     _add_logging_argument(generate_parser)
 
     return subparsers
@@ -233,7 +295,24 @@ def add_download_parser(subparsers):
     download_parser.add_argument('-p',
                                  '--path',
                                  required=True,
-                                 help='Folder PATH to download your data')
+                                 help='Folder PATH to download your data, a s3://bucket/folder '
+                                      'path is written to the object storage as for upload')
+    download_parser.add_argument('-w',
+                                 '--workers',
+                                 required=False,
+                                 type=int,
+                                 default=DEFAULT_DOWNLOAD_WORKERS,
+                                 metavar="N",
+                                 help='Number of parallel workers used to list and download '
+                                      'the photos of all the sequences.\n'
+                                      'Default number is 10.')
+    download_parser.add_argument('--sync',
+                                 required=False,
+                                 action='store_true',
+                                 help='Download only the sequences and the files that are new, '
+                                      'missing or corrupt since the previous downloads.\n'
+                                      'The downloaded files are verified with the download '
+                                      'manifest kept in the user folder.')
     _add_logging_argument(download_parser)
 
     return subparsers
@@ -3,7 +3,7 @@
 import logging
 import json
 import threading
-from concurrent.futures import as_completed, ThreadPoolExecutor
+from concurrent.futures import as_completed, wait, FIRST_COMPLETED, ThreadPoolExecutor
 # third party
 from typing import List
 
@@ -11,9 +11,11 @@ from tqdm import tqdm
 # local imports
 import constants
 from common.models import CameraProjection
+from io_storage.storage import Local, Storage
 from osc_discoverer import Sequence
 from visual_data_discover import Photo, Video
 from login_controller import LoginController
+from osc_api_gateway import UPLOAD_REQUESTS
 from osc_api_models import OSCPhoto, OSCSequence
 
 LOGGER = logging.getLogger('osc_uploader')
@@ -22,13 +24,15 @@ THREAD_LOCK = threading.Lock()
 
 class OSCUploadManager:
     """OSCUploadManager is a manager that is responsible with managing the upload of the
-    sequences received as input"""
-    def __init__(self, login_controller: LoginController, max_workers: int = 10):
+    sequences received as input, the files of the sequences are read from storage"""
+    def __init__(self, login_controller: LoginController, max_workers: int = 10,
+                 storage: Storage = Local()):
         self.progress_bar: tqdm = None
         self.sequences: List[Sequence] = []
         self.visual_data_count = 0
         self.login_controller: LoginController = login_controller
         self.max_workers = max_workers
+        self.storage = storage
 
     def add_sequence_to_upload(self, sequence: Sequence):
         """Method to add a sequence to upload queue"""
@@ -113,7 +117,9 @@ class SequenceUploadOperation:
             osc_api = self.manager.login_controller.osc_api
             response, _ = osc_api.finish_upload(sequence, self.user_token)
             if response:
-                self.__persist_upload_index(constants.UPLOAD_FINISHED, sequence.path)
+                self.__persist_upload_index(constants.UPLOAD_FINISHED,
+                                            sequence.path,
+                                            self.manager.storage)
                 return True, sequence
         return False, sequence
 
@@ -126,11 +132,13 @@ class SequenceUploadOperation:
         osc_sequence.platform = sequence.platform
         osc_sequence.device = sequence.device
         osc_api = self.manager.login_controller.osc_api
-        online_id, error = osc_api.create_sequence(osc_sequence, self.user_token)
+        online_id, error = osc_api.create_sequence(osc_sequence,
+                                                   self.user_token,
+                                                   self.manager.storage)
         sequence.online_id = online_id
         if error:
             return False, online_id
-        self.__persist_sequence_id(sequence.online_id, sequence.path)
+        self.__persist_sequence_id(sequence.online_id, sequence.path, self.manager.storage)
         return True, online_id
 
     def _visual_items_upload_with_operation(self, sequence, visual_item_upload_operation):
@@ -142,29 +150,40 @@ class SequenceUploadOperation:
         with THREAD_LOCK:
             self.manager.progress_bar.update(len(sequence.visual_items) - len(items_to_upload))
 
-        with ThreadPoolExecutor(max_workers=self.workers) as executor:
-            future_events = [executor.submit(visual_item_upload_operation.upload,
-                                             visual_item) for visual_item in items_to_upload]
-            for completed_event in as_completed(future_events):
+        # the uploads are submitted to the core of the api, at most workers uploads at once
+        core = self.manager.login_controller.osc_api.core
+        core.ensure_limit(UPLOAD_REQUESTS, self.workers)
+        items = iter(items_to_upload)
+        future_events = set()
+        while True:
+            for visual_item in items:
+                future_events.add(core.submit(visual_item_upload_operation.upload_async(
+                    visual_item)))
+                if len(future_events) >= self.workers:
+                    break
+            if not future_events:
+                break
+            completed_events, future_events = wait(future_events, return_when=FIRST_COMPLETED)
+            for completed_event in completed_events:
                 uploaded, index = completed_event.result()
                 with THREAD_LOCK:
                     if uploaded:
-                        self.__persist_upload_index(index, sequence.path)
+                        self.__persist_upload_index(index, sequence.path, self.manager.storage)
                         sequence.progress.append(index)
                     self.manager.progress_bar.update(1)
 
     @classmethod
-    def __persist_sequence_id(cls, sequence_id, path):
+    def __persist_sequence_id(cls, sequence_id, path, storage: Storage):
         LOGGER.debug("will save sequence_id into file")
         sequence_dict = {"id": sequence_id}
-        with open(path + "/osc_sequence_id.txt", 'w') as output:
+        with storage.open(path + "/osc_sequence_id.txt", 'w') as output:
             json.dump(sequence_dict, output)
             LOGGER.debug("Did write data to sequence_id file")
 
     @classmethod
-    def __persist_upload_index(cls, sequence_index, path):
+    def __persist_upload_index(cls, sequence_index, path, storage: Storage):
         LOGGER.debug("will save upload index into file")
-        with open(path + "/osc_sequence_upload_progress.txt", 'a') as output:
+        with storage.open(path + "/osc_sequence_upload_progress.txt", 'a') as output:
             output.write(str(sequence_index) + ";")
 
 
@@ -187,15 +206,20 @@ class VideoUploadOperation:
     def upload(self, video: Video) -> (bool, int):
         """This method will upload the video corresponding to the video model
         received as parameter. It returns a tuple: success as bool and video index as int"""
+        return self.manager.login_controller.osc_api.core.run(self.upload_async(video))
+
+    async def upload_async(self, video: Video) -> (bool, int):
+        """this coroutine uploads the video on the core of the api, see upload"""
         user = self.manager.login_controller.user
         api = self.manager.login_controller.osc_api
 
         uploaded = False
         for _ in range(0, 10):
-            uploaded, _ = api.upload_video(user.access_token,
-                                           self.sequence_id,
-                                           video.path,
-                                           video.index)
+            uploaded, _ = await api.upload_video_async(user.access_token,
+                                                       self.sequence_id,
+                                                       video.path,
+                                                       video.index,
+                                                       self.manager.storage)
             if uploaded:
                 break
             LOGGER.debug("Will request upload %s", video.path)
@@ -222,6 +246,10 @@ class PhotoUploadOperation:
     def upload(self, photo: Photo) -> (bool, int):
         """This method will upload the image corresponding to the photo model
         received as parameter. It returns a tuple: success as bool and photo index as int"""
+        return self.manager.login_controller.osc_api.core.run(self.upload_async(photo))
+
+    async def upload_async(self, photo: Photo) -> (bool, int):
+        """this coroutine uploads the image on the core of the api, see upload"""
         user = self.manager.login_controller.user
         api = self.manager.login_controller.osc_api
         osc_photo = OSCPhoto()
@@ -238,12 +266,13 @@ class PhotoUploadOperation:
 
         uploaded = False
         for _ in range(0, 10):
-            uploaded, _ = api.upload_photo(user.access_token,
-                                           self.sequence_id,
-                                           osc_photo,
-                                           photo.path,
-                                           photo.fov,
-                                           projection)
+            uploaded, _ = await api.upload_photo_async(user.access_token,
+                                                       self.sequence_id,
+                                                       osc_photo,
+                                                       photo.path,
+                                                       photo.fov,
+                                                       projection,
+                                                       self.manager.storage)
             if uploaded:
                 break
             LOGGER.debug("Will request upload %s", photo.path)
@@ -1,6 +1,6 @@
 """This file contains parsers for osc metadata file to other file formats."""
 import abc
-from typing import Optional, List, Any, Type
+from typing import Optional, List, Any, Type, Iterator
 
 from common.models import SensorItem
 from io_storage.storage import Storage
@@ -25,6 +25,12 @@ class BaseParser(metaclass=abc.ABCMeta):
         """this method will return all SensorItems found in the current file,
          of instance item_class"""
 
+    def iter_items_with_class(self, item_class: Type[SensorItem]) -> Iterator[SensorItem]:
+        """this method will yield one by one all SensorItems found in the current file,
+        of instance item_class. Parsers that can read their file incrementally override this
+        method in order to keep a constant memory usage"""
+        yield from self.items_with_class(item_class)
+
     @abc.abstractmethod
     def next_item(self) -> Optional[SensorItem]:
         """this method will return a the next SensorItem found in the current file"""
@@ -33,6 +39,10 @@ class BaseParser(metaclass=abc.ABCMeta):
     def items(self) -> List[SensorItem]:
         """this method will return all SensorItems found in the current file"""
 
+    def iter_items(self) -> Iterator[SensorItem]:
+        """this method will yield one by one all SensorItems found in the current file"""
+        yield from self.items()
+
     @abc.abstractmethod
     def format_version(self) -> Optional[str]:
         """this method will return the format version"""
@@ -55,3 +65,12 @@ class BaseParser(metaclass=abc.ABCMeta):
     def start_new_reading(self):
         """This method sets the reading file pointer to the body section of the metadata"""
         self._data_pointer = self._body_pointer
+
+    def close(self):
+        """this method releases the resources kept open by the parser while reading"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,63 +1,80 @@
 """
 This module contains custom geojson parsers.
 """
-from typing import Type, List, Optional
 import datetime
+import heapq
+import json
+import tempfile
+from itertools import islice
+from typing import Type, List, Optional, Iterator, Dict, Any, TextIO, Tuple
 
-from geojson import load
 from io_storage.storage import Storage
-from parsers.geojson import GeoJsonParser
+from parsers.geojson import GeoJsonParser, GeoJsonFeatureReader
 from parsers.custom_data_parsers.custom_models import PhotoGeoJson
 from common.models import GPS, Compass, SensorItem
 
+SORT_RUN_SIZE = 100000
+"""number of photos sorted in memory, bigger files are sorted in runs saved in temporary files"""
+
 
 class FeaturePhotoGeoJsonParser(GeoJsonParser):
+    """FeaturePhotoGeoJsonParser reads the photos of a custom geojson file lazily, the photos are
+    created while the features are read from the file. The photos ordered by their order
+    property are sorted in memory, or on disk in runs of SORT_RUN_SIZE photos for large files."""
 
     def __init__(self, file_path: str, storage: Storage):
         super().__init__(file_path, storage)
-        self._sensors: List[PhotoGeoJson] = []
+        self._sensors: Optional[List[PhotoGeoJson]] = None
         self._data_pointer: int = 0
-        self._version = "unknown"
+        self._version: Optional[str] = None
+
+    def photos(self, sort_by_order: bool = True) -> Iterator[PhotoGeoJson]:
+        """this method yields the photos of the geojson file, sorted by their order property or
+        in file order"""
+        if self._sensors is not None:
+            yield from self._sensors
+            return
+        if sort_by_order:
+            yield from self._sorted_photos()
+            return
         with self._storage.open(self.file_path, 'r') as geo_json_file:
-            geo_json = load(geo_json_file)
-            for feature in geo_json["features"]:
-                string_time = feature.properties['Timestamp']
-                utc_time = datetime.datetime.strptime(string_time, "%Y-%m-%dT%H:%M:%SZ")
-                utc_time = utc_time.replace(tzinfo=datetime.timezone.utc)
-                gps = GPS.gps(utc_time.timestamp(),
-                              float(feature.properties['Lat']),
-                              float(feature.properties['Lon']))
-                photo = PhotoGeoJson(gps,
-                                     int(feature.properties['order']),
-                                     feature.properties['path'].replace("\\", "/"))
-                photo.compass = Compass()
-                photo.compass.compass = feature.properties['direction']
-                self._sensors.append(photo)
-            crs_string = geo_json.get('crs', {}).get('properties', {}).get("name", "")
-            crs_values = crs_string.split(":")
-            if len(crs_values) == 7:
-                self._version = crs_values[5]
-
-        self._sensors.sort(key=lambda x: x.frame_index)
+            reader = GeoJsonFeatureReader(geo_json_file)
+            for feature in reader.features():
+                yield self._photo(feature)
+            self._set_version(reader.members)
 
     def items(self) -> List[SensorItem]:
+        if self._sensors is None:
+            self._sensors = list(self._sorted_photos())
         return self._sensors
 
     def items_with_class(self, item_class: Type[SensorItem]) -> List[SensorItem]:
         if item_class not in self.compatible_sensors():
             return []
         if item_class is PhotoGeoJson:
-            return self._sensors
+            return self.items()
         if item_class is GPS:
-            return [photo.gps for photo in self._sensors]
+            return [photo.gps for photo in self.items()]
         if item_class is Compass:
-            return [photo.compass for photo in self._sensors]
+            return [photo.compass for photo in self.items()]
         return []
 
+    def iter_items(self) -> Iterator[SensorItem]:
+        yield from self.photos()
+
+    def iter_items_with_class(self, item_class: Type[SensorItem]) -> Iterator[SensorItem]:
+        if item_class is PhotoGeoJson:
+            yield from self.photos()
+        elif item_class is GPS:
+            yield from (photo.gps for photo in self.photos())
+        elif item_class is Compass:
+            yield from (photo.compass for photo in self.photos())
+
     def next_item(self) -> Optional[SensorItem]:
-        if len(self._sensors) < self._data_pointer + 1:
+        items = self.items()
+        if len(items) < self._data_pointer + 1:
             self._data_pointer += 1
-            return self._sensors[self._data_pointer]
+            return items[self._data_pointer]
 
         return None
 
@@ -69,6 +86,12 @@ class FeaturePhotoGeoJsonParser(GeoJsonParser):
         return None
 
     def format_version(self) -> Optional[str]:
+        if self._version is None:
+            with self._storage.open(self.file_path, 'r') as geo_json_file:
+                reader = GeoJsonFeatureReader(geo_json_file)
+                for _ in reader.features():
+                    pass
+                self._set_version(reader.members)
         return self._version
 
     def start_new_reading(self):
@@ -77,3 +100,82 @@ class FeaturePhotoGeoJsonParser(GeoJsonParser):
     @classmethod
     def compatible_sensors(cls):
         return [PhotoGeoJson, GPS, Compass]
+
+    def _set_version(self, members: Dict[str, Any]):
+        self._version = "unknown"
+        crs_string = members.get('crs', {}).get('properties', {}).get("name", "")
+        crs_values = crs_string.split(":")
+        if len(crs_values) == 7:
+            self._version = crs_values[5]
+
+    def _sorted_photos(self) -> Iterator[PhotoGeoJson]:
+        """this method yields the photos sorted by their order property, photos having the same
+        order are kept in file order. Every run of SORT_RUN_SIZE photos is sorted and, when the
+        file has more photos, saved in a temporary file, the sorted runs are then merged."""
+        with self._storage.open(self.file_path, 'r') as geo_json_file:
+            reader = GeoJsonFeatureReader(geo_json_file)
+            features = reader.features()
+            runs: List[TextIO] = []
+            try:
+                while True:
+                    run = [self._photo_fields(feature)
+                           for feature in islice(features, SORT_RUN_SIZE)]
+                    run.sort(key=lambda fields: fields[0])
+                    if not runs and len(run) < SORT_RUN_SIZE:
+                        # the photos fit in one run, there is nothing to merge
+                        self._set_version(reader.members)
+                        yield from (self._photo_from_fields(fields) for fields in run)
+                        return
+                    if run:
+                        runs.append(_saved_run(run))
+                    if len(run) < SORT_RUN_SIZE:
+                        break
+                self._set_version(reader.members)
+                merged_fields = heapq.merge(*[_run_fields(run) for run in runs],
+                                            key=lambda fields: fields[0])
+                yield from (self._photo_from_fields(fields) for fields in merged_fields)
+            finally:
+                for run in runs:
+                    run.close()
+
+    @classmethod
+    def _photo_fields(cls, feature: Dict[str, Any]) -> Tuple:
+        """this method returns the values of a photo feature needed to create the photo, in a
+        form that can be saved as json: (order, path, timestamp, latitude, longitude,
+        direction)"""
+        properties = feature['properties']
+        string_time = properties['Timestamp']
+        utc_time = datetime.datetime.strptime(string_time, "%Y-%m-%dT%H:%M:%SZ")
+        utc_time = utc_time.replace(tzinfo=datetime.timezone.utc)
+        return (int(properties['order']),
+                properties['path'].replace("\\", "/"),
+                utc_time.timestamp(),
+                float(properties['Lat']),
+                float(properties['Lon']),
+                properties['direction'])
+
+    @classmethod
+    def _photo_from_fields(cls, fields: Tuple) -> PhotoGeoJson:
+        order, path, timestamp, latitude, longitude, direction = fields
+        photo = PhotoGeoJson(GPS.gps(timestamp, latitude, longitude), order, path)
+        photo.compass = Compass()
+        photo.compass.compass = direction
+        return photo
+
+    @classmethod
+    def _photo(cls, feature: Dict[str, Any]) -> PhotoGeoJson:
+        return cls._photo_from_fields(cls._photo_fields(feature))
+
+
+def _saved_run(run: List[Tuple]) -> TextIO:
+    run_file = tempfile.TemporaryFile(mode="w+", prefix="geojson-run-")
+    for fields in run:
+        run_file.write(json.dumps(fields))
+        run_file.write("\n")
+    run_file.seek(0)
+    return run_file
+
+
+def _run_fields(run_file: TextIO) -> Iterator[Tuple]:
+    for line in run_file:
+        yield tuple(json.loads(line))
@@ -27,10 +27,12 @@ from parsers.exif.utils import (
     create_required_gps_tags,
     add_optional_gps_tags,
     add_gps_tags,
+    add_gps_tags_to_stream,
     dms_to_dd
 )
+from parsers.exif.writer import SPLICE_CHUNK_SIZE
 
-from io_storage.storage import Storage
+from io_storage.storage import Local, Storage
 
 
 class ExifParser(BaseParser):
@@ -109,7 +111,7 @@ class ExifParser(BaseParser):
                                       None,
                                       compass.compass)
             if tags is not None:
-                add_gps_tags(self.file_path, tags)
+                self._add_gps_tags(tags)
 
     @classmethod
     def compatible_sensors(cls):
@@ -123,6 +125,17 @@ class ExifParser(BaseParser):
             tags = exifread.process_file(file, details=False)
         return tags
 
+    def _add_gps_tags(self, tags):
+        """a local photo is written in place, a photo of another storage is streamed with the
+        new tags and written again"""
+        if isinstance(self._storage, Local):
+            add_gps_tags(self.file_path, tags)
+            return
+        with self._storage.open(self.file_path, "rb") as file:
+            data = b"".join(add_gps_tags_to_stream(iter(lambda: file.read(SPLICE_CHUNK_SIZE), b""),
+                                                   tags))
+        self._storage.put(data, self.file_path)
+
     def _gps_item(self, data=None) -> Optional[GPS]:
         if data is not None:
             tags_data = data
@@ -2,10 +2,16 @@
 
 import math
 import datetime
+import logging
+import re
 from enum import Enum
-from typing import Tuple, Any, Optional, List, Dict
+from typing import Tuple, Any, Optional, List, Dict, Iterable, Iterator
 import piexif
 
+from parsers.exif.writer import write_exif, splice_exif
+
+logger = logging.getLogger(__name__)
+
 MPH_TO_KMH_FACTOR = 1.60934
 """miles per hour to kilometers per hour conversion factor"""
 KNOTS_TO_KMH_FACTOR = 1.852
@@ -123,6 +129,20 @@ def dd_to_dms(decimal_degree) -> List[Tuple[float, int]]:
     return [(degrees, 1), (minute, 1), (seconds, 100)]
 
 
+def timezone_from_offset(offset: str) -> Optional[datetime.timezone]:
+    """This method returns the timezone of a UTC offset written as in the Exif offset times
+    eg. +02:00 or -05:30, the minutes are optional. It returns None if offset is not a valid
+    UTC offset"""
+    match = re.fullmatch(r"([+-]?)(\d{1,2})(?::?(\d{2}))?", offset.strip())
+    if match is None:
+        return None
+    sign, hours, minutes = match.groups()
+    delta = datetime.timedelta(hours=int(hours), minutes=int(minutes or 0))
+    if delta >= datetime.timedelta(hours=24) or int(minutes or 0) >= 60:
+        return None
+    return datetime.timezone(-delta if sign == "-" else delta)
+
+
 def datetime_from_string(date_taken, string_format):
     try:
         tmp = str(date_taken).replace("-", ":")
@@ -148,14 +168,74 @@ def datetime_from_string(date_taken, string_format):
             raise ValueError from error
 
 
-def add_gps_tags(path: str, gps_tags: Dict[str, Any]):
-    """This method will add gps tags to the photo found at path"""
+def add_gps_tags(path: str,
+                 gps_tags: Dict[str, Any],
+                 skip_matching: bool = False) -> bool:
+    """This method will add gps tags to the photo found at path. The Exif segment is written in
+    place when it has room for the new tags, see write_exif. If skip_matching is True and the
+    photo already has the gps tags then the photo is not written.
+    It returns True if the photo was written"""
     exif_dict = piexif.load(path)
+    if skip_matching and gps_tags_match(exif_dict["GPS"], gps_tags):
+        return False
     for tag, tag_value in gps_tags.items():
         exif_dict["GPS"][tag] = tag_value
 
     exif_bytes = piexif.dump(exif_dict)
-    piexif.insert(exif_bytes, path)
+    write_exif(path, exif_bytes)
+    return True
+
+
+def add_gps_tags_to_stream(chunks: Iterable[bytes],
+                           gps_tags: Dict[str, Any],
+                           skip_existing: bool = False) -> Iterator[bytes]:
+    """This method adds gps tags to the photo streamed by chunks while it is streamed, see
+    splice_exif. If skip_existing is True and the photo already has a gps position then the
+    photo is not changed. A photo having Exif data that can not be read is not changed."""
+    def gps_exif_bytes(exif_bytes: Optional[bytes]) -> Optional[bytes]:
+        # pylint: disable=W0703
+        try:
+            exif_dict = piexif.load(exif_bytes) if exif_bytes is not None else \
+                {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
+            if skip_existing and _has_gps_position(exif_dict):
+                return None
+            exif_dict["GPS"].update(gps_tags)
+            return piexif.dump(exif_dict)
+        except Exception as error:
+            logger.debug("Could not add the gps tags to the streamed photo: %s", error)
+            return None
+
+    return splice_exif(chunks, gps_exif_bytes)
+
+
+def _has_gps_position(exif_dict: Dict[str, Any]) -> bool:
+    """this method returns True if the loaded exif has a gps position and a timestamp, as the
+    exif parser requires for a gps item"""
+    exif_gps = exif_dict.get("GPS", {})
+    for tag in (piexif.GPSIFD.GPSLatitude, piexif.GPSIFD.GPSLongitude):
+        if not any(numerator for numerator, _ in exif_gps.get(tag, ())):
+            return False
+    return piexif.GPSIFD.GPSDateStamp in exif_gps or \
+        piexif.ExifIFD.DateTimeOriginal in exif_dict.get("Exif", {}) or \
+        piexif.ExifIFD.DateTimeDigitized in exif_dict.get("Exif", {})
+
+
+def gps_tags_match(exif_gps: Dict[int, Any], gps_tags: Dict[str, Any]) -> bool:
+    """This method returns True if exif_gps, the GPS tags loaded by piexif, has all the gps_tags
+    values. piexif loads strings as bytes and lists as tuples, the values are compared in the
+    loaded form"""
+    for tag, tag_value in gps_tags.items():
+        if tag not in exif_gps or exif_gps[tag] != _loaded_exif_value(tag_value):
+            return False
+    return True
+
+
+def _loaded_exif_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (list, tuple)):
+        return tuple(_loaded_exif_value(item) for item in value)
+    return value
 
 
 def create_required_gps_tags(timestamp_gps: Optional[float],
@@ -0,0 +1,183 @@
+"""Module used to write the Exif APP1 segment of a JPEG file without rewriting the entire file
+when the existing segment has room for the new Exif data"""
+
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+from piexif import InvalidImageDataError
+
+SOI_MARKER = b"\xff\xd8"
+SOS_MARKER = b"\xff\xda"
+APP0_MARKER = b"\xff\xe0"
+APP1_MARKER = b"\xff\xe1"
+EXIF_HEADER = b"Exif\x00\x00"
+MAX_SEGMENT_DATA_SIZE = 0xFFFF - 2
+"""the segment length field counts itself"""
+EXIF_RESERVED_SIZE = 1024
+"""bytes reserved after the Exif data when the segment is rewritten, so the next updates of the
+Exif data can be written in place"""
+SPLICE_CHUNK_SIZE = 1024 * 1024
+# offset and size of a segment, the size counts the marker of the segment
+SegmentLocation = Tuple[int, int]
+
+
+def write_exif(path: str,
+               exif_bytes: bytes,
+               reserved_size: int = EXIF_RESERVED_SIZE):
+    """This method writes exif_bytes, as returned by piexif.dump, in the Exif APP1 segment of the
+    JPEG file found at path. If the existing segment has room for exif_bytes then the segment is
+    patched in place and the rest of the file is not touched, the unused bytes of the segment are
+    set to 0. Otherwise the file is spliced in a temporary file that replaces the file found at
+    path, the new segment has reserved_size free bytes for the next updates."""
+    if exif_bytes[0:6] != EXIF_HEADER:
+        raise ValueError("Given data is not exif data")
+    if len(exif_bytes) > MAX_SEGMENT_DATA_SIZE:
+        raise ValueError("Exif data is too big for an APP1 segment")
+
+    with open(path, "rb") as jpeg_file:
+        exif_segment, replaced_segment = _exif_segment_location(_file_reader(jpeg_file))
+    if exif_segment is not None:
+        offset, segment_size = exif_segment
+        if len(exif_bytes) + 4 <= segment_size:
+            _patch_segment(path, offset, _segment(exif_bytes, segment_size - 4))
+            return
+    if exif_segment is None:
+        exif_segment = replaced_segment
+    reserved_size = min(reserved_size, MAX_SEGMENT_DATA_SIZE - len(exif_bytes))
+    _splice_segment(path,
+                    exif_segment,
+                    _segment(exif_bytes, len(exif_bytes) + reserved_size))
+
+
+def splice_exif(chunks: Iterable[bytes],
+                exif_function: Callable[[Optional[bytes]], Optional[bytes]],
+                reserved_size: int = EXIF_RESERVED_SIZE) -> Iterator[bytes]:
+    """This method returns the chunks of the JPEG file streamed by chunks with a new Exif APP1
+    segment, the segment is placed as write_exif places it. Only the segments found before the
+    image data are buffered, the rest of the file is passed through.
+    exif_function is called with the data of the existing Exif segment, or None if there is no
+    Exif segment, and returns the new Exif data, as returned by piexif.dump, or None to keep the
+    file as it is. A file that is not a JPEG file is passed through."""
+    reader = _StreamReader(chunks)
+    try:
+        exif_segment, replaced_segment = _exif_segment_location(reader.read)
+    except InvalidImageDataError:
+        yield from reader.remaining_chunks()
+        return
+    if exif_segment is not None:
+        offset, segment_size = exif_segment
+        exif_bytes = exif_function(reader.read(offset + 4, segment_size - 4))
+    else:
+        offset, segment_size = replaced_segment
+        exif_bytes = exif_function(None)
+    if exif_bytes is None or exif_bytes[0:6] != EXIF_HEADER or \
+            len(exif_bytes) > MAX_SEGMENT_DATA_SIZE:
+        yield from reader.remaining_chunks()
+        return
+    reserved_size = min(reserved_size, MAX_SEGMENT_DATA_SIZE - len(exif_bytes))
+    yield reader.read(0, offset)
+    yield _segment(exif_bytes, len(exif_bytes) + reserved_size)
+    reader.read(offset, segment_size)
+    yield from reader.remaining_chunks(offset + segment_size)
+
+
+class _StreamReader:
+    """_StreamReader buffers the chunks of a stream that are read by offset"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, offset: int, size: int) -> bytes:
+        """this method returns the size bytes found at offset, or less at the end of the
+        stream"""
+        while len(self._buffer) < offset + size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        return bytes(self._buffer[offset:offset + size])
+
+    def remaining_chunks(self, offset: int = 0) -> Iterator[bytes]:
+        """this method returns the buffered bytes found after offset and the chunks that were
+        not read"""
+        if len(self._buffer) > offset:
+            yield bytes(self._buffer[offset:])
+        self._buffer = bytearray()
+        yield from self._chunks
+
+
+def _segment(exif_bytes: bytes, data_size: int) -> bytes:
+    return APP1_MARKER + struct.pack(">H", data_size + 2) + \
+        exif_bytes + bytes(data_size - len(exif_bytes))
+
+
+def _file_reader(jpeg_file: BinaryIO) -> Callable[[int, int], bytes]:
+    def read(offset: int, size: int) -> bytes:
+        jpeg_file.seek(offset)
+        return jpeg_file.read(size)
+    return read
+
+
+def _exif_segment_location(read: Callable[[int, int], bytes]) \
+        -> Tuple[Optional[SegmentLocation], SegmentLocation]:
+    """This method reads, with read(offset, size), the headers of the segments found before the
+    image data of a JPEG file and returns the (offset, size) of the Exif APP1 segment, or None if
+    there is no Exif segment, and the (offset, size) of the segment that is replaced by a new
+    Exif segment. As piexif does, a new Exif segment replaces the JFIF APP0 segment that follows
+    SOI or else it is inserted after SOI, in that case the replaced segment is empty. The size of
+    a segment counts its marker."""
+    if read(0, 2) != SOI_MARKER:
+        raise InvalidImageDataError("Given data isn't JPEG.")
+    replaced_segment = (2, 0)
+    offset = 2
+    while True:
+        header = read(offset, 10)
+        if len(header) < 4:
+            raise InvalidImageDataError("Wrong JPEG data.")
+        marker = header[0:2]
+        if marker == SOS_MARKER:
+            return None, replaced_segment
+        segment_size = 2 + struct.unpack(">H", header[2:4])[0]
+        if marker == APP1_MARKER and segment_size >= 10 and header[4:10] == EXIF_HEADER:
+            return (offset, segment_size), replaced_segment
+        if marker == APP0_MARKER and offset == 2:
+            replaced_segment = (offset, segment_size)
+        offset += segment_size
+
+
+def _patch_segment(path: str, offset: int, segment: bytes):
+    with open(path, "r+b") as jpeg_file:
+        if hasattr(os, "pwrite"):
+            os.pwrite(jpeg_file.fileno(), segment, offset)
+        else:
+            jpeg_file.seek(offset)
+            jpeg_file.write(segment)
+
+
+def _splice_segment(path: str, replaced_segment: Tuple[int, int], segment: bytes):
+    """This method writes in a temporary file the bytes of the file found at path before the
+    replaced segment, the new segment and the bytes after the replaced segment and then replaces
+    the file found at path with the temporary file"""
+    offset, segment_size = replaced_segment
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_file = tempfile.NamedTemporaryFile(dir=directory,
+                                                 prefix=".exif-",
+                                                 suffix=".tmp",
+                                                 delete=False)
+    try:
+        with temporary_file:
+            with open(path, "rb") as jpeg_file:
+                temporary_file.write(jpeg_file.read(offset))
+                temporary_file.write(segment)
+                jpeg_file.seek(offset + segment_size)
+                shutil.copyfileobj(jpeg_file, temporary_file, SPLICE_CHUNK_SIZE)
+        shutil.copymode(path, temporary_file.name)
+        os.replace(temporary_file.name, path)
+    except BaseException:
+        if os.path.exists(temporary_file.name):
+            os.remove(temporary_file.name)
+        raise
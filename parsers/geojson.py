@@ -1,11 +1,10 @@
 """
 This module constains custom OSC geojson parsing. This file is generated by KartaView Android app.
 """
-from typing import Optional, List, Type
+from typing import Optional, List, Type, Iterator, Dict, Any, TextIO
+import json
 import time
 
-from geojson import load
-
 from parsers.base import BaseParser
 from common.models import SensorItem, GPS
 
@@ -24,6 +23,109 @@ NARROW_ROAD_VALUE = "narrowRoad"
 OTHER_KEY = "osctagging"
 OTHER_VALUE = "notes"
 
+GEOJSON_CHUNK_SIZE = 1024 * 1024
+"""number of characters read at once by the GeoJsonFeatureReader"""
+_WHITESPACE = " \t\n\r"
+# characters found at the end of a number that is not complete in the buffer, "" is the buffer end
+_NUMBER_END_CHARACTERS = ("", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9", ".", "e", "E", "+",
+                          "-")
+
+
+class GeoJsonFeatureReader:
+    """GeoJsonFeatureReader reads the features of a geojson FeatureCollection one by one, without
+    loading the entire file. The top level object is read in chunks, every feature is decoded
+    when it is reached and the other top level members, eg. crs, are kept in members."""
+
+    def __init__(self, geo_json_file: TextIO, chunk_size: int = GEOJSON_CHUNK_SIZE):
+        self.members: Dict[str, Any] = {}
+        self._file = geo_json_file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._position = 0
+        self._at_end = False
+        # NaN and Infinity are rejected as geojson.load does
+        self._decoder = json.JSONDecoder(parse_constant=self._reject_constant)
+
+    def features(self) -> Iterator[Dict[str, Any]]:
+        """this method yields the features of the FeatureCollection in file order"""
+        self._expect("{")
+        if self._next_character() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(":")
+            if key == "features":
+                yield from self._array_values()
+            else:
+                self.members[key] = self._decode_value()
+            if self._expect(",}") == "}":
+                return
+
+    def _array_values(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._next_character() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self._decode_value()
+            if self._expect(",]") == "]":
+                return
+
+    def _decode_value(self) -> Any:
+        self._next_character()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # the value is not complete in the buffer, unless the file was read entirely
+                if not self._read_chunk():
+                    raise
+                continue
+            # a number cut by the end of the buffer is decoded again with the next chunk, in a
+            # valid document a number is never followed by a number character
+            if not isinstance(value, (int, float)) or \
+                    self._buffer[end:end + 1] not in _NUMBER_END_CHARACTERS or \
+                    not self._read_chunk():
+                self._position = end
+                return value
+
+    def _expect(self, characters: str) -> str:
+        character = self._next_character()
+        if character not in characters:
+            raise json.JSONDecodeError("Expecting one of " + repr(characters),
+                                       self._buffer,
+                                       self._position)
+        self._position += 1
+        return character
+
+    def _next_character(self) -> str:
+        """this method skips the whitespace and returns the next character without consuming it,
+        or an empty string at the end of the file"""
+        while True:
+            while self._position < len(self._buffer) and \
+                    self._buffer[self._position] in _WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer) or not self._read_chunk():
+                return self._buffer[self._position:self._position + 1]
+
+    def _read_chunk(self) -> bool:
+        if self._at_end:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._at_end = True
+            return False
+        # the consumed characters are dropped, so the buffer stays bounded by the chunk size and
+        # by the size of the value being decoded
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
+
+    @staticmethod
+    def _reject_constant(constant: str):
+        raise ValueError(f"{constant} is not JSON compliant number")
+
 
 class GeoJsonParser(BaseParser):
     """this class is a BaseParser that can parse a GPX"""
@@ -43,11 +145,15 @@ class GeoJsonParser(BaseParser):
         print("This method is not implemeted for GeoJsonParser", self)
 
     def items(self) -> List[SensorItem]:
+        return list(self.iter_items())
+
+    def iter_items(self) -> Iterator[SensorItem]:
+        """this method yields the gps items of the features while the file is read. The items have
+        consecutive timestamps starting from the current time"""
         with self._storage.open(self.file_path, 'r') as geo_json_file:
-            geo_json = load(geo_json_file)
+            start_time = time.time()
             index = 0
-            sensors: List[SensorItem] = []
-            for feature in geo_json["features"]:
+            for feature in GeoJsonFeatureReader(geo_json_file).features():
                 geometry = feature["geometry"]
                 coordinates = geometry["coordinates"]
 
@@ -55,10 +161,10 @@ class GeoJsonParser(BaseParser):
                     if isinstance(geometry_coordinate, float) and len(coordinates) == 2:
                         # this is a point
                         gps = GPS()
-                        gps.timestamp = time.time() + index
+                        gps.timestamp = start_time + index
                         gps.latitude = coordinates[1]
                         gps.longitude = coordinates[0]
-                        sensors.append(gps)
+                        yield gps
                         break
 
                     if (isinstance(geometry_coordinate[0], float)
@@ -67,10 +173,10 @@ class GeoJsonParser(BaseParser):
                         longitude = geometry_coordinate[0]
                         latitude = geometry_coordinate[1]
                         gps = GPS()
-                        gps.timestamp = time.time() + index
+                        gps.timestamp = start_time + index
                         gps.latitude = latitude
                         gps.longitude = longitude
-                        sensors.append(gps)
+                        yield gps
                         index += 1
                     else:
                         # this is a list of list of points
@@ -78,12 +184,11 @@ class GeoJsonParser(BaseParser):
                             longitude = geometry_point_coordinate[0]
                             latitude = geometry_point_coordinate[1]
                             gps = GPS()
-                            gps.timestamp = time.time() + index
+                            gps.timestamp = start_time + index
                             gps.latitude = latitude
                             gps.longitude = longitude
-                            sensors.append(gps)
+                            yield gps
                             index += 1
-        return sensors
 
     def format_version(self) -> Optional[str]:
         print("GeoJsonParser version", self)
@@ -1,96 +1,87 @@
 """Module responsible to parse Exif information from a image"""
-from typing import Optional, List, Type
-from datetime import datetime
+from typing import Optional, List, Type, Iterator, Tuple, BinaryIO, Generator
+from datetime import datetime, timezone
+from itertools import islice
+from xml.etree import ElementTree
 
 import gpxpy.gpx
+from gpxpy.gpxfield import parse_time
 
 from io_storage.storage import Storage
 from parsers.base import BaseParser
 from common.models import SensorItem, GPS
 
+# (latitude, longitude, elevation, timestamp, speed) of a track point
+GPXPoint = Tuple[Optional[float], Optional[float], Optional[float], Optional[float],
+                 Optional[float]]
+
 
 class GPXParser(BaseParser):
-    """this class is a BaseParser that can parse a GPX"""
+    """this class is a BaseParser that can parse a GPX. The track points are read with a streaming
+    xml reader, the points are kept after the first complete reading of the file and next_item
+    reads the file only up to the returned point"""
     def __init__(self, path: str, storage: Storage):
         super().__init__(path, storage)
         self._data_pointer = 0
+        self._points: Optional[List[GPXPoint]] = None
+        self._cursor: Optional[Generator[GPXPoint, None, None]] = None
 
     def next_item_with_class(self, item_class: Type[SensorItem]) -> Optional[SensorItem]:
         if item_class != GPS:
             return None
-        with self._storage.open(self.file_path, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            index = 0
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        if index == self._data_pointer:
-                            gps = GPS()
-                            gps.speed = point.speed
-                            gps.timestamp = point.time.timestamp()
-                            gps.latitude = point.latitude
-                            gps.longitude = point.longitude
-                            gps.altitude = point.elevation
-                            self._data_pointer += 1
-                            return gps
-        return None
+        return self.next_item()
 
     def items_with_class(self, item_class: Type[SensorItem]) -> List[SensorItem]:
         if item_class != GPS:
             return []
-        with open(self.file_path, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            sensors: List[SensorItem] = []
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        gps = GPS()
-                        gps.speed = point.speed
-                        gps.timestamp = point.time.timestamp()
-                        gps.latitude = point.latitude
-                        gps.longitude = point.longitude
-                        gps.altitude = point.elevation
-                        sensors.append(gps)
-            return sensors
+        return self.items()
 
     def next_item(self) -> Optional[SensorItem]:
-        with open(self.file_path, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            index = 0
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        if index == self._data_pointer:
-                            gps = GPS()
-                            gps.speed = point.speed
-                            gps.timestamp = point.time.timestamp()
-                            gps.latitude = point.latitude
-                            gps.longitude = point.longitude
-                            gps.altitude = point.elevation
-                            self._data_pointer += 1
-                            return gps
-        return None
+        if self._points is not None:
+            if self._data_pointer >= len(self._points):
+                return None
+            point = self._points[self._data_pointer]
+        else:
+            if self._cursor is None:
+                self._cursor = self._iter_points()
+                # the cursor continues from the current reading position
+                for _ in islice(self._cursor, self._data_pointer):
+                    pass
+            point = next(self._cursor, None)
+            if point is None:
+                return None
+        self._data_pointer += 1
+        return self._gps(point)
 
     def items(self) -> List[SensorItem]:
-        with open(self.file_path, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            sensors: List[SensorItem] = []
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        gps = GPS()
-                        gps.speed = point.speed
-                        gps.timestamp = point.time.timestamp()
-                        gps.latitude = point.latitude
-                        gps.longitude = point.longitude
-                        gps.altitude = point.elevation
-                        sensors.append(gps)
-            return sensors
+        if self._points is None:
+            self._points = list(self._iter_points())
+        return [self._gps(point) for point in self._points]
+
+    def iter_items(self) -> Iterator[SensorItem]:
+        if self._points is not None:
+            yield from (self._gps(point) for point in self._points)
+            return
+        yield from (self._gps(point) for point in self._iter_points())
+
+    def iter_items_with_class(self, item_class: Type[SensorItem]) -> Iterator[SensorItem]:
+        if item_class == GPS:
+            yield from self.iter_items()
 
     def format_version(self) -> Optional[str]:
-        with open(self.file_path, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            return gpx.version
+        with self._storage.open(self.file_path, 'rb') as gpx_file:
+            for _, element in ElementTree.iterparse(gpx_file, events=("start",)):
+                return element.get("version")
+        return None
+
+    def start_new_reading(self):
+        self.close()
+        self._data_pointer = 0
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
 
     def serialize(self):
         my_gpx = gpxpy.gpx.GPX()
@@ -111,9 +102,11 @@ class GPXParser(BaseParser):
             #                                                       time=item.gps.timestamp,
             #                                                       speed=item.gps.speed))
         xml_data = my_gpx.to_xml()
-        with open(self.file_path, "w+") as file:
+        with self._storage.open(self.file_path, "w") as file:
             file.write(xml_data)
-        file.close()
+        # the points read before are outdated
+        self._points = None
+        self.start_new_reading()
 
     @classmethod
     def _gpx_track_point(cls, item: GPS) -> Optional[gpxpy.gpx.GPXTrackPoint]:
@@ -138,3 +131,76 @@ class GPXParser(BaseParser):
     @classmethod
     def compatible_sensors(cls):
         return [GPS]
+
+    def _iter_points(self) -> Generator[GPXPoint, None, None]:
+        with self._storage.open(self.file_path, 'rb') as gpx_file:
+            yield from _track_points(gpx_file)
+
+    @classmethod
+    def _gps(cls, point: GPXPoint) -> GPS:
+        gps = GPS()
+        gps.latitude, gps.longitude, gps.altitude, gps.timestamp, gps.speed = point
+        return gps
+
+
+def _track_points(gpx_file: BinaryIO) -> Iterator[GPXPoint]:
+    """This function yields the points of the track segments of the gpx file while the file is
+    parsed. The values are read as gpxpy reads them: the elements of the default namespace
+    only, the first child element of a value and the speed for every version except 1.1. The
+    parsed points are removed from their segment, so the memory used does not depend on the
+    number of points."""
+    events = ElementTree.iterparse(gpx_file, events=("start", "end"))
+    root = next((element for _, element in events), None)
+    if root is None:
+        return
+    namespace = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    track_tag, segment_tag, point_tag = namespace + "trk", namespace + "trkseg", namespace + "trkpt"
+    value_tags = (namespace + "ele", namespace + "time", namespace + "speed")
+    with_speed = root.get("version") != "1.1"
+    parents = [root]
+    for event, element in events:
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag != point_tag or len(parents) < 3 or parents[-1].tag != segment_tag \
+                or parents[-2].tag != track_tag or parents[-3] is not root:
+            continue
+        elevation, time, speed = (_child_text(element, tag) for tag in value_tags)
+        yield (_float(element.get("lat")),
+               _float(element.get("lon")),
+               _float(elevation),
+               _timestamp(time),
+               _float(speed) if with_speed else None)
+        # the segment keeps only the points not parsed yet
+        del parents[-1][:]
+
+
+def _child_text(element: ElementTree.Element, tag: str) -> Optional[str]:
+    child = element.find(tag)
+    return child.text if child is not None else None
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """This function returns the timestamp of a gpx time, the usual UTC time without fraction of
+    seconds, eg. 2020-01-01T10:20:30Z, is converted without the gpxpy time parser"""
+    if _is_utc_second_time(value):
+        try:
+            return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                            tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    time = parse_time(value)
+    return time.timestamp() if time is not None else None
+
+
+def _is_utc_second_time(value: Optional[str]) -> bool:
+    if value is None or len(value) != 20:
+        return False
+    return value[10] == "T" and value[19] == "Z" and value[4] == value[7] == "-" \
+        and value[13] == value[16] == ":"
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    return None if value is None else float(value.strip())
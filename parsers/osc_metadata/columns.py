@@ -0,0 +1,82 @@
+"""This module is made to decode the rows of a sensor from an osc metadata file version 2 into
+numpy columns, without creating a SensorItem for every row"""
+import io
+import re
+from typing import Iterator, List
+
+import numpy as np
+from numpy.lib import recfunctions
+
+from common.models import PhotoMetadata, GPS, Acceleration, Compass, OBD, Pressure, Attitude
+from common.models import Gravity, DeviceMotion
+from io_storage.storage import Storage
+from parsers.osc_metadata.item_factory import ItemParser
+
+COLUMNS_CHUNK_SIZE = 1024 * 1024
+NUMERIC_ITEM_CLASSES = (PhotoMetadata, GPS, Acceleration, Compass, OBD, Pressure, Attitude,
+                        Gravity, DeviceMotion)
+INTEGER_FIELDS = ("video_index", "frame_index")
+
+
+def columns_dtype(item_parser: ItemParser) -> np.dtype:
+    """returns the structured dtype of the columns decoded with item_parser. The first field is
+    the timestamp, followed by the fields of the row format where the sub item separator '.'
+    is replaced by '_', eg. gps.latitude becomes gps_latitude"""
+    fields = [("timestamp", np.float64)]
+    for key, _ in sorted(item_parser.format.items(), key=lambda key_index: key_index[1]):
+        field_type = np.int64 if key in INTEGER_FIELDS else np.float64
+        fields.append((key.replace(".", "_"), field_type))
+    return np.dtype(fields)
+
+
+def read_columns(file_path: str,
+                 storage: Storage,
+                 body_pointer: int,
+                 alias: str,
+                 item_parser: ItemParser) -> np.ndarray:
+    """this method returns a structured array with all the rows of alias found in the body of the
+    metadata file. The body is read in chunks, the rows of alias are selected with a regular
+    expression and decoded by numpy, missing values are set to nan. Rows that don't have the
+    number of values of the item format are skipped, same as ItemParser does."""
+    dtype = columns_dtype(item_parser)
+    values_count = len(item_parser.format)
+    separator = b":" + alias.encode() + b":"
+    # a row is matched from the new line preceding it, this is faster than a multiline ^ anchor
+    row_pattern = re.compile(rb"\n([^:\n]*" + re.escape(separator) +
+                             rb"(?:[^;\n]*;){%d}[^;\n\r]*)\r?(?=\n)" % (values_count - 1))
+    chunks: List[np.ndarray] = []
+    with storage.open(file_path, "rb") as metadata_file:
+        metadata_file.seek(body_pointer)
+        for block in _row_blocks(metadata_file):
+            rows = row_pattern.findall(block)
+            if rows:
+                chunks.append(_decode_rows(rows, separator, dtype))
+    if not chunks:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(chunks)
+
+
+def _row_blocks(metadata_file) -> Iterator[bytes]:
+    """yields the rest of the file in blocks of whole rows, every block starts and ends with a
+    new line"""
+    remaining = b""
+    while True:
+        data = metadata_file.read(COLUMNS_CHUNK_SIZE)
+        if not data:
+            yield b"\n" + remaining + b"\n"
+            return
+        data = remaining + data
+        end = data.rfind(b"\n") + 1
+        yield b"\n" + data[:end]
+        remaining = data[end:]
+
+
+def _decode_rows(rows: List[bytes], separator: bytes, dtype: np.dtype) -> np.ndarray:
+    lines = b"\n".join(rows).replace(separator, b";") + b"\n"
+    # missing values are decoded as nan, the replace is done twice for consecutive empty values
+    lines = lines.replace(b";;", b";nan;").replace(b";;", b";nan;").replace(b";\n", b";nan\n")
+    # the rows are decoded as plain float64 values straight from the bytes, without decoding
+    # the text to str, and then viewed as the fields of the dtype
+    values = np.loadtxt(io.BytesIO(lines), delimiter=";", dtype=np.float64, ndmin=2,
+                        encoding="latin1")
+    return recfunctions.unstructured_to_structured(values, dtype=dtype)
@@ -1,5 +1,7 @@
 """this file contains all item parsers for Metadata2.0"""
-from typing import List, Optional
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Optional, Tuple, Callable
 
 from common.models import SensorItem, PhotoMetadata, GPS, Acceleration, Compass, OBD, Pressure
 from common.models import Attitude, Gravity, DeviceMotion, OSCDevice, RecordingType
@@ -20,6 +22,7 @@ class ItemParser:
         self.item_class = item_class
         self.item_name = item_name
         self.post_processing = post_processing
+        self._decoders = self._compile_format(formats)
 
     # pylint: enable=R0913
 
@@ -42,31 +45,31 @@ class ItemParser:
 
         item_instance = self.item_class()
         item_instance.timestamp = float(timestamp)
-        for attribute_key, attribute_value in self.format.items():
-            if "." in attribute_key:
-                sub_attributes = attribute_key.split(".")
-                # get the sub item that has the property that needs to be set
-                tmp_item = item_instance
-                for level in range(len(sub_attributes) - 1):
-                    tmp_item = getattr(tmp_item, sub_attributes[level])
-                setattr(tmp_item,
-                        sub_attributes[len(sub_attributes) - 1],
-                        ItemParser._value(_elements, attribute_value))
-
+        for index, sub_item_getter, attribute_name in self._decoders:
+            value = _elements[index] or None
+            if sub_item_getter is None:
+                setattr(item_instance, attribute_name, value)
             else:
-                setattr(item_instance,
-                        attribute_key,
-                        ItemParser._value(_elements, attribute_value))
+                setattr(sub_item_getter(item_instance), attribute_name, value)
         if self.post_processing is not None:
             self.post_processing(item_instance)
 
         return item_instance
 
     @classmethod
-    def _value(cls, elements, key) -> Optional[str]:
-        if elements[key] != '':
-            return elements[key]
-        return None
+    def _compile_format(cls, formats: dict) -> List[Tuple[int, Optional[Callable], str]]:
+        """This method returns for every attribute of the format the row index of its value,
+        a getter for the sub item that has the attribute or None if the attribute is set on the
+        item itself and the attribute name. eg. 'gps.latitude': 3 becomes
+        (3, attrgetter('gps'), 'latitude')"""
+        decoders = []
+        for attribute_key, attribute_index in formats.items():
+            if "." in attribute_key:
+                sub_item_path, attribute_name = attribute_key.rsplit(".", 1)
+                decoders.append((attribute_index, attrgetter(sub_item_path), attribute_name))
+            else:
+                decoders.append((attribute_index, None, attribute_key))
+        return decoders
 
 
 class SensorItemDefinition:
@@ -121,9 +124,11 @@ class SensorItemDefinition:
         return definition
 
 
-def _available_parsers() -> List[ItemParser]:
-    """This function returns all the available item parsers"""
-    parsers = [photo_v1(),
+@lru_cache(maxsize=1)
+def _available_parsers() -> Tuple[ItemParser, ...]:
+    """This function returns all the available item parsers, the parsers are created once and
+    shared by all definitions"""
+    parsers = (photo_v1(),
                gps_v1(),
                acceleration_v1(),
                compass_v1(),
@@ -136,7 +141,7 @@ def _available_parsers() -> List[ItemParser]:
                camera_v1(),
                camera_v2(),
                exif_v1(),
-               exif_v2()]
+               exif_v2())
     return parsers
 
 
@@ -1,9 +1,13 @@
 """This file contains all the Metadata 1.x item parser definitions"""
-from typing import Optional, Dict, Any
+from operator import attrgetter
+from typing import Optional, Dict, List, Tuple, Callable, FrozenSet
 
 from common.models import SensorItem, Pressure, PhotoMetadata, OBD, DeviceMotion, Acceleration, GPS
 from common.models import Attitude, Gravity, Compass
 
+# the column of the value, the getter of the sub item having the attribute and the attribute name
+AttributeDecoder = Tuple[int, Optional[Callable], str]
+
 
 class ItemLegacyParser:
     """ItemLegacyParser is a parser class that can parse a Metadata1.x row and
@@ -21,73 +25,79 @@ class ItemLegacyParser:
 
         self._metadata_format = metadata_format
         self._item_class = item_class
-        self._attributes_element_names = required_attributes_mapping
-        self._optional_attributes_element_names = optional_attributes_mapping
         self._post_processing = post_processing
+        self._required_decoders = self._compile_mapping(required_attributes_mapping)
+        self._optional_decoders = self._compile_mapping(optional_attributes_mapping)
+        self._required_columns: Optional[FrozenSet[int]] = None
+        if len(self._required_decoders) == len(required_attributes_mapping):
+            self._required_columns = frozenset(column for column, _, _ in
+                                               self._required_decoders)
 
     # pylint: enable=R0913
 
     def __eq__(self, other):
         if isinstance(other, ItemLegacyParser):
-            return self == other
+            return self._item_class == other.item_class and \
+                   self._metadata_format == other._metadata_format
         return False
 
     def __hash__(self):
         return hash((self._item_class, self._metadata_format))
 
+    @property
+    def item_class(self):
+        """the class of the items returned by the parser"""
+        return self._item_class
+
+    @property
+    def required_columns(self) -> Optional[FrozenSet[int]]:
+        """the columns that must have a value in a row for the row to have an item, or None if
+        some required attributes are missing from the metadata format"""
+        return self._required_columns
+
     def parse(self, elements) -> Optional[SensorItem]:
         """parse a list of elements"""
+        if self._required_columns is None:
+            return None
         # search for required attributes
-        element_values: Dict[str, Any] = {}
-        for _, element_name in self._attributes_element_names.items():
-            name_value = self._value(elements, element_name)
-            if not name_value:
+        for column in self._required_columns:
+            if column >= len(elements) or not elements[column]:
                 return None
-            element_values[element_name] = name_value
-        # set required attributes
-        item_instance = self._item_class()
-        self._set_values_for_attributes(element_values,
-                                        self._attributes_element_names,
-                                        item_instance)
+        return self.decode(elements)
 
+    def decode(self, elements) -> SensorItem:
+        """returns the item of a list of elements that has values for all required columns"""
+        item_instance = self._item_class()
+        # set required attributes
+        for column, sub_item_getter, attribute_name in self._required_decoders:
+            target = item_instance if sub_item_getter is None else sub_item_getter(item_instance)
+            setattr(target, attribute_name, elements[column])
         # set optional attributes
-        element_values = {}
-        for _, element_name in self._optional_attributes_element_names.items():
-            name_value = self._value(elements, element_name)
-            element_values[element_name] = name_value
-        self._set_values_for_attributes(element_values,
-                                        self._optional_attributes_element_names,
-                                        item_instance)
+        for column, sub_item_getter, attribute_name in self._optional_decoders:
+            value = elements[column] or None if column < len(elements) else None
+            target = item_instance if sub_item_getter is None else sub_item_getter(item_instance)
+            setattr(target, attribute_name, value)
         # make post processing
         if self._post_processing:
             self._post_processing(item_instance)
 
         return item_instance
 
-    @classmethod
-    def _set_values_for_attributes(cls, element_values, attributes_element_names, item_instance):
+    def _compile_mapping(self, attributes_element_names) -> List[AttributeDecoder]:
+        """returns for every attribute found in the metadata format the column of its value, a
+        getter for the sub item that has the attribute or None if the attribute is set on the
+        item itself and the attribute name"""
+        decoders = []
         for attribute_name, element_name in attributes_element_names.items():
+            if element_name not in self._metadata_format:
+                continue
+            column = self._metadata_format[element_name]
             if "." in attribute_name:
-                sub_attributes = attribute_name.split(".")
-                # get the sub item that has the property that needs to be set
-                tmp_item = item_instance
-                for level in range(len(sub_attributes) - 1):
-                    tmp_item = getattr(tmp_item, sub_attributes[level])
-                setattr(tmp_item,
-                        sub_attributes[len(sub_attributes)-1],
-                        element_values[element_name])
+                sub_item_path, attribute_name = attribute_name.rsplit(".", 1)
+                decoders.append((column, attrgetter(sub_item_path), attribute_name))
             else:
-                setattr(item_instance,
-                        attribute_name,
-                        element_values[element_name])
-
-    def _value(self, elements, key):
-        if key not in self._metadata_format:
-            return None
-
-        if elements[self._metadata_format[key]] != '':
-            return elements[self._metadata_format[key]]
-        return None
+                decoders.append((column, None, attribute_name))
+        return decoders
 
 
 def timestamp_error(item: SensorItem):
@@ -126,7 +136,7 @@ def gps_parser(metadata_format, device_item):
                              "horizontal_accuracy": "horizontal_accuracy"},
                             {"altitude": "elevation",
                              "vertical_accuracy": "vertical_accuracy",
-                             "gps_speed": "gps.speed"},
+                             "speed": "gps.speed"},
                             waylens_device)
 
 
@@ -250,7 +260,8 @@ def device_motion_parse(metadata_format):
 
     return ItemLegacyParser(metadata_format,
                             DeviceMotion,
-                            {"acceleration.acc_x": "acceleration.x",
+                            {"timestamp": "time",
+                             "acceleration.acc_x": "acceleration.x",
                              "acceleration.acc_y": "acceleration.y",
                              "acceleration.acc_z": "acceleration.z",
                              "gravity.acc_x": "gravity.x",
@@ -261,3 +272,56 @@ def device_motion_parse(metadata_format):
                              "gyroscope.roll": "roll"},
                             {},
                             type_conversions)
+
+
+class LegacyRowDecoder:
+    """LegacyRowDecoder decodes the rows of a Metadata1.x file. The item parsers are created once
+    per file and every row is classified by its non empty columns, the parsers having values for
+    all their required columns being found with a single lookup for the rows with the same
+    columns."""
+
+    def __init__(self, metadata_format, device_item):
+        # the order in which the parsers are tried for a row
+        parsers = [incomplete_photo_parser(metadata_format),
+                   device_motion_parse(metadata_format),
+                   acceleration_parser(metadata_format),
+                   gravity_parser(metadata_format),
+                   attitude_parser(metadata_format),
+                   gps_parser(metadata_format, device_item),
+                   obd_parser(metadata_format),
+                   pressure_parser(metadata_format),
+                   compass_parser(metadata_format)]
+        self._parsers: Dict[type, ItemLegacyParser] = {parser.item_class: parser
+                                                       for parser in parsers}
+        self._matching_parsers: Dict[tuple, List[ItemLegacyParser]] = {}
+
+    def parser(self, item_class) -> ItemLegacyParser:
+        """returns the parser for item_class"""
+        return self._parsers[item_class]
+
+    def decode(self, elements, item_classes=None) -> Optional[SensorItem]:
+        """returns the first item found in the row elements. If item_classes is set only items
+        of these classes are searched in the given order, otherwise all item classes are"""
+        for parser in self._matching(elements, item_classes):
+            return parser.decode(elements)
+        return None
+
+    def decode_all(self, elements, item_classes=None) -> List[SensorItem]:
+        """returns all the items found in the row elements"""
+        return [parser.decode(elements) for parser in self._matching(elements, item_classes)]
+
+    def _matching(self, elements, item_classes) -> List[ItemLegacyParser]:
+        if item_classes is not None:
+            item_classes = tuple(item_classes)
+        # the rows with values in the same columns have the same parsers
+        row_key = (tuple(map(bool, elements)), item_classes)
+        matching = self._matching_parsers.get(row_key)
+        if matching is None:
+            filled_columns = {column for column, value in enumerate(elements) if value}
+            if item_classes is None:
+                item_classes = self._parsers.keys()
+            matching = [self._parsers[item_class] for item_class in item_classes
+                        if self._parsers[item_class].required_columns is not None
+                        and self._parsers[item_class].required_columns <= filled_columns]
+            self._matching_parsers[row_key] = matching
+        return matching
@@ -1,5 +1,6 @@
 """This module is made to parse osc metadata file version 2"""
-from typing import Optional, Dict, List, Tuple, Type
+from bisect import bisect_left
+from typing import Optional, Dict, List, Tuple, Type, Iterator, TYPE_CHECKING
 
 from common.models import SensorItem, PhotoMetadata, ExifParameters, Attitude, Acceleration
 from common.models import Compass, CameraParameters, DeviceMotion, OBD, GPS, Pressure, Gravity
@@ -10,20 +11,82 @@ from parsers.base import BaseParser
 from parsers.osc_metadata.item_factory import SensorItemDefinition, ItemParser
 import parsers.osc_metadata.legacy_item_factory as legacy
 from parsers.osc_metadata.legacy_item_factory import ItemLegacyParser
-
-
-class MetadataParser(BaseParser):
+from parsers.osc_metadata.row_index import MetadataRowIndex, persist_index_enabled
+
+if TYPE_CHECKING:
+    import numpy
+
+
+class MetadataCursor:
+    """MetadataCursor keeps a single buffered handle on a metadata file and reads the file
+    forward from its current position, so reading the items one by one doesn't reopen and seek
+    the file for every item. The handle is opened when needed and released at the end of the
+    file or when the cursor is closed."""
+
+    def __init__(self, file_path: str, storage: Storage):
+        self._file_path = file_path
+        self._storage = storage
+        self._file = None
+        self._position = 0
+        self._at_end = False
+
+    def readline(self) -> str:
+        """returns the line found at the current position, or an empty string at the end of
+        the file, and moves the cursor at the beginning of the next line"""
+        if self._at_end:
+            return ""
+        if self._file is None:
+            self._file = self._storage.open(self._file_path, "rb")
+            self._file.seek(self._position)
+        line = self._file.readline()
+        if not line:
+            self._at_end = True
+            self.close()
+            return ""
+        self._position += len(line)
+        if line.endswith(b"\r\n"):
+            line = line[:-2] + b"\n"
+        return line.decode()
+
+    def seek(self, position: int):
+        """moves the cursor at position, a byte offset from the beginning of the file"""
+        self._position = position
+        self._at_end = False
+        if self._file is not None:
+            self._file.seek(position)
+
+    def tell(self) -> int:
+        """returns the current position as a byte offset from the beginning of the file"""
+        return self._position
+
+    def close(self):
+        """releases the file handle, a later read will reopen the file at the same position"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# the parser keeps the file cursor, the row index and the decoded columns next to the header data
+class MetadataParser(BaseParser):  # pylint: disable=R0902
     """MetadataParser is a BaseParser class capable of parsing a Metadata File compatible with the
-        known SensorItem versions"""
+        known SensorItem versions. The rows of every alias are indexed while the items of a class
+        are read the first time, the next queries reading only the indexed rows. If
+        persist_index is set the index is saved next to the metadata file and reused while the
+        file is unchanged"""
 
-    def __init__(self, file_path, storage: Storage):
+    def __init__(self, file_path, storage: Storage, persist_index: bool = False):
         super().__init__(file_path, storage)
-        self._data_pointer = 0
         self._body_pointer = 0
+        self._persist_index = persist_index
+        self._row_index: Optional[MetadataRowIndex] = None
+        self._columns: Dict[str, "numpy.ndarray"] = {}
+        self._cursor = MetadataCursor(file_path, storage)
         self._device_item: Optional[OSCDevice] = None
         self._metadata_version = None
         self._alias_definitions: Dict[str, SensorItemDefinition] = {}
         self._configure_headers()
+        # the cursor reopens the file on the next read
+        self._cursor.close()
 
     def format_version(self) -> Optional[str]:
         """According to the documentation the version is found in the first line
@@ -47,53 +110,95 @@ class MetadataParser(BaseParser):
         if not definition:
             return None
 
-        with self._storage.open(self.file_path) as metadata_file:
-            metadata_file.seek(self._data_pointer)
-            item = None
-            line = metadata_file.readline()
-            while line and "END" not in line:
-                timestamp, alias, item_data = self._timestamp_alias_data_from_row(line)
-                if alias == definition.alias:
-                    item_parser = definition.parsers[0]
-                    item = item_parser.parse(item_data, timestamp)
-                    break
-                line = metadata_file.readline()
-            self._data_pointer = metadata_file.tell()
-            return item
+        if self._row_index is None and self._persist_index:
+            self._row_index = MetadataRowIndex.load(self.file_path, self._storage)
+        if self._row_index is not None:
+            offsets = self._row_index.offsets(definition.alias)
+            position = bisect_left(offsets, self._cursor.tell())
+            if position == len(offsets):
+                # same as reading the remaining rows without finding one
+                self._cursor.seek(self._storage.getsize(self.file_path))
+                return None
+            self._cursor.seek(offsets[position])
+
+        line = self._cursor.readline()
+        while line and "END" not in line:
+            timestamp, alias, item_data = self._timestamp_alias_data_from_row(line)
+            if alias == definition.alias:
+                item_parser = definition.parsers[0]
+                return item_parser.parse(item_data, timestamp)
+            line = self._cursor.readline()
+        return None
 
     def items_with_class(self, item_class: Type[SensorItem]) -> List[SensorItem]:
         """this method returns all items from the current metadata file that
         are instances of item_class"""
+        return list(self.iter_items_with_class(item_class))
+
+    def iter_items_with_class(self, item_class: Type[SensorItem]) -> Iterator[SensorItem]:
+        """this method yields one by one all items from the current metadata file that
+        are instances of item_class"""
         definition = self._compatible_definition(item_class)
         if not definition:
-            return []
-        alias = definition.alias
-
-        with self._storage.open(self.file_path) as metadata_file:
+            return
+        row_parser = definition.parsers[0]
+        if self._row_index is None and self._persist_index:
+            self._row_index = MetadataRowIndex.load(self.file_path, self._storage)
+        if self._row_index is not None:
+            yield from self._iter_indexed_rows(definition.alias, row_parser)
+            return
+
+        # the index is built while the body is read, the next queries will use it
+        row_index = MetadataRowIndex({})
+        with self._storage.open(self.file_path, "rb") as metadata_file:
             metadata_file.seek(self._body_pointer)
-            item_instances = []
+            position = self._body_pointer
             for line in metadata_file:
-                name = ":" + alias + ":"
-                if name in line:
-                    timestamp, _, item_data = self._timestamp_alias_data_from_row(line)
-                    row_parser = definition.parsers[0]
-                    item_instance = row_parser.parse(item_data, timestamp)
-                    item_instances.append(item_instance)
-            return item_instances
+                if row_index.add_row(line, position) == definition.alias:
+                    row = self._timestamp_alias_data_from_row(line.decode().rstrip("\r\n"))
+                    timestamp, _, item_data = row
+                    yield row_parser.parse(item_data, timestamp)
+                position += len(line)
+        self._set_row_index(row_index)
+
+    def columns_with_class(self, item_class: Type[SensorItem]) -> Optional["numpy.ndarray"]:
+        """this method returns all rows of item_class from the current metadata file as a numpy
+        structured array, having a timestamp field and a field for every value of the row eg.
+        gps_latitude, acc_x. It returns None if item_class is not a numeric sensor or the
+        metadata file has no definition for it. The columns are decoded once per parser and
+        must not be modified by the caller"""
+        # numpy is needed only by the columnar decoding, not by the commands using the parser
+        # pylint: disable=C0415
+        from parsers.osc_metadata.columns import NUMERIC_ITEM_CLASSES, read_columns
+
+        if item_class not in NUMERIC_ITEM_CLASSES:
+            return None
+        definition = self._compatible_definition(item_class)
+        if not definition:
+            return None
+        columns = self._columns.get(definition.alias)
+        if columns is None:
+            columns = read_columns(self.file_path,
+                                   self._storage,
+                                   self._body_pointer,
+                                   definition.alias,
+                                   definition.parsers[0])
+            self._columns[definition.alias] = columns
+        return columns
 
     def next_item(self):
         """this method returns the next metadata item found in the current metadata file"""
-        with self._storage.open(self.file_path) as metadata_file:
-            metadata_file.seek(self._data_pointer)
-            line = metadata_file.readline()
-            if "END" in line:
-                return None
-            timestamp, alias, item_data = self._timestamp_alias_data_from_row(line)
-            definition = self._alias_definitions[alias]
-            parser = definition.parsers[0]
-            self._data_pointer = metadata_file.tell()
+        line = self._cursor.readline()
+        if "END" in line:
+            return None
+        row = self._timestamp_alias_data_from_row(line)
+        if row is None:
+            return None
+        timestamp, alias, item_data = row
+        definition = self._alias_definitions[alias]
+        parser = definition.parsers[0]
 
-            return parser.parse(item_data, timestamp)
+        return parser.parse(item_data, timestamp)
 
     @classmethod
     def compatible_sensors(cls):
@@ -102,44 +207,82 @@ class MetadataParser(BaseParser):
 
     def items(self) -> List[SensorItem]:
         """this method returns all metadata items found in the current metadata file"""
+        return list(self.iter_items())
+
+    def iter_items(self) -> Iterator[SensorItem]:
+        """this method yields one by one all metadata items found in the current metadata file"""
         with self._storage.open(self.file_path) as metadata_file:
             metadata_file.seek(self._body_pointer)
-            item_instances = []
             for line in metadata_file:
-                timestamp, alias, item_data = self._timestamp_alias_data_from_row(line)
+                row = self._timestamp_alias_data_from_row(line)
+                if row is None:
+                    # END row
+                    continue
+                timestamp, alias, item_data = row
                 definition = self._alias_definitions[alias]
                 row_parser = definition.parsers[0]
-                item_instance = row_parser.parse(item_data, timestamp)
-                item_instances.append(item_instance)
-            return item_instances
+                yield row_parser.parse(item_data, timestamp)
 
     def serialize(self):
         raise NotImplementedError("MetadataParser serialize method is not implemented", self)
 
+    def start_new_reading(self):
+        self._cursor.seek(self._body_pointer)
+
+    def close(self):
+        self._cursor.close()
+
+    def row_index(self) -> MetadataRowIndex:
+        """this method returns the index of the rows of the metadata file by alias, building it
+        on the first call"""
+        if self._row_index is None and self._persist_index:
+            self._row_index = MetadataRowIndex.load(self.file_path, self._storage)
+        if self._row_index is None:
+            self._set_row_index(MetadataRowIndex.build(self.file_path,
+                                                       self._storage,
+                                                       self._body_pointer))
+        return self._row_index
+
     # <editor-fold desc="Private methods">
 
+    def _set_row_index(self, row_index: MetadataRowIndex):
+        self._row_index = row_index
+        if self._persist_index:
+            row_index.save(self.file_path, self._storage)
+
+    def _iter_indexed_rows(self, alias, row_parser) -> Iterator[SensorItem]:
+        offsets = self._row_index.offsets(alias)
+        if not offsets:
+            return
+        with self._storage.open(self.file_path, "rb") as metadata_file:
+            for offset in offsets:
+                metadata_file.seek(offset)
+                line = metadata_file.readline().decode().rstrip("\r\n")
+                timestamp, _, item_data = self._timestamp_alias_data_from_row(line)
+                yield row_parser.parse(item_data, timestamp)
+
     def _configure_headers(self):
-        with self._storage.open(self.file_path) as metadata_file:
-            self.header_line = metadata_file.readline()
-            line = metadata_file.readline()
-            if "HEADER" not in line:
+        self._cursor.seek(0)
+        self.header_line = self._cursor.readline()
+        line = self._cursor.readline()
+        if "HEADER" not in line:
+            return
+
+        # find the definition lines
+        line = self._cursor.readline()
+        while line and "BODY" not in line:
+            if "ALIAS:" not in line:
+                return
+            alias_line_elements = line.split(":")
+            if ";" not in alias_line_elements[1]:
                 return
 
-            # find the definition lines
-            line = metadata_file.readline()
-            while line and "BODY" not in line:
-                if "ALIAS:" not in line:
-                    return
-                alias_line_elements = line.split(":")
-                if ";" not in alias_line_elements[1]:
-                    return
-
-                definition = SensorItemDefinition.definition_from_row(line)
-                self._alias_definitions[definition.alias] = definition
-                line = metadata_file.readline()
+            definition = SensorItemDefinition.definition_from_row(line)
+            self._alias_definitions[definition.alias] = definition
+            line = self._cursor.readline()
 
-            self._body_pointer = metadata_file.tell()
-            self.start_new_reading()
+        self._body_pointer = self._cursor.tell()
+        self.start_new_reading()
 
     def _compatible_definition(self, item_class) -> Optional[SensorItemDefinition]:
         """This function returns a compatible definition"""
@@ -169,34 +312,22 @@ class MetadataParser(BaseParser):
 class MetadataParserLegacy(MetadataParser):
     """this class is a MetadataParser that can parse metadata 1.x versions"""
 
+    def __init__(self, file_path, storage: Storage, persist_index: bool = False):
+        # the last GPS, OBD and Compass items read, set on the photos read after them
+        self._previous_items: Dict[Type[SensorItem], SensorItem] = {}
+        super().__init__(file_path, storage, persist_index)
+
     def next_item_with_class(self, item_class: Type[SensorItem]) -> Optional[SensorItem]:
         if item_class == OSCDevice:
             return self._device_item
 
-        item = None
-        with self._storage.open(self.file_path) as metadata_file:
-            metadata_file.seek(self._data_pointer)
-            line = metadata_file.readline()
-            while line:
-                if ";" not in line:
-                    line = metadata_file.readline()
-                    continue
-
-                elements = line.replace("\n", "").split(";")
-
-                tmp_item = self._get_metadata_item(elements)
-                if isinstance(tmp_item, item_class):
-                    item = tmp_item
-                    break
-                line = metadata_file.readline()
-            self._data_pointer = metadata_file.tell()
-
-        if item_class == PhotoMetadata and item:
-            all_photos_data = self._all_with_classes([GPS, OBD, Compass])
-            all_photos_data.append(item)
-            all_photos_data.sort(key=lambda i: i.timestamp)
-            self._aggregate_photo_data(all_photos_data, 1)
-        return item
+        line = self._cursor.readline()
+        while line:
+            item = self._read_row(line)
+            if isinstance(item, item_class):
+                return item
+            line = self._cursor.readline()
+        return None
 
     def items_with_class(self, item_class: Type[SensorItem]) -> List[SensorItem]:
         if item_class == PhotoMetadata:
@@ -207,22 +338,20 @@ class MetadataParserLegacy(MetadataParser):
             return [] if device is None else [device]
         return self._all_with_classes([item_class])
 
+    def iter_items_with_class(self, item_class: Type[SensorItem]) -> Iterator[SensorItem]:
+        """The photo data of metadata 1.x files is sorted by timestamp before it is aggregated,
+        the rows not always being written in chronological order, so the photos are yielded
+        from the sorted list. The other items are yielded while the file is read."""
+        if item_class == PhotoMetadata:
+            yield from self.items_with_class(PhotoMetadata)
+        elif item_class == OSCDevice:
+            if self._device_item is not None:
+                yield self._device_item
+        else:
+            yield from self._iter_with_classes([item_class])
+
     def next_item(self):
-        with self._storage.open(self.file_path) as metadata_file:
-            metadata_file.seek(self._data_pointer)
-            line = metadata_file.readline()
-            if ";" not in line:
-                return None
-            elements = line.replace("\n", "").split(";")
-            item = self._get_metadata_item(elements)
-            self._data_pointer = metadata_file.tell()
-
-        if isinstance(item, PhotoMetadata) and item:
-            all_photos_data = self._all_with_classes([GPS, OBD, Compass])
-            all_photos_data.append(item)
-            all_photos_data.sort(key=lambda i: i.timestamp)
-            self._aggregate_photo_data(all_photos_data, 1)
-        return item
+        return self._read_row(self._cursor.readline())
 
     def items(self) -> List[SensorItem]:
         all_items = self._all_with_classes([PhotoMetadata,
@@ -239,6 +368,11 @@ class MetadataParserLegacy(MetadataParser):
         self._aggregate_photo_data(all_items)
         return all_items
 
+    def iter_items(self) -> Iterator[SensorItem]:
+        """The items of metadata 1.x files are sorted by timestamp, same as items() does, so
+        they are yielded from the sorted list"""
+        yield from self.items()
+
     @classmethod
     def compatible_sensors(cls):
         return [PhotoMetadata, GPS, Acceleration, Compass, OBD, Pressure, Attitude,
@@ -255,131 +389,138 @@ class MetadataParserLegacy(MetadataParser):
     def serialize(self):
         raise NotImplementedError("MetadataParser serialize method is not implemented", self)
 
+    def start_new_reading(self):
+        super().start_new_reading()
+        self._previous_items = {}
+
     # <editor-fold desc="Private Methods">
     def _configure_headers(self):
         self._metadata_version = None
         self._metadata_legacy_format = self._known_formats()[self.format_version()]
-        self._data_pointer = self._body_pointer
+        self._row_decoder = legacy.LegacyRowDecoder(self._metadata_legacy_format,
+                                                    self._device_item)
+        self.start_new_reading()
+
+    def _read_row(self, line) -> Optional[SensorItem]:
+        """Returns the item found at the row read by the cursor. The GPS, OBD and Compass data
+        of the rows read so far is kept and set on the PhotoMetadata items, this way the photos
+        are aggregated in a single forward pass over the file."""
+        if ";" not in line:
+            return None
+        elements = line.replace("\n", "").split(";")
+        row_items = self._row_decoder.decode_all(elements)
+        if not row_items:
+            return None
+        for photo_data in row_items:
+            if isinstance(photo_data, (GPS, OBD, Compass)):
+                self._previous_items[type(photo_data)] = photo_data
+        # a photo row that has a GPS fix gets its own fix
+        item = row_items[0]
+        if isinstance(item, PhotoMetadata) and self._previous_items.get(GPS):
+            item.gps = self._previous_items[GPS]
+            item.obd = self._previous_items.get(OBD)
+            item.compass = self._previous_items.get(Compass)
+        return item
 
     @classmethod
     def _aggregate_photo_data(cls, photo_data_items, limit=-1) -> List[PhotoMetadata]:
         photo_data_items.sort(key=lambda i: i.timestamp)
+        photos: List[PhotoMetadata] = []
+        for photo in cls._iter_aggregated_photo_data(photo_data_items):
+            photos.append(photo)
+            if limit == len(photos):
+                return photos
+        return photos
+
+    @classmethod
+    def _iter_aggregated_photo_data(cls, photo_data_items) -> Iterator[PhotoMetadata]:
+        """Sets on every PhotoMetadata the GPS, OBD and Compass items preceding it and yields
+        the photos having a preceding GPS"""
         previous_gps = None
         previous_obd = None
         previous_compass = None
-        photos: List[PhotoMetadata] = []
         for item in photo_data_items:
             if isinstance(item, PhotoMetadata) and previous_gps:
                 item.gps = previous_gps
                 item.obd = previous_obd
                 item.compass = previous_compass
-                photos.append(item)
+                yield item
             elif isinstance(item, GPS):
                 previous_gps = item
             elif isinstance(item, OBD):
                 previous_obd = item
             elif isinstance(item, Compass):
                 previous_compass = item
-            if limit == len(photos):
-                return photos
-        return photos
 
     def _all_with_classes(self, item_classes, file_pointer=-1) -> List[SensorItem]:
+        return list(self._iter_with_classes(item_classes, file_pointer))
+
+    def _iter_with_classes(self, item_classes, file_pointer=-1) -> Iterator[SensorItem]:
         if file_pointer == -1:
             file_pointer = self._body_pointer
+        item_classes = tuple(item_classes)
         with self._storage.open(self.file_path) as metadata_file:
             metadata_file.seek(file_pointer)
-            item_instances = []
-            parsers: List[ItemLegacyParser] = []
-            for item_class in item_classes:
-                parsers.append(self._parser_for_class(item_class))
             for line in metadata_file:
                 if ";" not in line:
                     continue
                 elements = line.replace("\n", "").split(";")
-                tmp_item = None
-                for parser in parsers:
-                    tmp_item = parser.parse(elements)
-                    if tmp_item:
-                        break
-                if tmp_item:
-                    item_instances.append(tmp_item)
-            return item_instances
+                item = self._row_decoder.decode(elements, item_classes)
+                if item:
+                    yield item
 
     def _read_device_attributes(self):
-        with self._storage.open(self.file_path) as metadata_file:
-            header_line = metadata_file.readline()
-            self._body_pointer = metadata_file.tell()
-            if ";" in header_line:
-                elements = header_line.strip().split(";")
-                if len(elements) > 6:
-                    # to many elements
-                    return
-                self._device_item = OSCDevice()
-                self._device_item.timestamp = "0"
-                if len(elements) == 5:
-                    # row has the following info:
-                    # device_model;os_version;metadata_version;app_version;rec_Type
-                    if RecordingType.PHOTO.name.lower() == elements[4]:
-                        self._device_item.recording_type = RecordingType.PHOTO
-                    elif RecordingType.VIDEO.name.lower() == elements[4]:
-                        self._device_item.recording_type = RecordingType.VIDEO
-
-                if len(elements) >= 4:
-                    # row has at least the following info:
-                    # device_model;os_version;metadata_version;app_version
-                    self._device_item.app_version = elements[3]
-
-                if len(elements) >= 3:
-                    # row has at least the following info:
-                    # device_model;os_version;metadata_version
-                    self._device_item.device_raw_name = elements[0]
-                    self._device_item.os_version = elements[1]
-                    self._metadata_version = elements[2]
-
-            elif " " in header_line:
-                elements = header_line.split(" ")
-                if len(elements) == 2:
-                    self._metadata_version = "no version"
-                    self._device_item.device_raw_name = elements[0]
+        self._cursor.seek(0)
+        header_line = self._cursor.readline()
+        self._body_pointer = self._cursor.tell()
+        if ";" in header_line:
+            elements = header_line.strip().split(";")
+            if len(elements) > 6:
+                # to many elements
+                return
+            self._device_item = OSCDevice()
+            self._device_item.timestamp = "0"
+            if len(elements) == 5:
+                # row has the following info:
+                # device_model;os_version;metadata_version;app_version;rec_Type
+                if RecordingType.PHOTO.name.lower() == elements[4]:
                     self._device_item.recording_type = RecordingType.PHOTO
-
-            if self._device_item.recording_type is None:
-                recording_type = self._recording_type_from_version(self._metadata_version)
-                self._device_item.recording_type = recording_type
-
-            if "iP" in self._device_item.device_raw_name:
-                self._device_item.platform_name = "iOS"
-            else:
-                self._device_item.platform_name = "Android"
+                elif RecordingType.VIDEO.name.lower() == elements[4]:
+                    self._device_item.recording_type = RecordingType.VIDEO
+
+            if len(elements) >= 4:
+                # row has at least the following info:
+                # device_model;os_version;metadata_version;app_version
+                self._device_item.app_version = elements[3]
+
+            if len(elements) >= 3:
+                # row has at least the following info:
+                # device_model;os_version;metadata_version
+                self._device_item.device_raw_name = elements[0]
+                self._device_item.os_version = elements[1]
+                self._metadata_version = elements[2]
+
+        elif " " in header_line:
+            elements = header_line.split(" ")
+            if len(elements) == 2:
+                self._metadata_version = "no version"
+                self._device_item.device_raw_name = elements[0]
+                self._device_item.recording_type = RecordingType.PHOTO
+
+        if self._device_item.recording_type is None:
+            recording_type = self._recording_type_from_version(self._metadata_version)
+            self._device_item.recording_type = recording_type
+
+        if "iP" in self._device_item.device_raw_name:
+            self._device_item.platform_name = "iOS"
+        else:
+            self._device_item.platform_name = "Android"
 
     def _get_metadata_item(self, elements) -> Optional[SensorItem]:
-        parsers = [legacy.incomplete_photo_parser(self._metadata_legacy_format),
-                   legacy.device_motion_parse(self._metadata_legacy_format),
-                   legacy.acceleration_parser(self._metadata_legacy_format),
-                   legacy.gravity_parser(self._metadata_legacy_format),
-                   legacy.attitude_parser(self._metadata_legacy_format),
-                   legacy.gps_parser(self._metadata_legacy_format, self._device_item),
-                   legacy.obd_parser(self._metadata_legacy_format),
-                   legacy.pressure_parser(self._metadata_legacy_format),
-                   legacy.compass_parser(self._metadata_legacy_format)]
-        for parser in parsers:
-            item = parser.parse(elements)
-            if item:
-                return item
-        return None
+        return self._row_decoder.decode(elements)
 
-    def _parser_for_class(self, item_class):
-        class_parser = {PhotoMetadata: legacy.incomplete_photo_parser(self._metadata_legacy_format),
-                        DeviceMotion: legacy.device_motion_parse(self._metadata_legacy_format),
-                        Acceleration: legacy.acceleration_parser(self._metadata_legacy_format),
-                        Gravity: legacy.gravity_parser(self._metadata_legacy_format),
-                        Attitude: legacy.attitude_parser(self._metadata_legacy_format),
-                        GPS: legacy.gps_parser(self._metadata_legacy_format, self._device_item),
-                        OBD: legacy.obd_parser(self._metadata_legacy_format),
-                        Pressure: legacy.pressure_parser(self._metadata_legacy_format),
-                        Compass: legacy.compass_parser(self._metadata_legacy_format)}
-        return class_parser[item_class]
+    def _parser_for_class(self, item_class) -> ItemLegacyParser:
+        return self._row_decoder.parser(item_class)
 
     @classmethod
     def _known_formats(cls):
@@ -535,12 +676,17 @@ class MetadataParserLegacy(MetadataParser):
     # </editor-fold>
 
 
-def metadata_parser(file_path, storage: Storage) -> MetadataParser:
-    """this method will return a valid metadata parser"""
+def metadata_parser(file_path, storage: Storage,
+                    persist_index: Optional[bool] = None) -> MetadataParser:
+    """this method will return a valid metadata parser, by default the row index is kept in
+    memory and it is saved next to the metadata file only if the OSC_PERSIST_METADATA_INDEX
+    environment variable is set"""
+    if persist_index is None:
+        persist_index = persist_index_enabled()
     with storage.open(file_path) as metadata_file:
         header_line = metadata_file.readline()
         if "METADATA:2.0" in header_line:
             # parse this file with MetadataV2 parser
-            return MetadataParser(file_path, storage)
+            return MetadataParser(file_path, storage, persist_index)
         # fallback on MetadataParserLegacy
         return MetadataParserLegacy(file_path, storage)
@@ -0,0 +1,113 @@
+"""This module is made to index the rows of an osc metadata file version 2 by their alias"""
+import json
+import logging
+import os
+import sys
+from array import array
+from typing import Dict, Optional
+
+from io_storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_FILE_SUFFIX = ".idx"
+# environment variable enabling the index sidecar files, set by the --persist-metadata-index option
+PERSIST_INDEX_VARIABLE = "OSC_PERSIST_METADATA_INDEX"
+
+
+def persist_index_enabled() -> bool:
+    """this function returns True if the metadata row indexes are saved as sidecar files"""
+    return os.environ.get(PERSIST_INDEX_VARIABLE, "") not in ("", "0")
+
+
+class MetadataRowIndex:
+    """MetadataRowIndex keeps for every alias of a metadata 2.0 file the byte offsets of the rows
+    having that alias, in file order. The index can be saved as a sidecar file next to the
+    metadata file, the sidecar starts with a json header line followed by the raw offsets of
+    every alias."""
+
+    def __init__(self, offsets: Dict[str, array]):
+        self._offsets = offsets
+
+    def offsets(self, alias: str) -> array:
+        """returns the byte offsets of the rows having alias"""
+        return self._offsets.get(alias, array("Q"))
+
+    def aliases(self):
+        """returns the aliases found in the body of the metadata file"""
+        return list(self._offsets.keys())
+
+    def add_row(self, line: bytes, position: int) -> Optional[str]:
+        """this method indexes the row found at position and returns its alias, or None if the
+        line is not a sensor row"""
+        elements = line.split(b":", 2)
+        if len(elements) != 3:
+            return None
+        alias = elements[1].decode()
+        alias_offsets = self._offsets.get(alias)
+        if alias_offsets is None:
+            alias_offsets = array("Q")
+            self._offsets[alias] = alias_offsets
+        alias_offsets.append(position)
+        return alias
+
+    @classmethod
+    def build(cls, file_path: str, storage: Storage, body_pointer: int) -> "MetadataRowIndex":
+        """this method reads once the body of the metadata file and returns its index"""
+        index = cls({})
+        with storage.open(file_path, "rb") as metadata_file:
+            metadata_file.seek(body_pointer)
+            position = body_pointer
+            for line in metadata_file:
+                index.add_row(line, position)
+                position += len(line)
+        return index
+
+    @classmethod
+    def index_path(cls, file_path: str) -> str:
+        """returns the path of the sidecar file of the metadata file"""
+        return file_path + INDEX_FILE_SUFFIX
+
+    def save(self, file_path: str, storage: Storage):
+        """this method writes the index in the sidecar file of the metadata file"""
+        size, tag = storage.file_version(file_path)
+        header = {"version": INDEX_VERSION,
+                  "byteorder": sys.byteorder,
+                  "size": size,
+                  "tag": tag,
+                  "aliases": {alias: len(offsets) for alias, offsets in self._offsets.items()}}
+        data = [json.dumps(header).encode() + b"\n"]
+        for offsets in self._offsets.values():
+            data.append(offsets.tobytes())
+        try:
+            storage.put(b"".join(data), self.index_path(file_path))
+        except OSError as error:
+            logger.debug("Could not save the metadata index of %s: %s", file_path, error)
+
+    @classmethod
+    def load(cls, file_path: str, storage: Storage) -> Optional["MetadataRowIndex"]:
+        """this method returns the index found in the sidecar file of the metadata file, or None
+        if there is no sidecar file or if it is outdated"""
+        index_path = cls.index_path(file_path)
+        try:
+            with storage.open(index_path, "rb") as index_file:
+                header = json.loads(index_file.readline())
+                if header.get("version") != INDEX_VERSION \
+                        or header.get("byteorder") != sys.byteorder \
+                        or [header.get("size"), header.get("tag")] != \
+                        list(storage.file_version(file_path)):
+                    return None
+                offsets: Dict[str, array] = {}
+                for alias, count in header["aliases"].items():
+                    alias_offsets = array("Q")
+                    alias_offsets.frombytes(index_file.read(count * alias_offsets.itemsize))
+                    if len(alias_offsets) != count:
+                        return None
+                    offsets[alias] = alias_offsets
+                return cls(offsets)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, AttributeError) as error:
+            logger.debug("Could not load the metadata index of %s: %s", file_path, error)
+            return None
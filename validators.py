@@ -5,7 +5,7 @@ from typing import cast
 
 import constants
 from common.models import PhotoMetadata, OSCDevice, RecordingType
-from io_storage.storage import Local
+from io_storage.storage import Local, Storage
 from parsers.osc_metadata.parser import MetadataParser, metadata_parser
 from osc_models import Sequence, Video, Photo
 
@@ -20,9 +20,10 @@ class SequenceValidator:
             return self == other
         return False
 
-    def validate(self, sequence: Sequence) -> bool:
+    def validate(self, sequence: Sequence, _storage: Storage = Local()) -> bool:
         """This method returns is a bool. If it returns True the sequence is valid if returns
-        False the sequence is not valid and it is not usable for OSC servers.
+        False the sequence is not valid and it is not usable for OSC servers. The storage is read
+        by the validators that check the files of the sequence.
         """
         LOGGER.debug("  Validating sequence using %s", str(self.__class__))
         if not sequence.visual_items:
@@ -47,22 +48,23 @@ class SequenceMetadataValidator(SequenceValidator):
             return self == other
         return False
 
-    def validate(self, sequence: Sequence) -> bool:
+    def validate(self, sequence: Sequence, storage: Storage = Local()) -> bool:
         """This method returns is a bool, If it returns True the sequence is valid if returns
                 False the sequence is not valid and it is not usable for OSC servers.
                 """
-        if not super().validate(sequence):
+        if not super().validate(sequence, storage):
             return False
         # is sequence has metadata
         if sequence.osc_metadata and not sequence.online_id:
             metadata_path = sequence.osc_metadata
             LOGGER.debug("        Validating Metadata %s", metadata_path)
-            parser: MetadataParser = metadata_parser(metadata_path, Local())
-            photo_item = parser.next_item_with_class(PhotoMetadata)
-            if not photo_item:
-                LOGGER.debug(" No photo in metadata")
-                return False
-            device: OSCDevice = cast(OSCDevice, parser.next_item_with_class(OSCDevice))
+            parser: MetadataParser
+            with metadata_parser(metadata_path, storage) as parser:
+                photo_item = parser.next_item_with_class(PhotoMetadata)
+                if not photo_item:
+                    LOGGER.debug(" No photo in metadata")
+                    return False
+                device: OSCDevice = cast(OSCDevice, parser.next_item_with_class(OSCDevice))
             visual_item = sequence.visual_items[0]
 
             if device is not None and device.recording_type is not None:
@@ -84,7 +86,7 @@ class SequenceFinishedValidator(SequenceValidator):
             return self == other
         return False
 
-    def validate(self, sequence: Sequence) -> bool:
+    def validate(self, sequence: Sequence, _storage: Storage = Local()) -> bool:
         """this method will return true if a sequence is already uploaded and was flagged
         as finished"""
         if sequence.progress and \
@@ -3,11 +3,13 @@
 
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import Optional, Tuple, List, cast
 
 import constants
 
-from io_storage.storage import Local
+from io_storage.storage import Local, Storage, StorageEntry
 from parsers.custom_data_parsers.custom_mapillary import MapillaryExif
 from parsers.osc_metadata.parser import metadata_parser
 from parsers.exif.exif import ExifParser
@@ -16,13 +18,16 @@ from osc_models import VisualData, Photo, Video
 from common.models import PhotoMetadata, CameraParameters
 
 LOGGER = logging.getLogger('osc_tools.visual_data_discoverer')
+# number of photo files sent to a discovery worker process in one batch
+DISCOVERY_CHUNK_SIZE = 64
 
 
 class VisualDataDiscoverer:
     """This class is an abstract discoverer of visual data files"""
 
     @classmethod
-    def discover(cls, path: str) -> Tuple[List[VisualData], str]:
+    def discover(cls, path: str, workers: int = 1,
+                 storage: Storage = Local()) -> Tuple[List[VisualData], str]:
         """This method will discover visual data and will return paths and type"""
 
     @classmethod
@@ -32,24 +37,23 @@ class VisualDataDiscoverer:
 
 class PhotoDiscovery(VisualDataDiscoverer):
     """This class will discover all photo files"""
+    # photo files are parsed by _photo_from_path so discovery can be spread over processes
+    parses_photo_files = False
 
     @classmethod
-    def discover(cls, path: str) -> Tuple[List[VisualData], str]:
-        """This method will discover photos"""
+    def discover(cls, path: str, workers: int = 1,
+                 storage: Storage = Local()) -> Tuple[List[VisualData], str]:
+        """This method will discover photos. When workers is greater than 1 the photo files are
+        parsed in parallel by a pool of worker processes."""
         LOGGER.debug("searching for photos %s", path)
-        if not os.path.isdir(path):
-            return [], "photo"
-
-        files = os.listdir(path)
-        photos = []
-        for file_path in files:
-            file_name, file_extension = os.path.splitext(file_path)
+        photo_paths = []
+        for entry in _file_entries(path, storage):
+            file_name, file_extension = os.path.splitext(entry.name)
             if ("jpg" in file_extension.lower() or "jpeg" in file_extension.lower()) and \
                     "thumb" not in file_name.lower():
-                LOGGER.debug("found a photo: %s", file_path)
-                photo = cls._photo_from_path(os.path.join(path, file_path))
-                if photo:
-                    photos.append(photo)
+                LOGGER.debug("found a photo: %s", entry.name)
+                photo_paths.append(entry.path)
+        photos = cls._photos_from_paths(photo_paths, workers, storage)
         # Sort photo list
         cls._sort_photo_list(photos)
         # Add index to the photo objects
@@ -61,7 +65,19 @@ class PhotoDiscovery(VisualDataDiscoverer):
         return cast(List[VisualData], photos), "photo"
 
     @classmethod
-    def _photo_from_path(cls, path) -> Optional[Photo]:
+    def _photos_from_paths(cls, paths: List[str], workers: int,
+                           storage: Storage) -> List[Photo]:
+        if workers > 1 and cls.parses_photo_files and len(paths) > DISCOVERY_CHUNK_SIZE:
+            chunks = [paths[index:index + DISCOVERY_CHUNK_SIZE]
+                      for index in range(0, len(paths), DISCOVERY_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                batches = executor.map(_photos_batch, repeat(cls), repeat(storage), chunks)
+                return [photo for batch in batches for photo in batch]
+        return _photos_batch(cls, storage, paths)
+
+    @classmethod
+    def _photo_from_path(cls, path, _storage: Storage) -> Optional[Photo]:
+        # the photo files are not read by this discoverer
         photo = Photo(path)
         return photo
 
@@ -70,13 +86,25 @@ class PhotoDiscovery(VisualDataDiscoverer):
         photos.sort(key=lambda p: int("".join(filter(str.isdigit, os.path.basename(p.path)))))
 
 
+def _photos_batch(discoverer, storage: Storage, paths: List[str]) -> List[Photo]:
+    """This function returns the photos found at paths using the discoverer class. It is run in
+    discovery worker processes so it returns only Photo models, which are cheap to pickle."""
+    photos = []
+    for path in paths:
+        photo = discoverer._photo_from_path(path, storage)  # pylint: disable=W0212
+        if photo:
+            photos.append(photo)
+    return photos
+
+
 class ExifPhotoDiscoverer(PhotoDiscovery):
     """This class will discover all photo files having exif data"""
+    parses_photo_files = True
 
     @classmethod
-    def _photo_from_path(cls, path) -> Optional[Photo]:
+    def _photo_from_path(cls, path, storage: Storage) -> Optional[Photo]:
         photo = Photo(path)
-        exif_parser = ExifParser(path, Local())
+        exif_parser = ExifParser(path, storage)
         photo_metadata: PhotoMetadata = cast(PhotoMetadata,
                                              exif_parser.next_item_with_class(PhotoMetadata))
 
@@ -104,7 +132,7 @@ class ExifPhotoDiscoverer(PhotoDiscovery):
 
         # pylint: disable=W0703
         try:
-            xmp_parser = XMPParser(path, Local())
+            xmp_parser = XMPParser(path, storage)
             params: CameraParameters = cast(CameraParameters,
                                             xmp_parser.next_item_with_class(CameraParameters))
             if params is not None:
@@ -123,9 +151,9 @@ class ExifPhotoDiscoverer(PhotoDiscovery):
 
 class MapillaryExifDiscoverer(ExifPhotoDiscoverer):
     @classmethod
-    def _photo_from_path(cls, path) -> Optional[Photo]:
+    def _photo_from_path(cls, path, storage: Storage) -> Optional[Photo]:
         photo = Photo(path)
-        exif_parser = MapillaryExif(path, Local())
+        exif_parser = MapillaryExif(path, storage)
         photo_metadata: PhotoMetadata = cast(PhotoMetadata,
                                              exif_parser.next_item_with_class(PhotoMetadata))
 
@@ -153,7 +181,7 @@ class MapillaryExifDiscoverer(ExifPhotoDiscoverer):
 
         # pylint: disable=W0703
         try:
-            xmp_parser = XMPParser(path, Local())
+            xmp_parser = XMPParser(path, storage)
             params: CameraParameters = cast(CameraParameters,
                                             xmp_parser.next_item_with_class(CameraParameters))
             if params is not None:
@@ -169,25 +197,37 @@ class MapillaryExifDiscoverer(ExifPhotoDiscoverer):
 class PhotoMetadataDiscoverer(PhotoDiscovery):
 
     @classmethod
-    def discover(cls, path: str):
-        photos, visual_type = super().discover(path)
+    def discover(cls, path: str, workers: int = 1, storage: Storage = Local()):
+        photos, visual_type = super().discover(path, workers, storage)
         metadata_file = os.path.join(path, constants.METADATA_NAME)
-        if os.path.exists(metadata_file):
-            parser = metadata_parser(metadata_file, Local())
-            parser.start_new_reading()
-            metadata_photos = cast(List[PhotoMetadata], parser.items_with_class(PhotoMetadata))
-            remove_photos = []
-            for photo in photos:
-                if not isinstance(photo, Photo):
+        try:
+            cls._match_metadata_photos(metadata_file, photos, storage)
+        except FileNotFoundError:
+            return [], visual_type
+        return [photo for photo in photos
+                if not isinstance(photo, Photo) or cls._has_required_data(photo)], visual_type
+
+    @classmethod
+    def _match_metadata_photos(cls, metadata_file: str, photos: List[VisualData],
+                               storage: Storage):
+        """this method joins the photos with the metadata photos by frame index. The metadata
+        photos are streamed from the parser, every photo takes the data of the first metadata
+        photo having its index and the reading stops when all the photos are matched."""
+        unmatched_photos = {photo.index: photo for photo in photos if isinstance(photo, Photo)}
+        if not unmatched_photos:
+            return
+        with metadata_parser(metadata_file, storage) as parser:
+            for metadata_photo in parser.iter_items_with_class(PhotoMetadata):
+                photo = unmatched_photos.pop(int(metadata_photo.frame_index), None)
+                if photo is None:
                     continue
-                for tmp_photo in metadata_photos:
-                    if int(tmp_photo.frame_index) == photo.index:
-                        metadata_photo_to_photo(tmp_photo, photo)
-                        break
-                if not photo.latitude or not photo.longitude or not photo.gps_timestamp:
-                    remove_photos.append(photo)
-            return [x for x in photos if x not in remove_photos], visual_type
-        return [], visual_type
+                metadata_photo_to_photo(cast(PhotoMetadata, metadata_photo), photo)
+                if not unmatched_photos:
+                    break
+
+    @classmethod
+    def _has_required_data(cls, photo: Photo) -> bool:
+        return bool(photo.latitude and photo.longitude and photo.gps_timestamp)
 
 
 def metadata_photo_to_photo(metadata_photo: PhotoMetadata, photo: Photo):
@@ -209,17 +249,13 @@ class VideoDiscoverer(VisualDataDiscoverer):
     """This class will discover any sequence having a list of videos"""
 
     @classmethod
-    def discover(cls, path: str) -> Tuple[List[VisualData], str]:
-        if not os.path.isdir(path):
-            return [], "video"
-
-        files = os.listdir(path)
+    def discover(cls, path: str, workers: int = 1,
+                 storage: Storage = Local()) -> Tuple[List[VisualData], str]:
         videos = []
-
-        for file_path in files:
-            _, file_extension = os.path.splitext(file_path)
+        for entry in _file_entries(path, storage):
+            _, file_extension = os.path.splitext(entry.name)
             if "mp4" in file_extension:
-                video = Video(os.path.join(path, file_path))
+                video = Video(entry.path)
                 videos.append(video)
         cls._sort_list(videos)
         index = 0
@@ -232,3 +268,12 @@ class VideoDiscoverer(VisualDataDiscoverer):
     @classmethod
     def _sort_list(cls, videos):
         videos.sort(key=lambda v: int("".join(filter(str.isdigit, os.path.basename(v.path)))))
+
+
+def _file_entries(path: str, storage: Storage) -> List[StorageEntry]:
+    """This function returns the files found in the folder at path, the entries are scanned
+    without reading the attributes of the files"""
+    try:
+        return [entry for entry in storage.scan(path, with_stat=False) if not entry.is_dir]
+    except (FileNotFoundError, NotADirectoryError):
+        return []